@@ -16,7 +16,6 @@ install_requires = [
     "blessed",
     "pyqtgraph",
     "mysqlclient",
-    "pyarrow"
 ]
 
 #
@@ -70,6 +69,8 @@ setup(
             "chec-timestamp-viewer=ssdaq.bin.slowsignalviewer:timestampviewer",
             "chec-triggerpattern-viewer=ssdaq.bin.slowsignalviewer:triggerpatternviewer",
             "chec-daq-dash=ssdaq.bin.dash:mondumper",
+            "ssdaq-daq-benchmark=ssdaq.benchmarks.daq:main",
+            "ssdaq-serialization-benchmark=ssdaq.benchmarks.serialization:main",
         ]
     },
 )
@@ -0,0 +1,442 @@
+""" Simulates the slow signal data of all target modules (TMs) of the camera
+    in one process.
+
+    Each TM sends from its own socket bound to a distinct source address
+    (`<ip_prefix><ip_offset + tm>`, by default 127.0.0.100-131) so that the
+    `ReadoutAssembler` identifies the modules as it does in the camera. On
+    Linux the whole 127.0.0.0/8 network is routed to the loopback interface;
+    on other systems the addresses must be added as loopback aliases
+    (e.g. `ifconfig lo0 alias 127.0.0.100`).
+
+    The packets of all TMs are built in vectorized batches and can be sent
+    with a random delay (jitter), out of order and with packet loss.
+"""
+import asyncio
+import inspect
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+import zmq
+import zmq.asyncio
+
+from ssdaq.data._dataimpl import slowsignal_format as dc
+
+# the simulators are scripts and not a package
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from slowsignal_sim import TMMessage
+
+N_READOUTS_PER_PACKET = 10
+# max ADC counts (the MSB is flipped in the packets)
+MAX_COUNTS = 0x7FFF
+# A readout as it is laid out in the TM packet
+readout_dtype = np.dtype(
+    [("tack0", ">u8"), ("adc0", ">u2", 32), ("tack1", ">u8"), ("adc1", ">u2", 32)]
+)
+
+
+class CameraSimulator(object):
+    def __init__(
+        self,
+        send_port,
+        server_port,
+        host_ip="127.0.0.1",
+        ip_prefix="127.0.0.",
+        ip_offset=100,
+        n_tms=dc.N_TM,
+        readout_rate=100.0,
+        jitter=0.0,
+        reorder=0.0,
+        loss=0.0,
+        report_interval=1.0,
+        duration=None,
+        seed=None,
+    ):
+        """
+        Args:
+            send_port (int): slow signal data port of the host
+            server_port (str): port of the command server
+            host_ip (str, optional): IP address of the host
+            ip_prefix (str, optional): prefix of the TM source addresses
+            ip_offset (int, optional): last number of the address of TM 0
+            n_tms (int, optional): number of simulated TMs
+            readout_rate (float, optional): readout rate in Hz (10 readouts per packet)
+            jitter (float, optional): max random delay of a packet in seconds
+            reorder (float, optional): probability that a packet is sent after the next one of its TM
+            loss (float, optional): probability that a packet is lost
+            report_interval (float, optional): seconds between printed statistics
+            duration (float, optional): stop after this many seconds
+            seed (int, optional): seed of the random number generator
+        """
+        self.loop = asyncio.get_event_loop()
+        self.futures = []
+
+        self.host_address = (host_ip, send_port)
+        self.n_tms = n_tms
+        self.jitter = jitter
+        self.reorder = reorder
+        self.loss = loss
+        self.report_interval = report_interval
+        self.duration = duration
+        self.rng = np.random.default_rng(seed)
+        self.msg = TMMessage(name="Camera", ip=host_ip)
+        self.npackets = 0
+        self.nlost = 0
+        self.nerrors = 0
+        self.sending_ss_data = True
+        self.send_ss_datae = asyncio.Event()
+        self.set_rate(readout_rate)
+        self.corrs = [self.handle_commands(), self.send_ss_data()]
+
+        self.socks = []
+        for tm in range(n_tms):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2 ** 22)
+            sock.bind(("{}{}".format(ip_prefix, ip_offset + tm), 0))
+            sock.connect(self.host_address)
+            self.socks.append(sock)
+
+        # amplitudes in mV of all pixels
+        self.amplitudes = self.rng.uniform(0, 400, (n_tms, dc.N_TM_PIX)).astype(
+            np.float32
+        )
+        # packets waiting to be sent ordered by send time
+        self._pending_times = np.empty(0)
+        self._pending_tms = np.empty(0, dtype=np.intp)
+        self._pending_packets = np.empty(
+            (0, N_READOUTS_PER_PACKET * readout_dtype.itemsize), dtype=np.uint8
+        )
+
+        self.server_port = server_port
+        self.context = zmq.asyncio.Context()
+        self.com_sock = self.context.socket(zmq.REP)
+        self.com_sock.bind("tcp://%s:%s" % ("0.0.0.0", self.server_port))
+
+        method_list = inspect.getmembers(self, predicate=inspect.ismethod)
+        self.cmds = {}
+        for method in method_list:
+            if method[0][:4] == "cmd_":
+                self.cmds[method[0][4:]] = method[1]
+
+    def set_rate(self, readout_rate: float):
+        """ Sets the readout rate (restarts the pacing)
+
+        Args:
+            readout_rate (float): readout rate in Hz (0 pauses sending)
+
+        Raises:
+            ValueError: if the rate is negative or not finite
+        """
+        readout_rate = float(readout_rate)
+        if not np.isfinite(readout_rate) or readout_rate < 0:
+            raise ValueError(
+                "Invalid rate {}, must be a finite rate >= 0".format(readout_rate)
+            )
+        self.readout_rate = readout_rate
+        if readout_rate > 0:
+            self.packet_period = N_READOUTS_PER_PACKET / readout_rate
+            if self.sending_ss_data:
+                self.send_ss_datae.set()
+        else:
+            self.packet_period = np.inf
+            self.send_ss_datae.clear()
+        self._t0 = time.perf_counter()
+        self._tack0 = time.time_ns()
+        self._nbuilt = 0
+        self._last_report = (self._t0, self.npackets)
+
+    def cmd_available_cmds(self, arg):
+        return self.msg.encode("OK", list(self.cmds.keys()))
+
+    def cmd_ping(self, arg):
+        return self.msg.encode("OK", "Ping!")
+
+    def cmd_send_ss_data(self, arg):
+        if len(arg) == 1:
+            arg = arg[0]
+        else:
+            return self.msg.encode("Error", "Wrong number of arguments")
+        if arg == "True" or arg == "true":
+            self.sending_ss_data = True
+        elif arg == "False" or arg == "false":
+            self.sending_ss_data = False
+        else:
+            return self.msg.encode("Error", "Argument `%s` not recognized as boolean")
+
+        if self.sending_ss_data:
+            self.set_rate(self.readout_rate)
+        else:
+            self.send_ss_datae.clear()
+
+        return self.msg.encode("OK", "send_ss_data set to: %s" % self.sending_ss_data)
+
+    def cmd_is_sending_ss_data(self, arg):
+        return self.msg.encode("OK", self.sending_ss_data)
+
+    def cmd_change_rate(self, arg):
+        if len(arg) == 1:
+            try:
+                self.set_rate(arg[0])
+            except ValueError as e:
+                return self.msg.encode("Error", str(e))
+            return self.msg.encode("OK", "New rate set to %f Hz" % self.readout_rate)
+        else:
+            return self.msg.encode("Error", "Wrong number of arguments")
+
+    def cmd_get_rate(self, arg):
+        return self.msg.encode("OK", self.readout_rate)
+
+    def cmd_get_npackets_sent(self, arg):
+        return self.msg.encode("OK", self.npackets)
+
+    def cmd_get_stats(self, arg):
+        return self.msg.encode("OK", self.stats())
+
+    def stats(self):
+        now = time.perf_counter()
+        t, n = self._last_report
+        self._last_report = (now, self.npackets)
+        return {
+            "readout_rate": self.readout_rate,
+            "achieved_packet_rate": (self.npackets - n) / (now - t) if now > t else 0.0,
+            "npackets": self.npackets,
+            "lost": self.nlost,
+            "send_errors": self.nerrors,
+            "pending": len(self._pending_times),
+        }
+
+    def simulate_packets(self, n: int, first: int) -> np.ndarray:
+        """ Simulates `n` consecutive packets of all TMs
+
+        Args:
+            n (int): number of packets per TM
+            first (int): index of the first packet since the start
+
+        Returns:
+            np.ndarray: packets of shape (n, n_tms, 10) and type `readout_dtype`
+        """
+        nreadouts = n * N_READOUTS_PER_PACKET
+        # random walk of the amplitudes (steps with a std of 2.3 mV)
+        steps = self.rng.standard_normal(
+            (self.n_tms, nreadouts, dc.N_TM_PIX), dtype=np.float32
+        )
+        steps *= 2.3
+        amplitudes = np.cumsum(steps, axis=1)
+        amplitudes += self.amplitudes[:, np.newaxis]
+        # limited to the ADC range
+        np.clip(amplitudes, 0, MAX_COUNTS * dc.MV_PER_COUNT, out=amplitudes)
+        self.amplitudes = amplitudes[:, -1].copy()
+
+        # the MSB of the counts is flipped in the packets
+        amplitudes *= 1.0 / dc.MV_PER_COUNT
+        np.minimum(amplitudes, MAX_COUNTS, out=amplitudes)
+        counts = amplitudes.astype(np.uint16) ^ np.uint16(0x8000)
+        counts = counts.reshape((self.n_tms, n, N_READOUTS_PER_PACKET, dc.N_TM_PIX))
+        tacks = self._tack0 + (
+            (first * N_READOUTS_PER_PACKET + np.arange(nreadouts))
+            * (1e9 / self.readout_rate)
+        ).astype(np.uint64)
+        tacks = tacks.reshape((n, 1, N_READOUTS_PER_PACKET))
+
+        packets = np.empty((n, self.n_tms, N_READOUTS_PER_PACKET), dtype=readout_dtype)
+        packets["tack0"] = tacks
+        packets["tack1"] = tacks
+        packets["adc0"] = counts[..., :32].transpose(1, 0, 2, 3)
+        packets["adc1"] = counts[..., 32:].transpose(1, 0, 2, 3)
+        return packets
+
+    def _schedule(self, now: float):
+        """ Builds the packets due up to `now` and adds them to the pending packets
+        """
+        ndue = int((now - self._t0) / self.packet_period) + 1 - self._nbuilt
+        if ndue <= 0:
+            return
+        packets = self.simulate_packets(ndue, self._nbuilt)
+        raw = packets.view(np.uint8).reshape((ndue, self.n_tms, -1))
+        send_times = (
+            self._t0
+            + (self._nbuilt + np.arange(ndue))[:, np.newaxis] * self.packet_period
+            + self.rng.uniform(0, self.jitter, (ndue, self.n_tms))
+        )
+        # a reordered packet is delayed by 1.5 packet periods, i.e. it is sent
+        # after the next packet of its TM (unless the jitter is larger)
+        send_times += (
+            self.rng.random((ndue, self.n_tms)) < self.reorder
+        ) * (1.5 * self.packet_period)
+        tms = np.broadcast_to(np.arange(self.n_tms), (ndue, self.n_tms))
+        sent = self.rng.random((ndue, self.n_tms)) >= self.loss
+        self.nlost += int(sent.size - sent.sum())
+
+        send_times = np.concatenate((self._pending_times, send_times[sent]))
+        order = np.argsort(send_times, kind="stable")
+        self._pending_times = send_times[order]
+        self._pending_tms = np.concatenate((self._pending_tms, tms[sent]))[order]
+        self._pending_packets = np.concatenate((self._pending_packets, raw[sent]))[
+            order
+        ]
+        self._nbuilt += ndue
+
+    def send_due(self) -> int:
+        """ Sends the packets that are due
+
+        Returns:
+            int: number of packets sent
+        """
+        now = time.perf_counter()
+        self._schedule(now)
+        n = int(np.searchsorted(self._pending_times, now, side="right"))
+        socks = self.socks
+        tms = self._pending_tms[:n].tolist()
+        packets = self._pending_packets
+        for i in range(n):
+            try:
+                socks[tms[i]].send(packets[i])
+            except OSError:
+                self.nerrors += 1
+        self._pending_times = self._pending_times[n:]
+        self._pending_tms = self._pending_tms[n:]
+        self._pending_packets = self._pending_packets[n:]
+        self.npackets += n
+        return n
+
+    def run(self):
+        for c in self.corrs:
+            self.futures.append(self.loop.create_task(c))
+        try:
+            self.loop.run_forever()
+        except:
+            pass
+        for future in self.futures:
+            future.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(*self.futures, return_exceptions=True)
+        )
+        self.loop.close()
+
+    async def handle_commands(self):
+        """
+        This is the server part of the simulation that handles
+        incomming commands to control the simulation
+        """
+        while True:
+            cmd = await self.com_sock.recv()
+            cmd = cmd.decode("ascii").split(" ")
+            if cmd[0] in self.cmds.keys():
+                reply = self.cmds[cmd[0]](cmd[1:])
+            else:
+                reply = self.msg.encode("Error", "No command `%s` found." % (cmd[0]))
+            self.com_sock.send(reply)
+
+    async def send_ss_data(self):
+        t_start = time.perf_counter()
+        t_report = t_start
+        while True:
+            await self.send_ss_datae.wait()
+            self.send_due()
+            now = time.perf_counter()
+            if self.report_interval and now - t_report >= self.report_interval:
+                t_report = now
+                print(
+                    "Sent {npackets} packets, rate {achieved_packet_rate:.1f} Hz,"
+                    " lost {lost}, pending {pending}, send errors {send_errors}".format(
+                        **self.stats()
+                    )
+                )
+            if self.duration is not None and now - t_start >= self.duration:
+                self.loop.stop()
+                break
+            await asyncio.sleep(min(5e-4, self.packet_period))
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Simulates the slow signal data of all TMs of the camera in one process.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument(
+        "-d",
+        "--data-port",
+        type=int,
+        default=2009,
+        dest="data_port",
+        help="Slow signal data port",
+    )
+    parser.add_argument(
+        "-c",
+        "--com-port",
+        type=int,
+        default=30001,
+        dest="com_port",
+        help="Communications port",
+    )
+    parser.add_argument(
+        "-i",
+        "--ip",
+        type=str,
+        default="127.0.0.1",
+        dest="host_ip",
+        help="IP address of the host. For local host it is 127.0.0.1",
+    )
+    parser.add_argument(
+        "--ip-prefix",
+        type=str,
+        default="127.0.0.",
+        dest="ip_prefix",
+        help="Prefix of the TM source addresses",
+    )
+    parser.add_argument(
+        "--ip-offset",
+        type=int,
+        default=100,
+        dest="ip_offset",
+        help="Last number of the source address of TM 0",
+    )
+    parser.add_argument(
+        "-N", "--n-tms", type=int, default=dc.N_TM, dest="n_tms", help="Number of TMs"
+    )
+    parser.add_argument(
+        "-r", "--rate", type=float, default=100.0, help="Readout rate in Hz"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Max random packet delay in seconds"
+    )
+    parser.add_argument(
+        "--reorder",
+        type=float,
+        default=0.0,
+        help="Probability that a packet is sent after the next packet of its TM",
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0.0, help="Packet loss probability"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Stop after this many seconds and print the final statistics",
+    )
+
+    args = parser.parse_args()
+
+    camsim = CameraSimulator(
+        args.data_port,
+        str(args.com_port),
+        args.host_ip,
+        ip_prefix=args.ip_prefix,
+        ip_offset=args.ip_offset,
+        n_tms=args.n_tms,
+        readout_rate=args.rate,
+        jitter=args.jitter,
+        reorder=args.reorder,
+        loss=args.loss,
+        duration=args.duration,
+    )
+    camsim.run()
+    if args.duration is not None:
+        print(camsim.stats())
@@ -10,8 +10,18 @@ import zmq
 import zmq.asyncio
 from queue import Queue
 import inspect
-from ssdaq.data._dataimpl import trigger_format as data
-import bitarray
+from ssdaq.data._dataimpl.trigger_format import (
+    TriggerPacketV2,
+    TriggerPacketV3,
+    TriggerPatterns,
+)
+
+# offsets of the TACK and readout count in a packed V2/V3 packet
+# (after the 3 byte trigger packet header)
+_TACK_OFFSET = 3 + struct.calcsize("<2BHB")
+_RO_COUNT_OFFSET = 3 + struct.calcsize("<2BHBQB")
+_tack_form = struct.Struct("<Q")
+_ro_count_form = struct.Struct("<I")
 
 
 class TMMessage(object):
@@ -35,9 +45,199 @@ class TMMessage(object):
         return pickle.loads(msg)
 
 
+def simulate_trigger_patterns(
+    n: int,
+    ro_len: int = 128,
+    mode: str = "poisson",
+    mean_sps: float = 4.0,
+    run_length: int = 8,
+    rng: np.random.Generator = None,
+) -> np.ndarray:
+    """ Simulates a batch of bit-packed trigger patterns
+
+    Args:
+        n (int): number of patterns
+        ro_len (int, optional): readout length (multiple of 8)
+        mode (str, optional): `random` for uniformly random bits in all SPs or `poisson`
+                              for a Poisson distributed number of triggered SPs, each
+                              triggered during `run_length` consecutive phases
+        mean_sps (float, optional): mean number of triggered SPs (`poisson` mode)
+        run_length (int, optional): number of triggered phases of a SP (`poisson` mode)
+        rng (np.random.Generator, optional): random number generator
+
+    Returns:
+        np.ndarray: uint64 words of shape (n, 512, n_words) as in `TriggerPatterns`
+    """
+    rng = rng or np.random.default_rng()
+    nbytes = ro_len // 8
+    words = np.zeros((n, TriggerPatterns.n_sps, (ro_len + 63) // 64), dtype=np.uint64)
+    packed = words.view(np.uint8)
+    if mode == "random":
+        packed[..., :nbytes] = rng.integers(
+            0, 256, (n, TriggerPatterns.n_sps, nbytes), dtype=np.uint8
+        )
+    elif mode == "poisson":
+        nsps = rng.poisson(mean_sps, n)
+        pattrn_ind = np.repeat(np.arange(n), nsps)
+        sps = rng.integers(0, TriggerPatterns.n_sps, len(pattrn_ind))
+        start = rng.integers(0, ro_len - run_length + 1, len(pattrn_ind))
+        phases = np.arange(ro_len)
+        runs = (phases >= start[:, np.newaxis]) & (
+            phases < start[:, np.newaxis] + run_length
+        )
+        packed[pattrn_ind, sps, :nbytes] = np.packbits(runs, axis=1)
+    else:
+        raise ValueError("Unknown pattern mode `{}`".format(mode))
+    return words
+
+
+def build_trigger_packets(
+    n: int,
+    version: int = 2,
+    ro_len: int = 128,
+    busy_fraction: float = 0.0,
+    rng: np.random.Generator = None,
+    **kwargs
+) -> list:
+    """ Builds a batch of packed trigger packets with simulated patterns
+
+    Args:
+        n (int): number of packets
+        version (int, optional): trigger packet version (2 or 3)
+        ro_len (int, optional): readout length (multiple of 8)
+        busy_fraction (float, optional): fraction of busy triggers
+        rng (np.random.Generator, optional): random number generator
+        **kwargs: passed to `simulate_trigger_patterns`
+
+    Returns:
+        list: list of packets (bytearray)
+    """
+    rng = rng or np.random.default_rng()
+    packet_cls = {2: TriggerPacketV2, 3: TriggerPacketV3}[version]
+    words = simulate_trigger_patterns(n, ro_len, rng=rng, **kwargs)
+    busy = rng.random(n) < busy_fraction
+    phases = 1 << rng.integers(0, 8, n)
+    return [
+        packet_cls(
+            message_type=int(busy[i]),
+            tack_time=0,
+            phase=int(phases[i]),
+            ro_count=0,
+            trigg_pattrns=TriggerPatterns(words[i], ro_len),
+        ).pack()
+        for i in range(n)
+    ]
+
+
+class TriggerSender:
+    """ Sends trigger packets from a pool of prebuilt packets at a given rate.
+
+        Only the TACK and readout count are updated in a packet before it is
+        sent. `send_due` sends the packets due since the start at the target rate,
+        so calling it often enough gives a precise mean rate regardless of how
+        long each call waits. The TACK of each packet is its scheduled send time.
+    """
+
+    def __init__(self, sock: socket.socket, address: tuple, packets: list, rate: float):
+        """
+        Args:
+            sock (socket.socket): UDP socket
+            address (tuple): address to send to
+            packets (list): pool of packed trigger packets
+            rate (float): target rate in Hz
+        """
+        self.sock = sock
+        self.sock.connect(address)
+        self.packets = packets
+        self.npackets = 0
+        self.nerrors = 0
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float):
+        """ Sets the target rate (restarts the pacing)
+
+        Args:
+            rate (float): target rate in Hz (0 pauses sending)
+
+        Raises:
+            ValueError: if the rate is negative or not finite
+        """
+        rate = float(rate)
+        if not np.isfinite(rate) or rate < 0:
+            raise ValueError("Invalid rate {}, must be a finite rate >= 0".format(rate))
+        self.rate = rate
+        self._t0 = time.perf_counter()
+        self._tack0 = time.time_ns()
+        self._n0 = self.npackets
+        self._last_report = (self._t0, self.npackets)
+
+    def send_due(self, max_burst: int = 100000) -> int:
+        """ Sends the packets that are due
+
+        Args:
+            max_burst (int, optional): max number of packets sent in one call
+
+        Returns:
+            int: number of packets sent
+        """
+        elapsed = time.perf_counter() - self._t0
+        ndue = min(int(elapsed * self.rate) - (self.npackets - self._n0), max_burst)
+        if ndue <= 0:
+            return 0
+        packets = self.packets
+        npool = len(packets)
+        send = self.sock.send
+        pack_tack = _tack_form.pack_into
+        pack_ro_count = _ro_count_form.pack_into
+        dt = 1e9 / self.rate
+        tack0 = self._tack0 + (self.npackets - self._n0) * dt
+        n = self.npackets
+        for i in range(ndue):
+            packet = packets[(n + i) % npool]
+            pack_tack(packet, _TACK_OFFSET, int(tack0 + i * dt))
+            pack_ro_count(packet, _RO_COUNT_OFFSET, (n + i) & 0xFFFFFFFF)
+            try:
+                send(packet)
+            except OSError:
+                # e.g. ENOBUFS when the socket buffer is full
+                self.nerrors += 1
+        self.npackets += ndue
+        return ndue
+
+    def achieved_rate(self) -> float:
+        """ The rate achieved since the previous call
+
+        Returns:
+            float: rate in Hz
+        """
+        now = time.perf_counter()
+        t, n = self._last_report
+        self._last_report = (now, self.npackets)
+        return (self.npackets - n) / (now - t) if now > t else 0.0
+
+    @property
+    def lag(self) -> int:
+        """ Number of packets behind the target rate
+        """
+        elapsed = time.perf_counter() - self._t0
+        return int(elapsed * self.rate) - (self.npackets - self._n0)
+
+
 class TriggerPacketGenerator(object):
     def __init__(
-        self, send_port, server_port, host_ip="127.0.0.1", my_ip="127.0.0.1", tm_id=1
+        self,
+        send_port,
+        server_port,
+        host_ip="127.0.0.1",
+        my_ip="127.0.0.1",
+        tm_id=1,
+        rate=10.0,
+        version=2,
+        ro_len=128,
+        pool_size=4096,
+        report_interval=1.0,
+        duration=None,
+        **pattern_kwargs
     ):
         self.corrs = [self.handle_commands(), self.send_triggers_data(), self.sync()]
         self.loop = asyncio.get_event_loop()
@@ -50,9 +250,18 @@ class TriggerPacketGenerator(object):
         self.msg = TMMessage(name="TM:%d" % self.id, ip=self.my_ip)
 
         self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2 ** 24)
         self.host_address = (self.host_ip, send_port)
-        self.npackets = 0
+        self.report_interval = report_interval
+        self.duration = duration
+        self.sender = TriggerSender(
+            self.udp_sock,
+            self.host_address,
+            build_trigger_packets(pool_size, version, ro_len, **pattern_kwargs),
+            rate,
+        )
 
+        self.sending_triggers_data = True
         self.send_triggers_datae = asyncio.Event()
         self.send_triggers_datae.set()  # by default the simulation should be running
         self.sync_ss_data = asyncio.Event()
@@ -87,6 +296,7 @@ class TriggerPacketGenerator(object):
             return self.msg.encode("Error", "Argument `%s` not recognized as boolean")
 
         if self.sending_triggers_data:
+            self.sender.set_rate(self.sender.rate)
             self.send_triggers_datae.set()
         else:
             self.send_triggers_datae.clear()
@@ -101,16 +311,31 @@ class TriggerPacketGenerator(object):
     def cmd_change_rate(self, arg):
         # self.logger.debug('arg %s'%arg)
         if len(arg) == 1:
-            self.dt = 1 / float(arg[0])
-            return self.msg.encode("OK", "New rate set to %f Hz" % (float(arg[0])))
+            try:
+                self.sender.set_rate(arg[0])
+            except ValueError as e:
+                return self.msg.encode("Error", str(e))
+            return self.msg.encode("OK", "New rate set to %f Hz" % self.sender.rate)
         else:
             return self.msg.encode("Error", "Wrong number of arguments")
 
     def cmd_get_rate(self, arg):
-        return self.msg.encode("OK", 1.0 / self.dt)
+        return self.msg.encode("OK", self.sender.rate)
 
     def cmd_get_npackets_sent(self, arg):
-        return self.msg.encode("OK", self.npackets)
+        return self.msg.encode("OK", self.sender.npackets)
+
+    def cmd_get_stats(self, arg):
+        return self.msg.encode("OK", self.stats())
+
+    def stats(self):
+        return {
+            "target_rate": self.sender.rate,
+            "achieved_rate": self.sender.achieved_rate(),
+            "npackets": self.sender.npackets,
+            "send_errors": self.sender.nerrors,
+            "lag": self.sender.lag,
+        }
 
     def run(self):
         for c in self.corrs:
@@ -119,6 +344,11 @@ class TriggerPacketGenerator(object):
             self.loop.run_forever()
         except:
             pass
+        for future in self.futures:
+            future.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(*self.futures, return_exceptions=True)
+        )
         self.loop.close()
 
     async def handle_commands(self):
@@ -146,24 +376,26 @@ class TriggerPacketGenerator(object):
             self.sync_ss_data.set()
 
     async def send_triggers_data(self):
-        header = data.TriggerPacketData.pack_header(0, 22)
-        tack = 0
-        trp = bitarray.bitarray(0, endian="little")
-        i = 2 ** 512 - 1
-        trp.frombytes(i.to_bytes(64, "little"))
-
-        # packet.extend()
-
+        t_start = time.perf_counter()
+        t_report = t_start
         while True:
-            # packet = bytearray(header)
-            packet = bytearray(
-                data.NominalTriggerDataEncode.pack(tack, trp, 2, 3, 4, 0)
-            )
-            tack += 1
-            # print("Sending packet")
-            # print(packet)
-            self.udp_sock.sendto(packet, self.host_address)
-            time.sleep(0.1)
+            await self.send_triggers_datae.wait()
+            self.sender.send_due()
+            now = time.perf_counter()
+            if self.report_interval and now - t_report >= self.report_interval:
+                t_report = now
+                print(
+                    "Sent {npackets} packets, rate {achieved_rate:.1f} Hz"
+                    " (target {target_rate:.1f} Hz), lag {lag}, send errors {send_errors}".format(
+                        **self.stats()
+                    )
+                )
+            if self.duration is not None and now - t_start >= self.duration:
+                self.loop.stop()
+                break
+            # short sleeps keep the bursts small while letting commands through
+            rate = self.sender.rate
+            await asyncio.sleep(min(5e-4, 1.0 / rate) if rate > 0 else 5e-4)
 
 
 if __name__ == "__main__":
@@ -212,6 +444,47 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--tm-id", dest="tm_id", type=int, default=1, help="Target module id"
     )
+    parser.add_argument(
+        "-r", "--rate", type=float, default=10.0, help="Trigger rate in Hz"
+    )
+    parser.add_argument(
+        "-v",
+        "--version",
+        type=int,
+        default=2,
+        choices=[2, 3],
+        help="Trigger packet version",
+    )
+    parser.add_argument(
+        "--ro-len", type=int, default=128, dest="ro_len", help="Readout length"
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default="poisson",
+        choices=["poisson", "random"],
+        help="Trigger pattern simulation mode",
+    )
+    parser.add_argument(
+        "--mean-sps",
+        type=float,
+        default=4.0,
+        dest="mean_sps",
+        help="Mean number of triggered SPs (poisson mode)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=4096,
+        dest="pool_size",
+        help="Number of prebuilt packets",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Stop after this many seconds and print the final statistics",
+    )
 
     args = parser.parse_args()
 
@@ -221,5 +494,14 @@ if __name__ == "__main__":
         args.host_ip,
         my_ip=args.my_ip,
         tm_id=args.tm_id,
+        rate=args.rate,
+        version=args.version,
+        ro_len=args.ro_len,
+        pool_size=args.pool_size,
+        duration=args.duration,
+        mode=args.mode,
+        mean_sps=args.mean_sps,
     )
     triggsim.run()
+    if args.duration is not None:
+        print(triggsim.stats())
@@ -0,0 +1,138 @@
+""" Performance benchmarks of the DAQ.
+
+    The benchmarks produce results as nested dictionaries of metrics that
+    are written as JSON so that runs can be compared to a stored baseline
+    (see ``compare_to_baseline``).
+"""
+import json
+import platform
+import resource
+import sys
+from datetime import datetime
+
+import numpy as np
+
+
+def cpu_time() -> float:
+    """ User and system CPU time of this process (all threads) in seconds
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def latency_summary(latencies_ns) -> dict:
+    """ Summarizes latencies
+
+    Args:
+        latencies_ns (array_like): latencies in nanoseconds
+
+    Returns:
+        dict: p50, p99 and max latency in milliseconds (None if no latencies)
+    """
+    latencies = np.asarray(latencies_ns, dtype=np.float64) * 1e-6
+    if len(latencies) == 0:
+        return {"latency_p50_ms": None, "latency_p99_ms": None, "latency_max_ms": None}
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        "latency_p50_ms": float(p50),
+        "latency_p99_ms": float(p99),
+        "latency_max_ms": float(latencies.max()),
+    }
+
+
+def make_results(name: str, config: dict, results: dict) -> dict:
+    """ Wraps benchmark results with information about the run
+
+    Args:
+        name (str): name of the benchmark
+        config (dict): the benchmark configuration
+        results (dict): results keyed by benchmark case
+
+    Returns:
+        dict: the results document
+    """
+    return {
+        "benchmark": name,
+        "time": datetime.utcnow().isoformat(),
+        "host": platform.node(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "config": config,
+        "results": results,
+    }
+
+
+def write_results(results: dict, filename: str = None):
+    """ Writes results as JSON to a file or to stdout if no filename is given
+    """
+    if filename is None:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(filename, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def load_results(filename: str) -> dict:
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def compare_to_baseline(
+    results: dict, baseline: dict, metrics: dict, tolerance: float = 0.1
+) -> list:
+    """ Compares results to a baseline
+
+    Args:
+        results (dict): results document (see ``make_results``)
+        baseline (dict): baseline results document
+        metrics (dict): the compared metrics and whether higher values are
+                        better, e.g. `{"throughput_per_s": True, "latency_p99_ms": False}`
+        tolerance (float, optional): allowed relative change in the bad direction
+
+    Returns:
+        list: regressions as tuples (case, metric, baseline value, value)
+    """
+    regressions = []
+    for case, values in results["results"].items():
+        base = baseline["results"].get(case)
+        if base is None:
+            continue
+        for metric, higher_is_better in metrics.items():
+            value, base_value = values.get(metric), base.get(metric)
+            if value is None or base_value is None:
+                continue
+            if higher_is_better:
+                regressed = value < base_value * (1 - tolerance)
+            else:
+                regressed = value > base_value * (1 + tolerance)
+            if regressed:
+                regressions.append((case, metric, base_value, value))
+    return regressions
+
+
+def format_table(results: dict, columns: list) -> str:
+    """ Formats results as a text table with one row per case
+
+    Args:
+        results (dict): results document (see ``make_results``)
+        columns (list): metrics to show
+
+    Returns:
+        str: the table
+    """
+    header = ["case"] + columns
+    rows = [header]
+    for case, values in results["results"].items():
+        row = [case]
+        for column in columns:
+            value = values.get(column)
+            if isinstance(value, float):
+                value = "{:.4g}".format(value)
+            row.append("-" if value is None else str(value))
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(row, widths))
+        for row in rows
+    )
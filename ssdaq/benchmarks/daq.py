@@ -0,0 +1,773 @@
+""" End-to-end throughput and latency benchmark of the DAQ chain.
+
+    Each stage of the chain is run in this process on loopback while
+    simulated traffic is sent from a separate process:
+
+        * ``assembler``: TM packets -> ReadoutAssembler -> publisher
+        * ``trigger``: trigger packets -> TriggerPacketReceiver -> publisher
+        * ``zmq``: ZMQTCPPublisher -> AsyncSubscriber
+        * ``writer_hdf5``: ZMQTCPPublisher -> AsyncWriterSubscriber -> SSDataWriter
+        * ``writer_sof``: ZMQTCPPublisher -> AsyncWriterSubscriber -> RawTriggerWriter
+
+    The senders stamp the packets with the send time (`time.time_ns()`) as
+    TACK, so that the latency from packet to publish (or write) is the
+    difference between the time the data leaves a stage and its TACK.
+
+    Run ``ssdaq-daq-benchmark --help`` for the options.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ssdaq.benchmarks import (
+    compare_to_baseline,
+    cpu_time,
+    format_table,
+    latency_summary,
+    load_results,
+    make_results,
+    write_results,
+)
+
+# Offset of the TACK in a V2/V3 trigger packet (3 byte header + 5 bytes)
+TRIGGER_TACK_OFFSET = 8
+_trigger_tack = struct.Struct("<Q")
+
+# default rates of the stages (readouts/s for the assembler, otherwise messages/s)
+DEFAULT_RATES = {
+    "assembler": 1000,
+    "trigger": 10000,
+    "zmq": 2000,
+    "writer_hdf5": 1000,
+    "writer_sof": 10000,
+}
+# metrics compared to a baseline and whether higher values are better
+BASELINE_METRICS = {
+    "packets_per_s": True,
+    "readouts_per_s": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+}
+TABLE_COLUMNS = [
+    "sent",
+    "received",
+    "dropped",
+    "packets_per_s",
+    "readouts_per_s",
+    "latency_p50_ms",
+    "latency_p99_ms",
+    "cpu_util",
+]
+
+
+def _paced(rate: float, duration: float):
+    """ Yields the number of each send at the given rate. Sleeps while the
+        next send is far ahead and spins otherwise
+    """
+    period = 1.0 / rate
+    t0 = time.perf_counter()
+    for i in range(int(rate * duration)):
+        due = t0 + i * period
+        while True:
+            dt = due - time.perf_counter()
+            if dt <= 0:
+                break
+            if dt > 2e-4:
+                time.sleep(dt - 1e-4)
+        yield i
+
+
+def _sender_stats(n_sent, t0, cpu0, **kwargs):
+    elapsed = time.perf_counter() - t0
+    return dict(
+        sent=n_sent,
+        send_elapsed_s=elapsed,
+        send_rate=n_sent / elapsed if elapsed > 0 else 0.0,
+        sender_cpu_s=time.process_time() - cpu0,
+        **kwargs
+    )
+
+
+def _tm_sender(
+    conn, address, readout_rate, duration, n_tms, ip_prefix, ip_offset, start_delay, flush_ns
+):
+    """ Sends packets of 10 readouts from `n_tms` TMs. All TMs of a packet
+        share the TACK, which is the send time of the packet.
+    """
+    from ssdaq.receivers.readout_assembler import readout_dtype
+
+    socks = []
+    for tm in range(n_tms):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("{}{}".format(ip_prefix, ip_offset + tm), 0))
+        sock.connect(address)
+        socks.append(sock)
+    packets = np.zeros((n_tms, 10), dtype=readout_dtype)
+    rng = np.random.default_rng(0)
+    for field in ["adc0", "adc1"]:
+        packets[field] = rng.integers(0, 4096, packets[field].shape) ^ 0x8000
+    dt = int(1e9 / readout_rate)
+    offsets = np.arange(10, dtype=np.uint64) * np.uint64(dt)
+
+    def send(tack):
+        packets["tack0"] = np.uint64(tack) + offsets
+        packets["tack1"] = packets["tack0"]
+        for tm, sock in enumerate(socks):
+            sock.send(packets[tm])
+
+    time.sleep(start_delay)
+    tacks = []
+    last = 0
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    for _ in _paced(readout_rate / 10, duration):
+        # readouts of consecutive packets must not overlap when the sender lags
+        tack = max(time.time_ns(), last + 10 * dt)
+        send(tack)
+        tacks.append(tack)
+        last = tack
+    stats = _sender_stats(len(tacks) * n_tms, t0, cpu0, packet_tacks=tacks)
+    # packets far ahead in time expire the readouts still in the assembler buffer
+    time.sleep(0.05)
+    send(last + flush_ns)
+    conn.send(stats)
+
+
+def _trigger_pool(n: int = 64):
+    from ssdaq.data import TriggerPacketV2
+
+    rng = np.random.default_rng(0)
+    return [
+        bytearray(
+            TriggerPacketV2(
+                trigg_pattrns=rng.integers(0, 2, (128, 512), dtype=np.uint8),
+                ro_count=i,
+            ).pack()
+        )
+        for i in range(n)
+    ]
+
+
+def _trigger_sender(conn, address, rate, duration, start_delay):
+    """ Sends V2 trigger packets with the send time as TACK
+    """
+    pool = _trigger_pool()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(address)
+    time.sleep(start_delay)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    n = 0
+    for n in _paced(rate, duration):
+        packet = pool[n % len(pool)]
+        _trigger_tack.pack_into(packet, TRIGGER_TACK_OFFSET, time.time_ns())
+        sock.send(packet)
+    conn.send(_sender_stats(n + 1, t0, cpu0))
+
+
+def _zmq_sender(conn, ip, port, rate, duration, kind, start_delay):
+    """ Publishes packed readouts or trigger packets with the send time as TACK
+        (and the message number as readout number)
+    """
+    from ssdaq.core.publishers import ZMQTCPPublisher
+    from ssdaq.data import SSReadout
+    from ssdaq.data._dataimpl import slowsignal_format as dc
+
+    pub = ZMQTCPPublisher(ip, port, name="BenchmarkPublisher")
+    if kind == "readout":
+        rng = np.random.default_rng(0)
+        template = SSReadout(data=rng.normal(size=(dc.N_TM, dc.N_TM_PIX))).pack()
+
+        def make(n):
+            packet = bytearray(template)
+            dc.readout_header.pack_into(packet, 0, n, time.time_ns(), 0, 0)
+            return packet
+
+    else:
+        pool = _trigger_pool()
+
+        def make(n):
+            # a new buffer per message since zmq does not copy it
+            packet = bytearray(pool[n % len(pool)])
+            _trigger_tack.pack_into(packet, TRIGGER_TACK_OFFSET, time.time_ns())
+            return packet
+
+    # gives the subscriber time to connect
+    time.sleep(start_delay)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    n = 0
+    for n in _paced(rate, duration):
+        pub.publish(make(n))
+    stats = _sender_stats(n + 1, t0, cpu0)
+    # lets zmq send the queued messages before the process exits
+    time.sleep(0.2)
+    pub.sock.close(linger=1000)
+    conn.send(stats)
+
+
+def _start_sender(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=target, args=(child_conn,) + args, daemon=True)
+    proc.start()
+    return proc, conn
+
+
+class _Probe:
+    """ Records the TACK and the time each message leaves a stage
+    """
+
+    def __init__(self):
+        self.tacks = []
+        self.times = []
+
+    def record(self, tack):
+        self.tacks.append(tack)
+        self.times.append(time.time_ns())
+
+    def __len__(self):
+        return len(self.times)
+
+    def rate(self) -> float:
+        """ Message rate over the time from the first to the last message
+        """
+        if len(self.times) < 2:
+            return 0.0
+        return (len(self.times) - 1) / ((self.times[-1] - self.times[0]) * 1e-9)
+
+
+class _ProbePublisher:
+    """ Stands in for the publishers of a receiver and records what is published
+    """
+
+    def __init__(self, tack_of):
+        self.name = "ProbePublisher"
+        self.probe = _Probe()
+        self._tack_of = tack_of
+
+    def set_loop(self, loop):
+        self.loop = loop
+
+    def publish(self, packet):
+        self.probe.record(self._tack_of(packet))
+
+    async def apublish(self, packet):
+        self.probe.record(self._tack_of(packet))
+
+
+async def _finish(conn, counter, settle: float = 0.3, timeout: float = 10.0):
+    """ Waits for the sender statistics and then until the stage
+        has processed all messages (the counter stops changing)
+    """
+    loop = asyncio.get_event_loop()
+    stats = await loop.run_in_executor(None, conn.recv)
+    last = counter()
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        await asyncio.sleep(settle)
+        n = counter()
+        if n == last:
+            break
+        last = n
+    return stats
+
+
+def _stage_result(stats, received, latencies, wall, cpu_s, **kwargs):
+    result = dict(
+        sent=stats["sent"],
+        received=received,
+        dropped=stats["sent"] - received,
+        send_rate=stats["send_rate"],
+        duration_s=stats["send_elapsed_s"],
+        packets_per_s=received / stats["send_elapsed_s"],
+        readouts_per_s=None,
+        cpu_s=cpu_s,
+        cpu_util=cpu_s / wall,
+        sender_cpu_s=stats["sender_cpu_s"],
+    )
+    result.update(latency_summary(latencies))
+    result.update(kwargs)
+    return result
+
+
+def _new_loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def _close_loop(loop):
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def _close_server(server):
+    server._com_sock.close(linger=0)
+    server._context.destroy(linger=0)
+
+
+def bench_assembler(
+    rate: float,
+    duration: float,
+    port: int,
+    n_tms: int = 32,
+    buffer_time: float = 0.1,
+    batch_receive: bool = True,
+    decode_workers: int = 0,
+    wire_format: str = "float64",
+    start_delay: float = 1.0,
+) -> dict:
+    """ Benchmarks the ReadoutAssembler
+
+    Args:
+        rate (float): readout rate (the packet rate is `n_tms * rate / 10`)
+        duration (float): send duration in seconds
+        port (int): listen port of the assembler
+        n_tms (int, optional): number of simulated TMs
+        buffer_time (float, optional): assembler buffer time in seconds
+        batch_receive (bool, optional): use the batched receive mode
+        decode_workers (int, optional): number of decode worker processes
+        wire_format (str, optional): wire format of the published readouts
+        start_delay (float, optional): time for the assembler to start
+
+    Returns:
+        dict: the stage metrics
+    """
+    from ssdaq.data._dataimpl import slowsignal_format as dc
+    from ssdaq.receivers import ReadoutAssembler
+
+    incomplete = [0]
+
+    def tack_of(packet):
+        if bytes(packet[:2]) == dc.COMPACT_MAGIC:
+            header = dc.compact_header.unpack_from(packet)
+            tms, tack = bin(header[3]).count("1"), header[5]
+        else:
+            tack = dc.readout_header.unpack_from(packet)[1]
+            data = np.frombuffer(packet, "<f8", dc.N_CAM_PIX, 32)[:: dc.N_TM_PIX]
+            tms = dc.N_TM - np.count_nonzero(np.isnan(data))
+        if tms < n_tms:
+            incomplete[0] += 1
+        return tack
+
+    loop = _new_loop()
+    probe_pub = _ProbePublisher(tack_of)
+    flush_ns = int(10 * buffer_time * 1e9)
+    assembler = ReadoutAssembler(
+        relaxed_ip_range=True,
+        listen_ip="127.0.0.1",
+        listen_port=port,
+        buffer_time=buffer_time * 1e9,
+        publishers=[probe_pub],
+        batch_receive=batch_receive,
+        decode_workers=decode_workers,
+        wire_format=wire_format,
+    )
+    assembler._introspect()
+    for corr in assembler.corrs:
+        loop.create_task(corr)
+    mon = assembler.ss_data_protocol.mon
+
+    wall0, cpu0 = time.perf_counter(), cpu_time()
+    proc, conn = _start_sender(
+        _tm_sender,
+        ("127.0.0.1", port),
+        rate,
+        duration,
+        n_tms,
+        "127.0.0.",
+        100,
+        start_delay,
+        flush_ns,
+    )
+    stats = loop.run_until_complete(_finish(conn, lambda: len(probe_pub.probe)))
+    wall, cpu_s = time.perf_counter() - wall0, cpu_time() - cpu0
+    proc.join()
+
+    probe = probe_pub.probe
+    tacks = np.array(probe.tacks, dtype=np.uint64)
+    times = np.array(probe.times, dtype=np.int64)
+    packet_tacks = np.array(stats.pop("packet_tacks"), dtype=np.uint64)
+    # ignoring the readouts of the flush packets
+    measured = tacks < packet_tacks[-1] + np.uint64(flush_ns // 2)
+    tacks, times = tacks[measured], times[measured]
+    # latency from the TM packet that contained the readout
+    sent = packet_tacks[np.searchsorted(packet_tacks, tacks, side="right") - 1]
+    latencies = times - sent.astype(np.int64)
+
+    kernel_drops = None
+    if batch_receive:
+        kernel_drops = assembler.ss_data_protocol.dropped_packets
+        assembler.ss_data_protocol.reader.pause()
+        assembler.transport.close()
+    else:
+        assembler.transport.close()
+    if assembler.decoder_pool is not None:
+        assembler.decoder_pool.close()
+    received = min(mon.total_data_counter, stats["sent"])
+    _close_server(assembler)
+    _close_loop(loop)
+
+    result = _stage_result(
+        stats,
+        received,
+        latencies,
+        wall,
+        cpu_s,
+        readouts_expected=len(packet_tacks) * 10,
+        readouts_published=int(measured.sum()),
+        incomplete_readouts=incomplete[0],
+        kernel_drops=kernel_drops,
+    )
+    if len(times) > 1:
+        result["readouts_per_s"] = (len(times) - 1) / ((times[-1] - times[0]) * 1e-9)
+    return result
+
+
+def bench_trigger(
+    rate: float, duration: float, port: int, start_delay: float = 1.0
+) -> dict:
+    """ Benchmarks the TriggerPacketReceiver
+
+    Args:
+        rate (float): trigger packet rate
+        duration (float): send duration in seconds
+        port (int): listen port of the receiver
+        start_delay (float, optional): time for the receiver to start
+
+    Returns:
+        dict: the stage metrics
+    """
+    from ssdaq.core.udp_batch import proc_net_udp_drops
+    from ssdaq.receivers import TriggerPacketReceiver
+
+    loop = _new_loop()
+    probe_pub = _ProbePublisher(
+        lambda packet: _trigger_tack.unpack_from(packet, TRIGGER_TACK_OFFSET)[0]
+    )
+    receiver = TriggerPacketReceiver("127.0.0.1", port, [probe_pub])
+    receiver._introspect()
+    for corr in receiver.corrs:
+        loop.create_task(corr)
+
+    wall0, cpu0 = time.perf_counter(), cpu_time()
+    proc, conn = _start_sender(
+        _trigger_sender, ("127.0.0.1", port), rate, duration, start_delay
+    )
+    stats = loop.run_until_complete(_finish(conn, lambda: len(probe_pub.probe)))
+    wall, cpu_s = time.perf_counter() - wall0, cpu_time() - cpu0
+    proc.join()
+
+    probe = probe_pub.probe
+    latencies = np.array(probe.times, dtype=np.int64) - np.array(
+        probe.tacks, dtype=np.int64
+    )
+    kernel_drops = proc_net_udp_drops(receiver.trans.get_extra_info("socket"))
+    receiver.trans.close()
+    _close_server(receiver)
+    _close_loop(loop)
+    return _stage_result(
+        stats, len(probe), latencies, wall, cpu_s, kernel_drops=kernel_drops
+    )
+
+
+def _readout_tack(data):
+    from ssdaq.data._dataimpl import slowsignal_format as dc
+
+    return dc.readout_header.unpack_from(data)[1]
+
+
+def _packet_tack(data):
+    return _trigger_tack.unpack_from(data, TRIGGER_TACK_OFFSET)[0]
+
+
+def bench_zmq(rate: float, duration: float, port: int, start_delay: float = 1.0) -> dict:
+    """ Benchmarks the hop from a ZMQTCPPublisher to an AsyncSubscriber
+        with packed readouts
+
+    Args:
+        rate (float): message rate
+        duration (float): send duration in seconds
+        port (int): publisher port
+        start_delay (float, optional): time for the subscriber to connect
+
+    Returns:
+        dict: the stage metrics
+    """
+    from ssdaq.core.basesubscribers import AsyncSubscriber
+
+    loop = _new_loop()
+    probe = _Probe()
+    sub = AsyncSubscriber(
+        "127.0.0.1",
+        port,
+        unpack=lambda data: probe.record(_readout_tack(data)),
+        loop=loop,
+        passoff_callback=lambda data: None,
+        name="BenchmarkSubscriber",
+        copy=False,
+    )
+
+    wall0, cpu0 = time.perf_counter(), cpu_time()
+    proc, conn = _start_sender(
+        _zmq_sender, "127.0.0.1", port, rate, duration, "readout", start_delay
+    )
+    stats = loop.run_until_complete(_finish(conn, lambda: len(probe)))
+    wall, cpu_s = time.perf_counter() - wall0, cpu_time() - cpu0
+    proc.join()
+
+    latencies = np.array(probe.times, dtype=np.int64) - np.array(
+        probe.tacks, dtype=np.int64
+    )
+    loop.run_until_complete(sub.close())
+    sub._context.destroy(linger=0)
+    _close_loop(loop)
+    return _stage_result(
+        stats, len(probe), latencies, wall, cpu_s, readouts_per_s=probe.rate()
+    )
+
+
+def _bench_writer(
+    rate: float, duration: float, port: int, kind: str, start_delay: float = 1.0
+) -> dict:
+    from ssdaq.core.basesubscribers import AsyncSubscriber, AsyncWriterSubscriber
+    from ssdaq.data import io
+    from ssdaq.subscribers import AsyncSSReadoutSubscriber
+
+    if kind == "readout":
+        subscriber, writer, ext = AsyncSSReadoutSubscriber, io.SSDataWriter, ".hdf5"
+        tack_of = lambda readout: readout.time
+    else:
+        subscriber, writer, ext = AsyncSubscriber, io.RawTriggerWriter, ".sof"
+        tack_of = _packet_tack
+
+    loop = _new_loop()
+    probe = _Probe()
+    with tempfile.TemporaryDirectory() as folder:
+        writer_sub = AsyncWriterSubscriber(
+            "benchmark",
+            "127.0.0.1",
+            port,
+            subscriber=subscriber,
+            writer=writer,
+            file_ext=ext,
+            name="BenchmarkWriter",
+            folder=folder,
+            loop=loop,
+        )
+        write = writer_sub.write
+
+        def timed_write(data):
+            write(data)
+            probe.record(tack_of(data))
+
+        writer_sub.write = timed_write
+
+        wall0, cpu0 = time.perf_counter(), cpu_time()
+        proc, conn = _start_sender(
+            _zmq_sender, "127.0.0.1", port, rate, duration, kind, start_delay
+        )
+        stats = loop.run_until_complete(_finish(conn, lambda: len(probe)))
+        loop.run_until_complete(writer_sub.close())
+        wall, cpu_s = time.perf_counter() - wall0, cpu_time() - cpu0
+        proc.join()
+        nbytes = os.stat(writer_sub.filename).st_size
+
+    latencies = np.array(probe.times, dtype=np.int64) - np.array(
+        probe.tacks, dtype=np.int64
+    )
+    writer_sub._subscriber._context.destroy(linger=0)
+    _close_loop(loop)
+    return _stage_result(
+        stats,
+        writer_sub.data_counter,
+        latencies,
+        wall,
+        cpu_s,
+        readouts_per_s=probe.rate() if kind == "readout" else None,
+        bytes_written=nbytes,
+        write_mb_per_s=nbytes / 1024 ** 2 / stats["send_elapsed_s"],
+    )
+
+
+def bench_writer_hdf5(rate: float, duration: float, port: int, **kwargs) -> dict:
+    """ Benchmarks writing published readouts with the SSDataWriter
+    """
+    return _bench_writer(rate, duration, port, "readout", **kwargs)
+
+
+def bench_writer_sof(rate: float, duration: float, port: int, **kwargs) -> dict:
+    """ Benchmarks writing published trigger packets with the RawTriggerWriter
+    """
+    return _bench_writer(rate, duration, port, "trigger", **kwargs)
+
+
+STAGES = {
+    "assembler": bench_assembler,
+    "trigger": bench_trigger,
+    "zmq": bench_zmq,
+    "writer_hdf5": bench_writer_hdf5,
+    "writer_sof": bench_writer_sof,
+}
+
+
+def run(
+    stages: list = None,
+    rates: dict = None,
+    duration: float = 5.0,
+    port_base: int = 17500,
+    assembler_opts: dict = None,
+) -> dict:
+    """ Runs the benchmark stages one after the other
+
+    Args:
+        stages (list, optional): names of the stages to run (default all)
+        rates (dict, optional): rates of the stages overriding `DEFAULT_RATES`
+        duration (float, optional): send duration of each stage in seconds
+        port_base (int, optional): the stages use ports from `port_base` and up
+        assembler_opts (dict, optional): keyword arguments of `bench_assembler`
+
+    Returns:
+        dict: the results document
+    """
+    stages = stages or list(STAGES.keys())
+    rates = dict(DEFAULT_RATES, **(rates or {}))
+    results = {}
+    for i, stage in enumerate(stages):
+        kwargs = (assembler_opts or {}) if stage == "assembler" else {}
+        result = STAGES[stage](rates[stage], duration, port_base + i, **kwargs)
+        result["target_rate"] = rates[stage]
+        results[stage] = result
+    config = dict(
+        stages=stages,
+        rates={stage: rates[stage] for stage in stages},
+        duration=duration,
+        assembler_opts=assembler_opts or {},
+        cpu_count=os.cpu_count(),
+    )
+    return make_results("daq", config, results)
+
+
+def _parse_rates(text):
+    rates = {}
+    for item in text.split(","):
+        stage, rate = item.split("=")
+        if stage not in STAGES:
+            raise argparse.ArgumentTypeError("Unknown stage `{}`".format(stage))
+        rates[stage] = float(rate)
+    return rates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="End-to-end throughput and latency benchmark of the DAQ chain",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-s",
+        "--stages",
+        nargs="+",
+        choices=list(STAGES.keys()),
+        default=list(STAGES.keys()),
+        help="stages to benchmark",
+    )
+    parser.add_argument(
+        "-r",
+        "--rates",
+        type=_parse_rates,
+        default={},
+        help="rates per stage, e.g. `assembler=2000,trigger=50000` (defaults: {})".format(
+            DEFAULT_RATES
+        ),
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=5.0, help="send duration per stage in s"
+    )
+    parser.add_argument(
+        "-p", "--port-base", type=int, default=17500, help="first port used"
+    )
+    parser.add_argument(
+        "--n-tms", type=int, default=32, help="number of simulated TMs"
+    )
+    parser.add_argument(
+        "--buffer-time", type=float, default=0.1, help="assembler buffer time in s"
+    )
+    parser.add_argument(
+        "--no-batch-receive",
+        action="store_true",
+        help="use the datagram protocol receive mode of the assembler",
+    )
+    parser.add_argument(
+        "--decode-workers", type=int, default=0, help="assembler decode workers"
+    )
+    parser.add_argument(
+        "--wire-format",
+        default="float64",
+        choices=["float64", "float32", "uint16"],
+        help="readout wire format of the assembler",
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="write the results as JSON to this file"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print the results as JSON to stdout"
+    )
+    parser.add_argument(
+        "-b", "--baseline", default=None, help="results file to compare to"
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed relative regression compared to the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        stages=args.stages,
+        rates=args.rates,
+        duration=args.duration,
+        port_base=args.port_base,
+        assembler_opts=dict(
+            n_tms=args.n_tms,
+            buffer_time=args.buffer_time,
+            batch_receive=not args.no_batch_receive,
+            decode_workers=args.decode_workers,
+            wire_format=args.wire_format,
+        ),
+    )
+    if args.output is not None:
+        write_results(results, args.output)
+    if args.json:
+        write_results(results)
+    else:
+        print(format_table(results, TABLE_COLUMNS))
+
+    if args.baseline is not None:
+        regressions = compare_to_baseline(
+            results, load_results(args.baseline), BASELINE_METRICS, args.tolerance
+        )
+        for stage, metric, base, value in regressions:
+            print(
+                "Regression in {} {}: {:.4g} (baseline {:.4g})".format(
+                    stage, metric, value, base
+                ),
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
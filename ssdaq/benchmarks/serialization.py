@@ -0,0 +1,406 @@
+""" Micro-benchmark of the serialization formats of the data classes.
+
+    For each case (a data class and a payload) the encode and decode
+    throughput, the memory allocated by encoding and decoding and the
+    encoded size are measured:
+
+        * ``ssreadout_<encoding>``: `SSReadout.pack/unpack` in the float64 and compact encodings
+        * ``frame_readouts_<n>``: `Frame.serialize/deserialize` of a frame with n readouts
+        * ``frame_array_<n>``: `Frame.serialize/deserialize` of a frame with an (n, 32, 64) array
+        * ``trigger_<version>_<n>``: `TriggerPacket.pack/unpack` with n readouts of patterns
+        * ``protobuf_*``: the `ProtoBWrapper` data types
+
+    Cases that fail (e.g. because a format is not supported by an installed
+    dependency) are reported with the error instead of metrics.
+
+    Run ``ssdaq-serialization-benchmark --help`` for the options.
+"""
+import argparse
+import fnmatch
+import gc
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from ssdaq.benchmarks import (
+    compare_to_baseline,
+    format_table,
+    load_results,
+    make_results,
+    write_results,
+)
+
+# metrics compared to a baseline and whether higher values are better
+BASELINE_METRICS = {
+    "encode_mb_per_s": True,
+    "decode_mb_per_s": True,
+    "encoded_bytes": False,
+}
+TABLE_COLUMNS = [
+    "encoded_bytes",
+    "encode_us",
+    "decode_us",
+    "encode_mb_per_s",
+    "decode_mb_per_s",
+    "encode_blocks",
+    "decode_blocks",
+    "error",
+]
+
+
+class Case:
+    """ A benchmark case
+
+    Args:
+        name (str): name of the case
+        setup (callable): returns the object to encode
+        encode (callable): encodes the object to bytes
+        decode (callable): decodes the bytes
+    """
+
+    def __init__(self, name, setup, encode, decode):
+        self.name = name
+        self.setup = setup
+        self.encode = encode
+        self.decode = decode
+
+
+def _readout(rng):
+    from ssdaq.data import SSReadout
+    from ssdaq.data._dataimpl import slowsignal_format as dc
+
+    return SSReadout(
+        timestamp=int(time.time() * 1e9),
+        readout_number=1,
+        data=rng.normal(200, 20, (dc.N_TM, dc.N_TM_PIX)),
+    )
+
+
+def _decode_frame(data):
+    from ssdaq.data import Frame
+
+    # deserializes all objects as the objects in a frame are deserialized on access
+    frame = Frame.deserialize(data)
+    return [obj for _, obj in frame.items()]
+
+
+def _frame(objects):
+    from ssdaq.data import Frame
+
+    frame = Frame()
+    for key, obj in objects.items():
+        frame.add(key, obj)
+    return frame
+
+
+def _trigger_packet(version, n, rng):
+    from ssdaq.data import NominalTriggerPacketV1, TriggerPacketV2, TriggerPacketV3
+
+    if version == "v1":
+        return NominalTriggerPacketV1(
+            TACK=int(time.time() * 1e9),
+            trigg_phases=(rng.random((16, 512)) < 0.01).astype(np.uint8),
+        )
+    cls = TriggerPacketV2 if version == "v2" else TriggerPacketV3
+    return cls(
+        tack_time=int(time.time() * 1e9),
+        trigg_pattrns=(rng.random((n, 512)) < 0.01).astype(np.uint8),
+    )
+
+
+def _trigger_bunch(n):
+    from ssdaq.data import TriggerBunch
+
+    bunch = TriggerBunch()
+    bunch.telescope = 1
+    bunch.bunch_counter = 1
+    for i in range(n):
+        trigger = bunch.triggers.add()
+        trigger.event_counter = i
+        trigger.pps_counter = i // 1000
+        trigger.clock_counter = i * 1000
+        trigger.time.seconds = 1600000000 + i
+        trigger.time.pico_seconds = i * 1000
+        trigger.pattern = i
+    return bunch
+
+
+def _teldata():
+    from ssdaq.data import TelData
+
+    teldata = TelData()
+    teldata.ra = 83.63
+    teldata.dec = 22.01
+    teldata.time.sec = 1600000000
+    teldata.time.nsec = 123456789
+    return teldata
+
+
+def _log_data():
+    from ssdaq.data import LogData
+
+    log = LogData()
+    log.systemType = 0
+    log.severity = 20
+    log.sender = "ssdaq.ReadoutAssembler"
+    log.message = "Opened new file, will write events to file: /data/SlowSignal.hdf5"
+    log.time = int(time.time() * 1e9)
+    log.pid = 1000
+    log.sourceFile = "readout_assembler.py"
+    log.line = 100
+    return log
+
+
+def make_cases(seed: int = 0) -> list:
+    """ Creates the benchmark cases
+
+    Args:
+        seed (int, optional): seed of the random payloads
+
+    Returns:
+        list: the cases
+    """
+    from ssdaq.data import SSReadout, TriggerPacket, TriggerBunch, TelData, LogData
+
+    rng = np.random.default_rng(seed)
+    cases = []
+    for encoding in ["float64", "float32", "uint16"]:
+        cases.append(
+            Case(
+                "ssreadout_" + encoding,
+                lambda: _readout(rng),
+                lambda obj, encoding=encoding: obj.pack(encoding),
+                SSReadout.from_bytes,
+            )
+        )
+    for n in [1, 10, 100]:
+        cases.append(
+            Case(
+                "frame_readouts_{}".format(n),
+                lambda n=n: _frame(
+                    {"readout{}".format(i): _readout(rng) for i in range(n)}
+                ),
+                lambda obj: obj.serialize(),
+                _decode_frame,
+            )
+        )
+    for n in [1, 100]:
+        cases.append(
+            Case(
+                "frame_array_{}".format(n),
+                lambda n=n: _frame({"images": rng.normal(size=(n, 32, 64))}),
+                lambda obj: obj.serialize(),
+                _decode_frame,
+            )
+        )
+    for version, n in [("v1", 1), ("v2", 8), ("v2", 128), ("v3", 8), ("v3", 128)]:
+        cases.append(
+            Case(
+                "trigger_{}_{}".format(version, n),
+                lambda version=version, n=n: _trigger_packet(version, n, rng),
+                lambda obj: obj.pack(),
+                TriggerPacket.unpack,
+            )
+        )
+    for n in [1, 100, 1000]:
+        cases.append(
+            Case(
+                "protobuf_triggerbunch_{}".format(n),
+                lambda n=n: _trigger_bunch(n),
+                lambda obj: obj.serialize(),
+                TriggerBunch.deserialize,
+            )
+        )
+    cases.append(
+        Case("protobuf_teldata", _teldata, lambda obj: obj.serialize(), TelData.deserialize)
+    )
+    cases.append(
+        Case("protobuf_log", _log_data, lambda obj: obj.serialize(), LogData.deserialize)
+    )
+    return cases
+
+
+def time_per_op(func, min_time: float = 0.2, repeat: int = 5) -> float:
+    """ Times a function
+
+    Args:
+        func (callable): the function
+        min_time (float, optional): minimum time of each repetition in seconds
+        repeat (int, optional): number of repetitions
+
+    Returns:
+        float: the best time per call in seconds
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    return min([elapsed] + timer.repeat(repeat - 1, number)) / number
+
+
+def allocations(func) -> tuple:
+    """ Traces the memory allocations of one call of a function
+
+    Args:
+        func (callable): the function
+
+    Returns:
+        tuple: the number of memory blocks allocated by the call that are
+               still alive afterwards (i.e. make up the result) and the
+               peak of the memory allocated during the call in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1] - start
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(
+        stat.count_diff
+        for stat in after.compare_to(before, "lineno")
+        if stat.count_diff > 0
+    )
+    return blocks, peak
+
+
+def run_case(case: Case, min_time: float = 0.2, repeat: int = 5) -> dict:
+    """ Runs a benchmark case
+
+    Args:
+        case (Case): the case
+        min_time (float, optional): minimum time of each timing repetition in seconds
+        repeat (int, optional): number of timing repetitions
+
+    Returns:
+        dict: the metrics of the case
+    """
+    try:
+        obj = case.setup()
+        encoded = case.encode(obj)
+        case.decode(encoded)
+    except Exception as e:
+        return {"error": "{}: {}".format(type(e).__name__, e)}
+
+    nbytes = len(encoded)
+    encode_s = time_per_op(lambda: case.encode(obj), min_time, repeat)
+    decode_s = time_per_op(lambda: case.decode(encoded), min_time, repeat)
+    encode_blocks, encode_peak = allocations(lambda: case.encode(obj))
+    decode_blocks, decode_peak = allocations(lambda: case.decode(encoded))
+    return {
+        "encoded_bytes": nbytes,
+        "encode_us": encode_s * 1e6,
+        "decode_us": decode_s * 1e6,
+        "encode_mb_per_s": nbytes / encode_s / 1024 ** 2,
+        "decode_mb_per_s": nbytes / decode_s / 1024 ** 2,
+        "encode_blocks": encode_blocks,
+        "decode_blocks": decode_blocks,
+        "encode_peak_bytes": encode_peak,
+        "decode_peak_bytes": decode_peak,
+        "error": None,
+    }
+
+
+def run(patterns: list = None, min_time: float = 0.2, repeat: int = 5) -> dict:
+    """ Runs the benchmark cases
+
+    Args:
+        patterns (list, optional): glob patterns of the names of the cases to run (default all)
+        min_time (float, optional): minimum time of each timing repetition in seconds
+        repeat (int, optional): number of timing repetitions
+
+    Returns:
+        dict: the results document
+    """
+    results = {}
+    for case in make_cases():
+        if patterns and not any(fnmatch.fnmatch(case.name, p) for p in patterns):
+            continue
+        results[case.name] = run_case(case, min_time, repeat)
+    config = dict(patterns=patterns, min_time=min_time, repeat=repeat)
+    return make_results("serialization", config, results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark of the serialization formats of the data classes",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-c",
+        "--cases",
+        nargs="+",
+        default=None,
+        help="glob patterns of the cases to run, e.g. `ssreadout_*` (default all)",
+    )
+    parser.add_argument(
+        "-l", "--list", action="store_true", help="list the cases and exit"
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="minimum time of each timing repetition in s",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="number of timing repetitions"
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="write the results as JSON to this file"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print the results as JSON to stdout"
+    )
+    parser.add_argument(
+        "-b", "--baseline", default=None, help="results file to compare to"
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed relative regression compared to the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case in make_cases():
+            print(case.name)
+        return
+
+    results = run(args.cases, args.min_time, args.repeat)
+    if args.output is not None:
+        write_results(results, args.output)
+    if args.json:
+        write_results(results)
+    else:
+        print(format_table(results, TABLE_COLUMNS))
+
+    if args.baseline is not None:
+        regressions = compare_to_baseline(
+            results, load_results(args.baseline), BASELINE_METRICS, args.tolerance
+        )
+        for case, metric, base, value in regressions:
+            print(
+                "Regression in {} {}: {:.4g} (baseline {:.4g})".format(
+                    case, metric, value, base
+                ),
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
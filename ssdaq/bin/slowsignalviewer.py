@@ -526,12 +526,9 @@ class DynamicTRPlotter:
             self.map[self.xmap[i], self.ymap[i]] = i
 
         self.map = self.map.flatten()
-        from ssdaq.data._dataimpl.trigger_format import (
-            get_SP2bptrigg_mapping,
-            get_bptrigg2SP_mapping,
-        )
+        from ssdaq.data._dataimpl.trigger_mapping import SPImageMapping
 
-        self.bptmap = get_bptrigg2SP_mapping()
+        self.trigg_image = SPImageMapping(self.xmap, self.ymap, (24, 24))
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.updateplots)
         self.timer.start(self._interval)
@@ -590,9 +587,7 @@ class DynamicTRPlotter:
             trigg = trs[-1]
 
         self.lastframe = datetime.now()
-        imgdata = np.zeros((24, 24))
-
-        imgdata[self.xmap, self.ymap] = trigg.trigg_union[self.bptmap]
+        imgdata = self.trigg_image(trigg.trigg_union, dtype=float)
 
         imgdata[np.isnan(imgdata)] = 0
         self.img.setImage(imgdata.T, levels=(0, 1))
@@ -3,8 +3,12 @@
 from threading import Thread
 import zmq
 import zmq.asyncio
+import queue
 from queue import Queue
+from collections import deque
 import logging
+import time
+import numpy as np
 from ssdaq import sslogger
 import asyncio
 from .io import BaseFileWriter
@@ -29,6 +33,7 @@ class BasicSubscriber(Thread):
         unpack=None,
         logger: logging.Logger = None,
         zmqcontext=None,
+        copy: bool = True,
     ):
         """ The init of a BasicSubscriber
 
@@ -40,6 +45,8 @@ class BasicSubscriber(Thread):
                                         object is put in the subscribed buffer.
                     logger (logging.Logger, optional): Optionally provide a logger instance
                     zmqcontext (None, optional): Description
+                    copy (bool, optional): If False the received message is not copied and `unpack`
+                                        gets a memoryview of the zmq frame instead of bytes.
         """
         Thread.__init__(self)
         BasicSubscriber._id_counter += 1
@@ -64,6 +71,7 @@ class BasicSubscriber(Thread):
         self._close_sock = self._context.socket(zmq.PAIR)
         self._close_sock.bind("inproc://" + self._inproc_sock_name)
         self._unpack = (lambda x: x) if unpack is None else unpack
+        self._copy = copy
 
     def close(self, hard=True):
         """Closes subscriber so no more data is put in the buffer
@@ -127,7 +135,9 @@ class BasicSubscriber(Thread):
             socks = dict(poller.poll())
 
             if self._sock in socks:
-                data = self._sock.recv()
+                data = self._sock.recv(copy=self._copy)
+                if not self._copy:
+                    data = data.buffer
                 self._data_buffer.put(self._unpack(data))
             else:
                 self.log.info("Stopping")
@@ -156,6 +166,7 @@ class WriterSubscriber(Thread, BaseFileWriter):
         folder: str = "",
         file_enumerator: str = None,
         filesize_lim: int = None,
+        writer_kwargs: dict = None,
     ):
         """Summary
 
@@ -170,6 +181,7 @@ class WriterSubscriber(Thread, BaseFileWriter):
             folder (str, optional): Description
             file_enumerator (str, optional): Description
             filesize_lim (int, optional): Description
+            writer_kwargs (dict, optional): Keyword arguments passed to the writer
         """
         self.log = sslogger.getChild(name)
         BaseFileWriter.__init__(
@@ -180,6 +192,7 @@ class WriterSubscriber(Thread, BaseFileWriter):
             file_enumerator=file_enumerator,
             filesize_lim=filesize_lim,
             file_ext=file_ext,
+            writer_kwargs=writer_kwargs,
         )
         Thread.__init__(self)
 
@@ -255,6 +268,7 @@ class AsyncSubscriber:
         loop=None,
         passoff_callback=None,
         name: str = None,
+        copy: bool = True,
     ):
         """The init of an AsyncSubscriber
 
@@ -271,6 +285,8 @@ class AsyncSubscriber:
                                             buffer. Note: if this is used then ``get_data()``
                                             will always be empty.
             name (str, optional): The name of the subscriber (used in logging)
+            copy (bool, optional): If False the received message is not copied and `unpack`
+                                gets a memoryview of the zmq frame instead of bytes.
 
 
         """
@@ -291,6 +307,7 @@ class AsyncSubscriber:
         self._loop = loop or asyncio.get_event_loop()
         self._running = True
         self._unpack = (lambda x: x) if unpack is None else unpack
+        self._copy = copy
         self._task = self._loop.create_task(self.receive())
         self._passoff_callback = passoff_callback or (
             lambda x: self._loop.create_task(self._data_buffer.put(x))
@@ -305,7 +322,10 @@ class AsyncSubscriber:
         while self._running:
             data = None
             try:
-                data = self._unpack(await self._sock.recv())
+                data = await self._sock.recv(copy=self._copy)
+                if not self._copy:
+                    data = data.buffer
+                data = self._unpack(data)
             except asyncio.CancelledError:
                 self.log.info("Subscription stopped")
                 return
@@ -352,6 +372,13 @@ class AsyncWriterSubscriber(BaseFileWriter):
         This class subscribes to a zmq stream and writes the received data
         to a file using an appropriate writer.
 
+        By default the data is written by a dedicated I/O thread, so that
+        compression and flushes of the file do not block the event loop.
+        The received data is handed to the thread through a bounded queue.
+        When the queue is full the receive loop either waits for the
+        thread (`overflow='block'`) or drops the data (`overflow='drop'`).
+        See ``write_metrics`` for the queue and write statistics.
+
     Attributes:
         log (logging.logger): logger instance
         loop (asyncio.eventloop): eventloop
@@ -372,6 +399,11 @@ class AsyncWriterSubscriber(BaseFileWriter):
         file_enumerator: str = None,
         filesize_lim: int = None,
         loop=None,
+        writer_kwargs: dict = None,
+        write_thread: bool = True,
+        queue_size: int = 10000,
+        overflow: str = "block",
+        batch_size: int = 100,
     ):
         """ Summary
 
@@ -387,7 +419,16 @@ class AsyncWriterSubscriber(BaseFileWriter):
             file_enumerator (str, optional): Description
             filesize_lim (int, optional): Description
             loop (None, optional): Description
+            writer_kwargs (dict, optional): Keyword arguments passed to the writer
+            write_thread (bool, optional): Write in a dedicated I/O thread instead of the event loop
+            queue_size (int, optional): Max number of data objects queued for the I/O thread
+            overflow (str, optional): 'block' to wait for the I/O thread or 'drop' to drop
+                                      data when the queue is full
+            batch_size (int, optional): Max number of queued data objects written per wakeup
+                                        of the I/O thread
         """
+        if overflow not in ("block", "drop"):
+            raise ValueError("Unknown overflow policy `{}`".format(overflow))
         self.log = sslogger.getChild(name)
         super().__init__(
             file_prefix=file_prefix,
@@ -396,6 +437,7 @@ class AsyncWriterSubscriber(BaseFileWriter):
             file_enumerator=file_enumerator,
             filesize_lim=filesize_lim,
             file_ext=file_ext,
+            writer_kwargs=writer_kwargs,
         )
         self._loop = loop or asyncio.get_event_loop()
         self._subscriber = subscriber(
@@ -403,8 +445,115 @@ class AsyncWriterSubscriber(BaseFileWriter):
         )
         self._running = False
         self.stopping = False
+
+        # write pipeline
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.nwritten = 0
+        self.ndropped = 0
+        self.nblocked = 0
+        self.max_queue_depth = 0
+        self.write_time = 0.0
+        self._write_latencies = deque(maxlen=10000)
+        # tasks of `submit_soon` and the lock keeping them in order
+        self._submit_tasks = set()
+        self._submit_lock = asyncio.Lock()
+        self._write_queue = None
+        self._write_thread = None
+        if write_thread:
+            self._write_queue = Queue(maxsize=queue_size)
+            self._write_thread = Thread(
+                target=self._write_loop, name=name + "-io", daemon=True
+            )
+            self._write_thread.start()
+
         self._task = self._loop.create_task(self.run())
 
+    async def submit(self, write, data):
+        """**(Coroutine)** Hands data to the I/O thread (or writes it directly
+            if there is no I/O thread)
+
+        Args:
+            write (callable): called with the data in the I/O thread
+            data: the data
+        """
+        if self._write_queue is None:
+            write(data)
+            self.nwritten += 1
+            return
+        item = (write, data, time.perf_counter())
+        try:
+            self._write_queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow == "drop":
+                self.ndropped += 1
+                return
+            self.nblocked += 1
+            await self._loop.run_in_executor(None, self._write_queue.put, item)
+        self.max_queue_depth = max(self.max_queue_depth, self._write_queue.qsize())
+
+    def submit_soon(self, write, data):
+        """ Submits data from a callback (see `submit`). The data is submitted
+            in the order of the calls and before the file is closed.
+
+        Args:
+            write (callable): called with the data in the I/O thread
+            data: the data
+        """
+        task = self._loop.create_task(self._submit_ordered(write, data))
+        self._submit_tasks.add(task)
+        task.add_done_callback(self._submit_tasks.discard)
+
+    async def _submit_ordered(self, write, data):
+        async with self._submit_lock:
+            await self.submit(write, data)
+
+    def _write_loop(self):
+        """ The I/O thread. Writes the queued data in batches until it gets None
+        """
+        while True:
+            batch = [self._write_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            t0 = time.perf_counter()
+            for item in batch:
+                if item is None:
+                    self.write_time += time.perf_counter() - t0
+                    return
+                write, data, enqueued = item
+                try:
+                    write(data)
+                except Exception as e:
+                    self.log.error("Exception: {}, occured while writing data".format(e))
+                self._write_latencies.append(time.perf_counter() - enqueued)
+                self.nwritten += 1
+            self.write_time += time.perf_counter() - t0
+
+    @property
+    def write_metrics(self) -> dict:
+        """ Statistics of the write pipeline
+
+            Returns:
+                dict: the queue depth (current and max), number of written, dropped and
+                      blocked (waited for the I/O thread) data objects, time spent writing
+                      in seconds and the p50/p99 latency from receive to written of recent data in ms
+        """
+        latencies = np.array(self._write_latencies) * 1e3
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (None, None)
+        return dict(
+            queue_depth=self._write_queue.qsize() if self._write_queue else 0,
+            max_queue_depth=self.max_queue_depth,
+            written=self.nwritten,
+            dropped=self.ndropped,
+            blocked=self.nblocked,
+            write_time=float(self.write_time),
+            write_latency_p50_ms=None if p50 is None else float(p50),
+            write_latency_p99_ms=None if p99 is None else float(p99),
+        )
+
     async def run(self):
         self.log.info("Starting writer")
         self._running = True
@@ -421,7 +570,7 @@ class AsyncWriterSubscriber(BaseFileWriter):
             if data == None:
                 continue
 
-            self.write(data)
+            await self.submit(self.write, data)
 
     async def close(self, hard: bool = False):
         """Stops the writer by closing the subscriber.
@@ -446,6 +595,20 @@ class AsyncWriterSubscriber(BaseFileWriter):
                 self.log.info("Cancelling")
                 self._task.cancel()
         await self._task
+        # data submitted from callbacks must be queued before the end of the queue
+        if self._submit_tasks:
+            await asyncio.gather(*self._submit_tasks)
+        if self._write_thread is not None:
+            if hard:
+                while True:
+                    try:
+                        self._write_queue.get_nowait()
+                        self.ndropped += 1
+                    except queue.Empty:
+                        break
+            await self._loop.run_in_executor(None, self._write_queue.put, None)
+            await self._loop.run_in_executor(None, self._write_thread.join)
+        self.log.info("Write pipeline: {}".format(self.write_metrics))
         # Closing the BaseFilewriter to close the
         # filehandle and get a nice summary log message
         super().close()
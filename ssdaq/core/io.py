@@ -1,18 +1,147 @@
 import struct
 import binascii
+import mmap
 from .utils import get_si_prefix
 from datetime import datetime
 import os
 from typing import Union
 import numpy as np
 import bz2
+import zlib
+import lzma
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 _chunk_header = struct.Struct("<2I")
 _file_header = struct.Struct("<Q4I")
 
+# Registry of bunch compressors (name: (codec, compressor id)). A codec
+# is any object with `compress` and `decompress` functions. The compressor
+# id is written in the file header and must never be reused for another codec.
+compressors = {"bz2": (bz2, 1), "zlib": (zlib, 2), "lzma": (lzma, 3)}
+try:
+    import zstandard
+
+    compressors["zstd"] = (zstandard, 4)
+except ImportError:
+    pass
+try:
+    import lz4.frame
+
+    compressors["lz4"] = (lz4.frame, 5)
+except ImportError:
+    pass
+
+
+def _compress(compressor: str, data: bytes) -> bytes:
+    """ Compresses data with a registered compressor (used by the compression pool)
+    """
+    return compressors[compressor][0].compress(data)
+
+
+# Header of the index file written next to V1 files: marker, version, size
+# of the indexed file, position of the last bunch trailer, number of bunches
+# and number of objects. The header is followed by the file position, data
+# size and number of objects of each bunch (int64) and the object sizes (uint32).
+_index_file_header = struct.Struct("<4sIQQQQ")
+
+
+def index_filename(filename: str) -> str:
+    """ The name of the index file of a V1 file
+    """
+    return filename + ".idx"
+
+
+def _map_file(file) -> memoryview:
+    """ Maps a file read-only into memory
+    """
+    return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _unmap_file(view: memoryview):
+    """ Unmaps a file mapped by `_map_file`
+    """
+    mapped = view.obj
+    view.release()
+    try:
+        mapped.close()
+    except BufferError:
+        # objects read from the map are still referenced and
+        # the map is closed when the last of them is released
+        pass
+
+
 ###Raw object IO classes#####
 
 
+class BunchCache:
+    """ A least recently used cache of decompressed bunches
+        bounded by the total size of the bunches in bytes.
+        The most recently added bunch is always kept.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes (int): max total size of the cached bunches
+        """
+        self.max_bytes = max_bytes
+        self._bunches = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+
+    def __len__(self):
+        return len(self._bunches)
+
+    def __contains__(self, key):
+        return key in self._bunches
+
+    def get(self, key):
+        """ Returns the bunch for `key` or None if it is not cached
+        """
+        bunch = self._bunches.get(key)
+        if bunch is None:
+            self.misses += 1
+            return None
+        self._bunches.move_to_end(key)
+        self.hits += 1
+        return bunch
+
+    def put(self, key, bunch: bytes):
+        """ Adds a bunch to the cache and evicts the least
+            recently used bunches if the cache is full
+        """
+        if key in self._bunches:
+            return
+        self._bunches[key] = bunch
+        self.nbytes += len(bunch)
+        while self.nbytes > self.max_bytes and len(self._bunches) > 1:
+            _, evicted = self._bunches.popitem(last=False)
+            self.nbytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self._bunches.clear()
+        self.nbytes = 0
+
+    @property
+    def stats(self) -> dict:
+        """ Cache statistics. `prefetched` counts the misses
+            that were served by the read-ahead
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "prefetched": self.prefetched,
+            "evictions": self.evictions,
+            "bunches": len(self._bunches),
+            "nbytes": self.nbytes,
+        }
+
+
 class RawObjectWriterBase:
     """ Base class of a file object for
         writing indexable chunks of serialized data
@@ -141,7 +270,7 @@ class RawObjectWriterV1:
     _protocol_v = 1
     _file_header = struct.Struct("<4s4sIQ2H")
     _bunch_trailer_header = struct.Struct("<3Q2IH")
-    _compressors = {"bz2": (bz2, 1)}
+    _compressors = compressors
 
     def __init__(
         self,
@@ -150,6 +279,9 @@ class RawObjectWriterV1:
         marker_ext: str = "",
         compressor=None,
         bunchsize: int = 1000000,
+        compress_workers: int = 0,
+        compress_pool: str = "thread",
+        index_file: bool = True,
     ):
         """Summary
 
@@ -157,18 +289,50 @@ class RawObjectWriterV1:
             filename (str): Description
             header_ext (bytes, optional): Description
             marker_ext (str, optional): Description
-            compressor (None, optional): Description
+            compressor (None, optional): Name of a registered compressor (see `compressors`)
             bunchsize (int, optional): Description
+            compress_workers (int, optional): If larger than zero bunches are compressed
+                                              in a pool of this many workers while the next
+                                              bunch is filled. Bunches are written in order.
+            compress_pool (str, optional): 'thread' or 'process' pool for the compression
+            index_file (bool, optional): Write the file index to a separate file (see
+                                         `index_filename`) on close, which makes opening
+                                         the file a single read
         """
+        # validated before the file is opened to not truncate an existing file
+        pools = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+        if compress_pool not in pools:
+            raise ValueError(
+                "Unknown compress pool `{}`, available pools: {}".format(
+                    compress_pool, list(pools.keys())
+                )
+            )
+        if compressor is not None and compressor not in RawObjectWriterV1._compressors:
+            raise ValueError(
+                "Unknown compressor `{}`, available compressors: {}".format(
+                    compressor, list(RawObjectWriterV1._compressors.keys())
+                )
+            )
+
         self.filename = filename
         self._file = open(self.filename, "wb")
+        # an index file from an earlier file with the same name is stale
+        if os.path.exists(index_filename(self.filename)):
+            os.remove(index_filename(self.filename))
 
         self.compress = False
         compressor_id = 0
+        self._pool = None
         if compressor is not None:
             self.compress = True
+            self._compressor_name = compressor
             self.compressor = RawObjectWriterV1._compressors[compressor][0]
             compressor_id = RawObjectWriterV1._compressors[compressor][1]
+            if compress_workers > 0:
+                self._pool = pools[compress_pool](max_workers=compress_workers)
+        # bunches being compressed in the pool (future, bunch index)
+        self._pending = deque()
+        self._max_pending = 2 * compress_workers
 
         self.data_counter = 0
         self.version = RawObjectWriterV1._protocol_v
@@ -195,6 +359,14 @@ class RawObjectWriterV1:
         self._cbunchoffset = 0
         self._last_bunch_fp = 0
         self._bunch_number = 0
+        # (file position, data size, object sizes) of the written bunches
+        self._index = [] if index_file else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def _write(self, data: bytes):
         self._file.write(data)
@@ -217,20 +389,52 @@ class RawObjectWriterV1:
     def flush(self):
         if len(self._buffer) < 1:
             return
+        bunch_index = list(self._cbunchindex)
+        if self._pool is not None:
+            self._pending.append(
+                (
+                    self._pool.submit(
+                        _compress, self._compressor_name, b"".join(self._buffer)
+                    ),
+                    bunch_index,
+                )
+            )
+            self._write_pending(self._max_pending)
+        elif self.compress:
+            self._write_bunch(
+                [self.compressor.compress(b"".join(self._buffer))], bunch_index
+            )
+        else:
+            self._write_bunch(self._buffer, bunch_index)
+
+        # reseting/updating the last bunch descriptors
+        self._cbunchindex.clear()
+        self._buffer.clear()
+        self._cbunchoffset = 0
+
+    def _write_pending(self, max_pending: int):
+        """ Writes the compressed bunches that are done in order. Waits for
+            the oldest bunch while more than `max_pending` bunches are pending.
+        """
+        while len(self._pending) > 0 and (
+            self._pending[0][0].done() or len(self._pending) > max_pending
+        ):
+            future, bunch_index = self._pending.popleft()
+            self._write_bunch([future.result()], bunch_index)
+
+    def _write_bunch(self, bunch: list, bunch_index: list):
         bunch_start_fp = self._fp
         # writing the data bunch
-        if self.compress:
-            byte_buff = bytearray()
-            for data in self._buffer:
-                byte_buff.extend(data)
-            self._write(self.compressor.compress(byte_buff))
-        else:
-            for data in self._buffer:
-                self._write(data)
+        for data in bunch:
+            self._write(data)
 
         # constructing the index and writing it in the bunch trailer
-        index = list(zip(*self._cbunchindex))
-        n = len(self._buffer)
+        index = list(zip(*bunch_index))
+        n = len(bunch_index)
+        if self._index is not None:
+            self._index.append(
+                (bunch_start_fp, self._fp - bunch_start_fp, np.array(index[1], "<u4"))
+            )
         bunch_index = struct.pack("{}I{}I".format(n, n), *index[0], *index[1])
         self._write(bunch_index)
 
@@ -240,7 +444,7 @@ class RawObjectWriterV1:
             self._fp - bunch_start_fp,
             self._fp,
             bunch_crc,
-            len(self._buffer),
+            n,
             self._bunch_number,
         )
 
@@ -249,16 +453,38 @@ class RawObjectWriterV1:
         self._last_bunch_fp = self._fp
 
         self._write(bunch_index_trailer)
-
-        # reseting/updating the last bunch descriptors
-        self._cbunchindex.clear()
-        self._buffer.clear()
-        self._cbunchoffset = 0
         self._bunch_number += 1
+        # makes complete bunches visible to readers following the file
+        self._file.flush()
+
+    def _write_index_file(self):
+        n_entries = sum(len(sizes) for _, _, sizes in self._index)
+        with open(index_filename(self.filename), "wb") as f:
+            f.write(
+                _index_file_header.pack(
+                    b"SOFI",
+                    self.version,
+                    self._fp,
+                    self._last_bunch_fp,
+                    len(self._index),
+                    n_entries,
+                )
+            )
+            if len(self._index) > 0:
+                bunch_fp, bunch_size, sizes = zip(*self._index)
+                f.write(np.array(bunch_fp, dtype="<i8").tobytes())
+                f.write(np.array(bunch_size, dtype="<i8").tobytes())
+                f.write(np.array([len(s) for s in sizes], dtype="<i8").tobytes())
+                f.write(np.concatenate(sizes).tobytes())
 
     def close(self):
         self.flush()
+        self._write_pending(0)
+        if self._pool is not None:
+            self._pool.shutdown()
         self._file.close()
+        if self._index is not None:
+            self._write_index_file()
 
 
 class RawObjectReaderBase:
@@ -272,11 +498,16 @@ class RawObjectReaderBase:
 
     _protocols = {}
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, mmap: bool = False, **kwargs):
         """ Reads Streamed Object Files
 
         Args:
             filename (str): filename and path to the file
+            mmap (bool, optional): Map the file into memory. Objects are then returned
+                                   as memoryviews into the mapped file, which are only
+                                   valid as long as the reader is open.
+            **kwargs: Options of the protocol reader (e.g. `cache_size` and `read_ahead`
+                      for V1 files)
 
         Raises:
             TypeError: Raised if the file is not recognized as SOF
@@ -292,12 +523,12 @@ class RawObjectReaderBase:
 
         if self.version == 0 and self.fhead >= 0:
             readerclass = RawObjectReaderBase._protocols[self.version]
-            self._reader = readerclass(self.file)
+            self._reader = readerclass(self.file, mmap=mmap, **kwargs)
         elif self.version > 0:
             readerclass = RawObjectReaderBase._protocols[self.version]
             self._fhead = self.file.read(readerclass._file_header.size)
             # marker,extmarker,self.version,self.timestamp,self.compressed,self.lenheadext = readerclass._file_header.unpack(self._fhead)
-            self._reader = readerclass(self.file)
+            self._reader = readerclass(self.file, mmap=mmap, **kwargs)
         else:
             raise TypeError("This file appears not to be a stream object file (SOF)")
 
@@ -310,7 +541,13 @@ class RawObjectReaderBase:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.file.close()
+        self.close()
+
+    def __iter__(self):
+        """ Iterates over all objects in the file in order without
+            moving the file pointer
+        """
+        return self._reader.iter_objects()
 
     def reload(self):
         """ Reload the index table. Useful if the file
@@ -334,13 +571,11 @@ class RawObjectReaderBase:
             TYPE: Description
         """
         if isinstance(ind, slice):
-            data = [self.read_at(ii) for ii in range(*ind.indices(self.n_entries))]
-            return data
-        elif isinstance(ind, list):
-            data = [self.read_at(ii) for ii in ind]
-            return data
-        elif isinstance(ind, int):
-            return self.read_at(ind)
+            return self._reader.read_indices(np.arange(*ind.indices(self.n_entries)))
+        elif isinstance(ind, (list, np.ndarray)):
+            return self._reader.read_indices(ind)
+        elif isinstance(ind, (int, np.integer)):
+            return self.read_at(int(ind))
 
     def read_at(self, ind: int) -> bytes:
         """Reads one object at the index indicated by `ind`
@@ -367,6 +602,7 @@ class RawObjectReaderBase:
     def close(self):
         """ closes file handle
         """
+        self._reader.close()
         self.file.close()
 
     @property
@@ -378,6 +614,16 @@ class RawObjectReaderBase:
         """
         return self._reader.n_entries
 
+    @property
+    def cache_stats(self) -> dict:
+        """ statistics of the decompressed bunch cache
+
+        Returns:
+            dict: cache statistics or None if the file has no bunch cache
+        """
+        cache = getattr(self._reader, "_bunch_cache", None)
+        return cache.stats if cache is not None else None
+
     @property
     def filesize(self) -> int:
         """ the file size on disk in bytes
@@ -415,9 +661,23 @@ class RawObjectReaderV1:
     _file_header = struct.Struct("<4s4sIQ2H")
     _bunch_trailer_header = struct.Struct("<3Q2IH")
     _file_trailer = struct.Struct("<4s4sIQ")
-    _compressors = {"bz2": (bz2, 1)}
+    _compressors = compressors
 
-    def __init__(self, file):
+    def __init__(
+        self,
+        file,
+        mmap: bool = False,
+        cache_size: int = 128 * 1024 ** 2,
+        read_ahead: bool = True,
+    ):
+        """
+        Args:
+            file: the opened file
+            mmap (bool, optional): map the file into memory
+            cache_size (int, optional): max size in bytes of the decompressed bunch cache
+            read_ahead (bool, optional): read and decompress the next bunch in a background
+                                         thread when the bunches are read sequentially
+        """
         fileheader_def = RawObjectReaderV1._file_header
         self.file = file
         self.file.seek(0)
@@ -439,83 +699,297 @@ class RawObjectReaderV1:
             compressorsr = {}
             for k, v in RawObjectReaderV1._compressors.items():
                 compressorsr[v[1]] = (v[0], k)
+            if self._compressed not in compressorsr:
+                raise TypeError(
+                    "This file is compressed with a compressor (id {}) that is"
+                    " not available".format(self._compressed)
+                )
             self._compressor = compressorsr[self._compressed][0]
             self._compressor_name = compressorsr[self._compressed][1]
         self._headext = None
         if self._lenheadext > 0:
             self._headext = self.file.read(self._lenheadext)
         self._fp_start = self.file.tell()
-        self.n_bunches = None
-        self.n_entries = None
+        self.n_bunches = 0
+        self.n_entries = 0
         self.filesize = None
-        self._rawindex = {}
-        self._bunch_buffer = {}
+        # bunch index: file position of the bunch data, size of the
+        # data (compressed) and index of the first object in the bunch
+        self._bunch_fp = np.empty(0, dtype=np.int64)
+        self._bunch_size = np.empty(0, dtype=np.int64)
+        self._bunch_first = np.empty(0, dtype=np.int64)
+        # object index: offset in the (decompressed) bunch and size
+        self._obj_offset = np.empty(0, dtype=np.int64)
+        self._obj_size = np.empty(0, dtype=np.int64)
+        self._bunch_cache = BunchCache(cache_size)
+        # the bunch being decompressed in the background (bunch number, future)
+        self._read_ahead = ThreadPoolExecutor(max_workers=1) if read_ahead else None
+        self._prefetch = None
+        # the last bunch that was not in the cache (to detect sequential reading)
+        self._last_bunch = -1
         self._current_index = 0
         self._scan_file()
+        self._view = _map_file(self.file) if mmap else None
 
-    def _scan_file(self):
-        from collections import namedtuple
+    def close(self):
+        if self._read_ahead is not None:
+            self._read_ahead.shutdown()
+            self._read_ahead = None
+        self._prefetch = None
+        self._bunch_cache.clear()
+        if self._view is not None:
+            _unmap_file(self._view)
+            self._view = None
 
-        BunchTrailer = namedtuple(
-            "BunchTrailer", "bunchoff dataoff fileoff crc bunchsize ndata index objsize"
+    def reload(self):
+        """ Reads the index of the bunches appended to the file since the
+            last scan. Useful if the file is being written to when read
+        """
+        filesize = self.filesize
+        self._scan_new_bunches()
+        if self._view is not None and self.filesize != filesize:
+            _unmap_file(self._view)
+            self._view = _map_file(self.file)
+
+    def _scan_file(self):
+        # position of the last bunch trailer in the index
+        self._last_trailer_fp = 0
+        self._load_index_file()
+        # scanning bunches not in the index file (if any)
+        self._scan_new_bunches()
+
+    def _load_index_file(self):
+        """ Loads the index from the index file if it exists and matches the file
+        """
+        try:
+            with open(index_filename(self.file.name), "rb") as f:
+                index = f.read()
+        except (OSError, AttributeError, TypeError):
+            return
+        if len(index) < _index_file_header.size:
+            return
+        header = _index_file_header.unpack_from(index, 0)
+        marker, version, filesize, last_trailer_fp, n_bunches, n_entries = header
+        index_size = _index_file_header.size + n_bunches * 3 * 8 + n_entries * 4
+        if (
+            marker != b"SOFI"
+            or version != self._version
+            or len(index) != index_size
+            or filesize > self.file.seek(0, os.SEEK_END)
+            or (n_bunches > 0 and not self._is_trailer(last_trailer_fp))
+        ):
+            return
+        offset = _index_file_header.size
+        bunch_fp, bunch_size, counts = np.frombuffer(
+            index, dtype="<i8", count=3 * n_bunches, offset=offset
+        ).reshape(3, n_bunches)
+        offset += n_bunches * 3 * 8
+        obj_size = np.frombuffer(index, dtype="<u4", count=n_entries, offset=offset)
+        objsizes = np.split(obj_size, np.cumsum(counts)[:-1])
+        self._append_bunches(
+            list(zip(range(n_bunches), bunch_fp, bunch_size, objsizes))
         )
-        self.file.seek(-RawObjectReaderV1._bunch_trailer_header.size, os.SEEK_END)
+        self._last_trailer_fp = last_trailer_fp
+
+    def _is_trailer(self, fp: int) -> bool:
+        """ Checks that there is a bunch trailer at file position `fp`
+        """
+        trailer_def = RawObjectReaderV1._bunch_trailer_header
+        self.file.seek(fp)
+        trailer = self.file.read(trailer_def.size)
+        return len(trailer) == trailer_def.size and trailer_def.unpack(trailer)[2] == fp
+
+    def _scan_new_bunches(self):
+        """ Indexes the bunches after the last bunch already in the index. The
+            file normally ends with the trailer of the last bunch, otherwise the
+            last bunch is still being written and the last complete bunch trailer
+            is searched for backwards from the end of the file (the bunch being
+            written is picked up by the next reload)
+        """
+        trailer_def = RawObjectReaderV1._bunch_trailer_header
+        self.filesize = self.file.seek(0, os.SEEK_END)
+        fp = self.filesize - trailer_def.size
+        if fp <= self._last_trailer_fp:
+            return
+        if self._is_trailer(fp):
+            bunches = self._read_bunch_trailers(fp)
+            if bunches is None:
+                raise RuntimeError(
+                    "File offsets are corrupted, unable to read file index"
+                )
+        else:
+            fp, bunches = self._find_last_trailer()
+            if bunches is None:
+                return
+        self._last_trailer_fp = fp
+        self._append_bunches(sorted(bunches, key=lambda bunch: bunch[0]))
+
+    def _read_bunch_trailers(self, fp: int):
+        """ Reads the bunch trailers backwards from the trailer at `fp`
+            until the last bunch already in the index
 
-        self.filesize = self.file.tell()
-        self.file_index = [0]
-        while self.file.tell() > self._fp_start:
+        Returns:
+            list: the bunches (bunch number, file position, size, object sizes)
+                  or None if the trailers do not lead to the last indexed bunch
+        """
+        trailer_def = RawObjectReaderV1._bunch_trailer_header
+        bunches = []
+        while fp > self._last_trailer_fp:
             # read bunch trailer
-            last_bunch_trailer = self.file.read(
-                RawObjectReaderV1._bunch_trailer_header.size
-            )
-            bunchoff, dataoff, fileoff, crc, ndata, bunch_n = RawObjectReaderV1._bunch_trailer_header.unpack(
-                last_bunch_trailer
+            self.file.seek(fp)
+            bunchoff, dataoff, fileoff, crc, ndata, bunch_n = trailer_def.unpack(
+                self.file.read(trailer_def.size)
             )
-            if(bunchoff>fileoff or dataoff>bunchoff):
-                raise RuntimeError("File offsets are corrupted, unable to read file index")
-
-            # read bunch index
-            self.file.seek(
-                self.file.tell()
-                - RawObjectReaderV1._bunch_trailer_header.size
-                - ndata * 2 * 4
-            )
-            index = struct.unpack(
-                "{}I{}I".format(ndata, ndata), self.file.read(ndata * 2 * 4)
-            )
-            objsize = np.array(index[ndata:], dtype=np.uint32)
-            self._rawindex[(0, bunch_n)] = BunchTrailer(
-                bunchoff,  # Offset to earlier bunch or file header if first bunch
-                dataoff,  # Offset to beginning of data in bunch
-                fileoff,  # Offset to beginning of file
-                crc,  # bunch crc
-                dataoff - ndata * 2 * 4,  # Size of data bunch
-                ndata,  # number of objects in bunch
-                [0] + list(np.cumsum(objsize[:-1])),  # Object offsets in bunch
-                objsize,  # object sizes
+            # the trailer holds its own file position
+            if fileoff != fp or bunchoff > fileoff or dataoff > bunchoff:
+                return None
+
+            # read bunch index (object crcs followed by object sizes)
+            index_size = ndata * 2 * 4
+            if index_size > dataoff:
+                return None
+            self.file.seek(fileoff - index_size)
+            objsize = np.frombuffer(self.file.read(index_size), dtype="<u4")[ndata:]
+            bunches.append(
+                (
+                    bunch_n,
+                    fileoff - dataoff,  # file position of the data bunch
+                    dataoff - index_size,  # size of the data bunch
+                    objsize,
+                )
             )
-            self.file.seek(self.file.tell() - bunchoff)
-
-        self._index = []
-        self._bunch_index = {}
-        for k, bunch in sorted(self._rawindex.items()):
-            self._bunch_index[k] = (bunch.fileoff - bunch.dataoff, bunch.bunchsize)
-            for i, obj in enumerate(bunch.index):
-                self._index.append((k, int(obj), int(bunch.objsize[i])))
-        self.n_entries = len(self._index)
-
-    def _get_bunch(self, bunch_id):
-        if bunch_id in self._bunch_buffer:
-            return self._bunch_buffer[bunch_id]
+            # offset to earlier bunch or file header if first bunch
+            fp = fileoff - bunchoff
+        if fp != self._last_trailer_fp:
+            return None
+        return bunches
+
+    def _find_last_trailer(self, block_size: int = 1024 ** 2):
+        """ Searches backwards from the end of the file for the last complete
+            bunch trailer that leads back to the last indexed bunch
+
+        Returns:
+            tuple: file position of the trailer and the bunches (see
+                   `_read_bunch_trailers`) or (None, None) if there is none
+        """
+        trailer_def = RawObjectReaderV1._bunch_trailer_header
+        if self._last_trailer_fp > 0:
+            start = self._last_trailer_fp + trailer_def.size
         else:
-            self.file.seek(self._bunch_index[bunch_id][0])
-            bunch = self._compressor.decompress(
-                self.file.read(
-                    self.file_index[bunch_id[0]] + self._bunch_index[bunch_id][1]
-                )
+            start = self._fp_start
+        hi = self.filesize
+        while hi - start >= trailer_def.size:
+            lo = max(start, hi - max(block_size, trailer_def.size))
+            self.file.seek(lo)
+            data = self.file.read(hi - lo)
+            # candidates are the positions holding their own file position
+            # in the third field of the trailer (at an offset of 16 bytes)
+            n = len(data) - trailer_def.size + 1
+            fileoff = np.ndarray(
+                (n,), dtype="<u8", buffer=data, offset=16, strides=(1,)
+            )
+            candidates = np.flatnonzero(
+                fileoff == np.arange(lo, lo + n, dtype=np.uint64)
             )
-            self._bunch_buffer[bunch_id] = bunch
+            for fp in candidates[::-1] + lo:
+                bunches = self._read_bunch_trailers(int(fp))
+                if bunches is not None:
+                    return int(fp), bunches
+            if lo == start:
+                break
+            # overlapping blocks to find trailers across the block boundary
+            hi = lo + trailer_def.size - 1
+        return None, None
+
+    def _append_bunches(self, bunches: list):
+        """ Appends bunches (sorted by bunch number) to the index arrays
+        """
+        if len(bunches) == 0:
+            return
+        _, bunch_fp, bunch_size, objsizes = zip(*bunches)
+        counts = np.array([len(objsize) for objsize in objsizes], dtype=np.int64)
+        obj_size = np.concatenate(objsizes).astype(np.int64)
+        # object offsets in each bunch from the cumulative object sizes
+        obj_end = np.cumsum(obj_size)
+        bunch_start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        obj_offset = obj_end - obj_size
+        obj_offset -= np.repeat(obj_offset[bunch_start], counts)
+
+        self._bunch_fp = np.concatenate((self._bunch_fp, bunch_fp))
+        self._bunch_size = np.concatenate((self._bunch_size, bunch_size))
+        self._bunch_first = np.concatenate(
+            (self._bunch_first, bunch_start + self.n_entries)
+        )
+        self._obj_offset = np.concatenate((self._obj_offset, obj_offset))
+        self._obj_size = np.concatenate((self._obj_size, obj_size))
+        self.n_bunches = len(self._bunch_fp)
+        self.n_entries = len(self._obj_size)
+
+    def _get_bunch(self, bunch_n: int):
+        bunch = self._bunch_cache.get(bunch_n)
+        if bunch is not None:
             return bunch
+        if self._prefetch is not None and self._prefetch[0] == bunch_n:
+            bunch = self._prefetch[1].result()
+            self._prefetch = None
+            self._bunch_cache.prefetched += 1
+        else:
+            bunch = self._compressor.decompress(self._read_bunch(bunch_n))
+        self._bunch_cache.put(bunch_n, bunch)
+        # only read ahead when reading sequentially as it would
+        # double the reads for random or strided access
+        if self._read_ahead is not None and bunch_n == self._last_bunch + 1:
+            self._prefetch_bunch(bunch_n + 1)
+        self._last_bunch = bunch_n
+        return bunch
+
+    def _prefetch_bunch(self, bunch_n: int):
+        """ Starts reading and decompressing a bunch in the background
+        """
+        if bunch_n >= self.n_bunches or bunch_n in self._bunch_cache:
+            return
+        if self._prefetch is not None:
+            if self._prefetch[0] == bunch_n:
+                return
+            self._prefetch[1].cancel()
+        self._prefetch = (bunch_n, self._read_ahead.submit(self._load_bunch, bunch_n))
+
+    def _load_bunch(self, bunch_n: int):
+        """ Reads and decompresses a bunch without using the file position
+            so that it can run in the read ahead thread
+        """
+        fpos = int(self._bunch_fp[bunch_n])
+        size = int(self._bunch_size[bunch_n])
+        if self._view is not None:
+            data = self._view[fpos : fpos + size]
+        else:
+            data = os.pread(self.file.fileno(), size, fpos)
+        return self._compressor.decompress(data)
+
+    def _read_bunch(self, bunch_n: int):
+        fpos = int(self._bunch_fp[bunch_n])
+        size = int(self._bunch_size[bunch_n])
+        if self._view is not None:
+            return self._view[fpos : fpos + size]
+        self.file.seek(fpos)
+        return self.file.read(size)
+
+    def iter_objects(self):
+        """ Iterates over all objects in the file by walking the index.
+            Each bunch is read (and decompressed) once.
+        """
+        bunch_end = np.append(self._bunch_first[1:], self.n_entries)
+        for bunch_n in range(self.n_bunches):
+            if self._compressed:
+                bunch = memoryview(self._get_bunch(bunch_n))
+            else:
+                bunch = memoryview(self._read_bunch(bunch_n))
+            objs = slice(self._bunch_first[bunch_n], bunch_end[bunch_n])
+            for offset, size in zip(
+                self._obj_offset[objs].tolist(), self._obj_size[objs].tolist()
+            ):
+                obj = bunch[offset : offset + size]
+                yield obj if self._view is not None else obj.tobytes()
 
     def read_at(self, ind: int) -> bytes:
         """Reads one object at the index indicated by `ind`
@@ -530,19 +1004,53 @@ class RawObjectReaderV1:
             IndexError: if index out of range
         """
 
-        if ind > self.n_entries - 1:
+        if ind > self.n_entries - 1 or ind < -self.n_entries:
             raise IndexError(
                 "The requested file object ({}) is out of range".format(ind)
             )
-        obji = self._index[ind]
-        if self._compressed:
-            bunch = self._get_bunch(obji[0])
-            return bunch[obji[1] : obji[1] + obji[2]]
-        else:
-            fpos = self.file_index[obji[0][0]] + self._bunch_index[obji[0]][0] + obji[1]
-            self.file.seek(fpos)
+        ind = ind % self.n_entries
+        bunch_n = int(np.searchsorted(self._bunch_first, ind, side="right")) - 1
+        return self._read_object(
+            bunch_n, int(self._obj_offset[ind]), int(self._obj_size[ind])
+        )
+
+    def read_indices(self, inds) -> list:
+        """Reads the objects at several indices with one index lookup
+
+        Args:
+            inds (array_like): indices of the objects to be read
+
+        Returns:
+            list: of the objects
+
+        Raises:
+            IndexError: if an index is out of range
+        """
+        inds = np.asarray(inds, dtype=np.int64)
+        if len(inds) == 0:
+            return []
+        if inds.max() > self.n_entries - 1 or inds.min() < -self.n_entries:
+            raise IndexError("The requested file objects are out of range")
+        inds = inds % self.n_entries
+        bunches = np.searchsorted(self._bunch_first, inds, side="right") - 1
+        return [
+            self._read_object(*obj)
+            for obj in zip(
+                bunches.tolist(),
+                self._obj_offset[inds].tolist(),
+                self._obj_size[inds].tolist(),
+            )
+        ]
 
-            return self.file.read(obji[2])
+    def _read_object(self, bunch_n: int, offset: int, size: int):
+        if self._compressed:
+            bunch = self._get_bunch(bunch_n)
+            return bunch[offset : offset + size]
+        fpos = int(self._bunch_fp[bunch_n]) + offset
+        if self._view is not None:
+            return self._view[fpos : fpos + size]
+        self.file.seek(fpos)
+        return self.file.read(size)
 
     def resetfp(self):
         """ Resets file pointer to the first object in file
@@ -564,36 +1072,56 @@ class RawObjectReaderV0:
 
     _protocol_v = 0
 
-    def __init__(self, file):
+    def __init__(self, file, mmap: bool = False, **kwargs):
+        # V0 files have no bunches, the bunch cache options (kwargs) are ignored
         self.file = file
         self._scan_file()
         self._timestamp = 0
+        self._view = _map_file(self.file) if mmap else None
+        self._current_index = 0
+
+    def close(self):
+        if self._view is not None:
+            _unmap_file(self._view)
+            self._view = None
 
     def reload(self):
         """ Reload the index table. Useful if the file
             is being written too when read
         """
-        self._scan_file(self.filesize, self.n_entries, self.fpos)
+        # continuing the scan after the last object found
+        self._scan_file(
+            self.fpos[-1] + _chunk_header.size + self.sizes[-1],
+            self.n_entries,
+            self.fpos,
+            self.sizes,
+        )
+        if self._view is not None:
+            _unmap_file(self._view)
+            self._view = _map_file(self.file)
 
     def resetfp(self):
         """ Resets file pointer to the first object in file
         """
         self.file.seek(_file_header.size)
+        self._current_index = 0
 
-    def _scan_file(self, offset=0, n_entries=0, fpos=[]):
+    def _scan_file(self, offset=0, n_entries=0, fpos=None, sizes=None):
         """Summary
 
         Args:
             offset (int, optional): Description
             n_entries (int, optional): Description
             fpos (list, optional): Description
+            sizes (list, optional): Description
         """
         self.file.seek(offset)
         fh = self.file
         self.n_entries = n_entries
-        self.fpos = fpos
+        self.fpos = [] if fpos is None else fpos
+        self.sizes = [] if sizes is None else sizes
         # Skipping file header
-        fp = _file_header.size
+        fp = max(offset, _file_header.size)
         while True:
             fh.seek(fp)
             rd = fh.read(_chunk_header.size)
@@ -601,11 +1129,36 @@ class RawObjectReaderV0:
                 break
             self.fpos.append(fp)
             offset, crc = _chunk_header.unpack(rd)
+            self.sizes.append(offset)
             self.n_entries += 1
             fp = fh.tell() + offset
         self.file.seek(_file_header.size)
         self.filesize = self.fpos[-1] + offset
 
+    def read_indices(self, inds) -> list:
+        """Reads the objects at several indices
+
+        Args:
+            inds (array_like): indices of the objects to be read
+
+        Returns:
+            list: of the objects
+        """
+        return [self.read_at(int(ind)) for ind in inds]
+
+    def iter_objects(self):
+        """ Iterates over all objects in the file by walking the index
+        """
+        for ind in range(len(self.fpos)):
+            yield self._read_object(ind)
+
+    def _read_object(self, ind: int):
+        start = self.fpos[ind] + _chunk_header.size
+        if self._view is not None:
+            return self._view[start : start + self.sizes[ind]]
+        self.file.seek(start)
+        return self.file.read(self.sizes[ind])
+
     def read_at(self, ind: int) -> bytes:
         """Reads one object at the index indicated by `ind`
 
@@ -622,6 +1175,9 @@ class RawObjectReaderV0:
             raise IndexError(
                 "The requested file object ({}) is out of range".format(ind)
             )
+        if self._view is not None:
+            self._current_index = ind + 1
+            return self._read_object(ind)
         self.file.seek(self.fpos[ind])
         return self.read()
 
@@ -631,6 +1187,10 @@ class RawObjectReaderV0:
             Returns:
                 bytes: Bytes that represent the object
         """
+        if self._view is not None:
+            if self._current_index >= len(self.fpos):
+                return None
+            return self.read_at(self._current_index)
         sized = self.file.read(_chunk_header.size)
         if sized == b"":
             return None
@@ -661,6 +1221,7 @@ class BaseFileWriter:
         folder: str = "",
         file_enumerator: str = None,
         filesize_lim: int = None,
+        writer_kwargs: dict = None,
     ):
         """ Initialize a BaseFileWriter
 
@@ -671,6 +1232,7 @@ class BaseFileWriter:
             folder (str, optional): Path to folder where the file should be saved
             file_enumerator (str, optional): A string that sets which filename enumeration to use (if None no enumeration is used)
             filesize_lim (int, optional): If file size is above this limit a new file is open (if None no limit is imposed)
+            writer_kwargs (dict, optional): Keyword arguments passed to the writer class when a file is opened
         """
         self.file_enumerator = file_enumerator
         self.folder = folder
@@ -680,6 +1242,7 @@ class BaseFileWriter:
         self.file_counter = 1
         self.filesize_lim = ((filesize_lim or 0) * 1024 ** 2) or None
         self._writercls = writer
+        self._writer_kwargs = writer_kwargs or {}
         # self.log = writer.log
         self.file_ext = file_ext
         self._open_file()
@@ -698,7 +1261,7 @@ class BaseFileWriter:
         self.filename = os.path.join(
             self.folder, self.file_prefix + suffix + self.file_ext
         )
-        self._writer = self._writercls(self.filename)
+        self._writer = self._writercls(self.filename, **self._writer_kwargs)
         self.log.info("Opened new file, will write events to file: %s" % self.filename)
 
     def _close_file(self):
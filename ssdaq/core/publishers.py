@@ -83,7 +83,9 @@ class ZMQTCPPublisher(Publisher):
         )
 
     async def apublish(self, packet: bytes):
-        self.sock.send(packet)
+        # zmq keeps a reference to the packet buffer instead of copying
+        # it (packets smaller than zmq.COPY_THRESHOLD are still copied)
+        self.sock.send(packet, copy=False)
 
     def publish(self, packet: bytes):
-        self.sock.send(packet)
+        self.sock.send(packet, copy=False)
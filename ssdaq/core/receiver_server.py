@@ -1,5 +1,6 @@
 import asyncio
 import inspect
+import socket
 import zmq
 import zmq.asyncio
 from distutils.version import LooseVersion
@@ -77,6 +78,26 @@ class ReceiverServer:
         )
         return self.loop.run_until_complete(listen)
 
+    def setup_udp_socket(self, rcvbuf_size: int = None):
+        """ Creates a non-blocking UDP socket bound to the listen address.
+            Unlike `setup_udp` the socket is not wrapped in an asyncio transport
+            so that it can be drained in batches by the receiver.
+
+            Args:
+                rcvbuf_size (int, optional): size of the kernel receive buffer in bytes
+        """
+        self._setup = True
+        self.log.info(
+            "Settting up non-blocking UDP receiver socket at %s:%d"
+            % (tuple(self.listen_addr))
+        )
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if rcvbuf_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_size)
+        sock.bind(self.listen_addr)
+        sock.setblocking(False)
+        return sock
+
     def run(self):
         """ Starts the eventloop of the ReceiverServer (blocking)
         """
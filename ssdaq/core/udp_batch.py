@@ -0,0 +1,215 @@
+""" Batched UDP receiving for high packet rates.
+
+    Instead of an asyncio datagram protocol that is called once per packet
+    the ``BatchedUDPReader`` drains a non-blocking socket each time the event
+    loop reports it readable and writes the datagrams into a preallocated
+    ``UDPPacketRing``. The consumer is notified once per wakeup with the
+    range of ring slots that were filled.
+"""
+import os
+import socket
+import struct
+from datetime import datetime
+import numpy as np
+
+# SO_RXQ_OVFL is not exported by the socket module in all python versions
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+_ovfl_counter = struct.Struct("I")
+
+
+def proc_net_udp_drops(sock: socket.socket) -> int:
+    """ Reads the number of packets the kernel dropped for a socket
+        from `/proc/net/udp` (or `/proc/net/udp6`)
+
+    Args:
+        sock (socket.socket): a UDP socket
+
+    Returns:
+        int or None: dropped packets or None if the socket was not found
+    """
+    inode = os.fstat(sock.fileno()).st_ino
+    for fname in ("/proc/net/udp", "/proc/net/udp6"):
+        try:
+            with open(fname, "r") as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if int(fields[9]) == inode:
+                return int(fields[12])
+    return None
+
+
+class UDPPacketRing:
+    """ A ring of preallocated fixed size slots for datagrams.
+
+        Slots are written at the head and released from the tail by the consumer.
+        Slot indices are monotonically increasing and are wrapped when accessing
+        the underlying buffer.
+    """
+
+    def __init__(self, nslots: int = 4096, slot_size: int = 2048):
+        """
+        Args:
+            nslots (int, optional): number of slots in the ring
+            slot_size (int, optional): maximum size of a datagram in bytes
+        """
+        self.nslots = nslots
+        self.slot_size = slot_size
+        self._buffer = np.zeros((nslots, slot_size), dtype=np.uint8)
+        self._slots = [memoryview(self._buffer[i]) for i in range(nslots)]
+        self.sizes = [0] * nslots
+        self.addrs = [None] * nslots
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    @property
+    def free(self) -> int:
+        """ Number of free slots
+        """
+        return self.nslots - (self.head - self.tail)
+
+    def next_slot(self) -> memoryview:
+        """ The writable slot at the head of the ring
+        """
+        return self._slots[self.head % self.nslots]
+
+    def commit(self, size: int, addr: tuple):
+        """ Marks the slot at the head as filled and advances the head
+
+        Args:
+            size (int): number of bytes written to the slot
+            addr (tuple): the source address of the datagram
+        """
+        i = self.head % self.nslots
+        self.sizes[i] = size
+        self.addrs[i] = addr
+        self.head += 1
+
+    def get(self, i: int) -> tuple:
+        """ Returns the datagram and source address in slot `i`.
+            The returned memoryview is only valid until the slot is released.
+
+        Args:
+            i (int): slot index
+
+        Returns:
+            tuple: (memoryview, addr)
+        """
+        i = i % self.nslots
+        return self._slots[i][: self.sizes[i]], self.addrs[i]
+
+    def release(self, n: int):
+        """ Releases `n` slots from the tail of the ring
+
+        Args:
+            n (int): number of slots
+        """
+        self.tail += n
+
+
+class BatchedUDPReader:
+    """ Drains a non-blocking UDP socket into a ``UDPPacketRing``.
+
+        Reading is done in batches of at most `batch_size` datagrams per event
+        loop wakeup. After each batch `on_batch(start, n, cpu_time)` is called
+        with the first slot index, the number of datagrams and the time of the
+        wakeup. The consumer must call ``release`` when it is done with the slots.
+        If the ring is full the socket is removed from the event loop until
+        slots are released and packets stay in the kernel socket buffer.
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        loop,
+        on_batch,
+        ring: UDPPacketRing = None,
+        batch_size: int = 256,
+    ):
+        """
+        Args:
+            sock (socket.socket): a bound non-blocking UDP socket
+            loop (asyncio.loop): the event loop the socket is read in
+            on_batch (callable): called with (start, n, cpu_time) after each batch
+            ring (UDPPacketRing, optional): the ring to write datagrams to
+            batch_size (int, optional): max number of datagrams read per wakeup
+        """
+        self.sock = sock
+        self.loop = loop
+        self.ring = ring if ring is not None else UDPPacketRing()
+        self.batch_size = batch_size
+        self._on_batch = on_batch
+        self.n_truncated = 0
+        self.n_ring_full = 0
+        self._kernel_drops = 0
+        self._paused = True
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            self._rxq_ovfl = True
+            self._ancbufsize = socket.CMSG_SPACE(_ovfl_counter.size)
+        except OSError:
+            self._rxq_ovfl = False
+            self._ancbufsize = 0
+
+    def start(self):
+        """ Starts reading the socket in the event loop
+        """
+        if self._paused:
+            self.loop.add_reader(self.sock.fileno(), self._read_ready)
+            self._paused = False
+
+    def pause(self):
+        """ Stops reading the socket in the event loop
+        """
+        if not self._paused:
+            self.loop.remove_reader(self.sock.fileno())
+            self._paused = True
+
+    def _read_ready(self):
+        cpu_time = datetime.utcnow()
+        ring = self.ring
+        recv = self.sock.recvmsg_into
+        start = ring.head
+        n = 0
+        while n < self.batch_size and ring.free > 0:
+            try:
+                nbytes, ancdata, flags, addr = recv([ring.next_slot()], self._ancbufsize)
+            except (BlockingIOError, InterruptedError):
+                break
+            for level, type_, data in ancdata:
+                if level == socket.SOL_SOCKET and type_ == SO_RXQ_OVFL:
+                    self._kernel_drops = _ovfl_counter.unpack(data)[0]
+            if flags & socket.MSG_TRUNC:
+                self.n_truncated += 1
+                continue
+            ring.commit(nbytes, addr)
+            n += 1
+
+        if ring.free == 0:
+            self.n_ring_full += 1
+            self.pause()
+        if n > 0:
+            self._on_batch(start, n, cpu_time)
+
+    def release(self, n: int):
+        """ Releases `n` consumed slots and resumes reading if paused
+
+        Args:
+            n (int): number of slots
+        """
+        self.ring.release(n)
+        if self._paused and self.ring.free > 0:
+            self.start()
+
+    @property
+    def dropped_packets(self) -> int:
+        """ Number of packets dropped by the kernel for this socket
+        """
+        if self._rxq_ovfl:
+            return self._kernel_drops
+        return proc_net_udp_drops(self.sock)
@@ -16,7 +16,11 @@ from ._dataimpl.trigger_format import (
     TriggerPacketV2,
     TriggerPacketV3,
     BusyTriggerPacketV1,
+    TriggerPatterns,
+    TriggerColumns,
+    unpack_trigger_columns,
 )
+from ._dataimpl import trigger_mapping
 
 
 class SSReadoutFrame(FrameObject, SSReadout):
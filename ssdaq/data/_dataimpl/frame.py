@@ -1,20 +1,157 @@
+import ast
 import struct
 import numpy as np
 from importlib import import_module
-import pyarrow
 import logging
 
-class PyArrowSerializer:
-    def __init__(self,obj):
+# Version of the ndarray/tuple codec
+CODEC_VERSION = 1
+# The data of arrays is aligned to this number of bytes relative to the start of the frame
+ALIGNMENT = 64
+
+_head = struct.Struct("<cBBx")  # kind, version, flags
+_array_info = struct.Struct("<III")  # ndim, length of the dtype descr, offset of the data
+_tuple_info = struct.Struct("<I")  # number of items
+
+_ARRAY, _TUPLE, _NONE = b"a", b"t", b"n"
+# array flags
+_FORTRAN, _SCALAR, _BYTES = 1, 2, 4
+
+
+def _encode(obj, out: bytearray, offset: int):
+    """ Appends the encoded object to `out`, where `offset` is the
+        position of `out` in the frame
+    """
+    if isinstance(obj, tuple):
+        out += _head.pack(_TUPLE, CODEC_VERSION, 0)
+        out += _tuple_info.pack(len(obj))
+        for item in obj:
+            _encode(item, out, offset)
+        return
+    if obj is None:
+        out += _head.pack(_NONE, CODEC_VERSION, 0)
+        return
+
+    flags = 0
+    if isinstance(obj, np.ndarray):
+        arr = obj
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        arr = np.frombuffer(obj, dtype=np.uint8)
+        flags |= _BYTES
+    else:
+        arr = np.asarray(obj)
+        if arr.ndim != 0:
+            raise TypeError("Cannot serialize object of type {}".format(type(obj)))
+        flags |= _SCALAR
+    if arr.dtype.hasobject:
+        raise TypeError("Cannot serialize arrays of Python objects")
+
+    if arr.ndim > 1 and arr.flags.f_contiguous and not arr.flags.c_contiguous:
+        flags |= _FORTRAN
+        data = arr.T
+    else:
+        data = np.ascontiguousarray(arr)
+    descr = repr(np.lib.format.dtype_to_descr(arr.dtype)).encode()
+    header_size = _head.size + _array_info.size + 8 * arr.ndim + len(descr)
+    padding = -(offset + len(out) + header_size) % ALIGNMENT
+
+    out += _head.pack(_ARRAY, CODEC_VERSION, flags)
+    out += _array_info.pack(arr.ndim, len(descr), header_size + padding)
+    out += struct.pack("<{}q".format(arr.ndim), *arr.shape)
+    out += descr
+    out += bytes(padding)
+    out += data.reshape(-1).view(np.uint8).data
+
+
+def _decode(buffer, pos: int):
+    """ Decodes the object at `pos` in the buffer
+
+    Returns:
+        tuple: the object and the position after it
+    """
+    kind, version, flags = _head.unpack_from(buffer, pos)
+    if version > CODEC_VERSION:
+        raise ValueError("Unsupported codec version {}".format(version))
+    if kind == _NONE:
+        return None, pos + _head.size
+    if kind == _TUPLE:
+        (n,) = _tuple_info.unpack_from(buffer, pos + _head.size)
+        pos += _head.size + _tuple_info.size
+        items = []
+        for _ in range(n):
+            item, pos = _decode(buffer, pos)
+            items.append(item)
+        return tuple(items), pos
+    if kind != _ARRAY:
+        raise ValueError("Unknown object kind {}".format(kind))
+
+    ndim, descr_len, data_offset = _array_info.unpack_from(buffer, pos + _head.size)
+    p = pos + _head.size + _array_info.size
+    shape = struct.unpack_from("<{}q".format(ndim), buffer, p)
+    p += 8 * ndim
+    descr = ast.literal_eval(bytes(buffer[p : p + descr_len]).decode())
+    dtype = np.lib.format.descr_to_dtype(descr)
+    count = int(np.prod(shape))
+    start = pos + data_offset
+    end = start + count * dtype.itemsize
+    if count == 0:
+        arr = np.empty(0, dtype=dtype)
+    else:
+        arr = np.frombuffer(buffer, dtype=dtype, count=count, offset=start)
+    if flags & _FORTRAN:
+        arr = arr.reshape(shape[::-1]).T
+    else:
+        arr = arr.reshape(shape)
+    if flags & _BYTES:
+        return arr.tobytes(), end
+    if flags & _SCALAR:
+        return arr.item(), end
+    return arr, end
+
+
+class NDArraySerializer:
+    """ Serializer of ndarrays and tuples (of ndarrays, scalars, bytes, None
+        and tuples) in frames.
+
+        An array is written as a small dtype/shape header followed by its raw
+        buffer, which is aligned to `ALIGNMENT` bytes in the frame. Arrays
+        are therefore deserialized as (read-only if the frame buffer is)
+        views into the frame buffer without copying.
+    """
+
+    def __init__(self, obj):
         self.obj = obj
 
-    def serialize(self):
-        return pyarrow.serialize(self.obj).to_buffer()
+    def serialize(self, offset: int = 0):
+        """
+        Args:
+            offset (int, optional): position of the serialized object in the frame
+        """
+        out = bytearray()
+        _encode(self.obj, out, offset)
+        return out
+
+    @classmethod
+    def deserialize(cls, data):
+        return _decode(memoryview(data), 0)[0]
+
+
+class PyArrowSerializer:
+    """ Deserializer of ndarrays and tuples in frames serialized by
+        earlier versions with `pyarrow.serialize`, which is not
+        available in current versions of pyarrow.
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
 
     @classmethod
-    def deserialize(cls,data):
+    def deserialize(cls, data):
+        import pyarrow
+
         return pyarrow.deserialize(data)
 
+
 def dynamic_import(abs_module_path, class_name):
     module_object = import_module(abs_module_path)
 
@@ -77,9 +214,13 @@ class Frame:
         keys = set(list(self._objects.keys())+list(self._serialized.keys()))
         return iter(list(keys))
 
-    def serialize(self)->bytes:
+    def serialize(self, offset: int = 0)->bytes:
         """Serializes the frame to a bytestream
 
+        Args:
+            offset (int, optional): position of the frame in an enclosing
+                                    frame (used to align the data of arrays)
+
         Returns:
             bytes: serialized frame
         """
@@ -89,11 +230,14 @@ class Frame:
         pos = 0
         for k, v in self.items():
             if isinstance(v, np.ndarray) or isinstance(v, tuple):
-                v = PyArrowSerializer(v)
+                v = NDArraySerializer(v)
             classes.append(
                 "{},{},{}\n".format(k, v.__class__.__name__, v.__class__.__module__)
             )
-            d = v.serialize()
+            if isinstance(v, (NDArraySerializer, Frame)):
+                d = v.serialize(offset + pos)
+            else:
+                d = v.serialize()
             pos += len(d)
             index.append(pos)
             data_stream.extend(d)
@@ -122,7 +266,7 @@ class Frame:
         else:
             # If we don't know how to deserialize the object we just expose
             # the raw byte stream
-            self._objects[key] = data
+            self._objects[key] = bytes(data)
     @classmethod
     def deserialize(cls,data_stream:bytes):
         inst = cls()
@@ -131,9 +275,13 @@ class Frame:
     def deserialize_m(self, data_stream:bytes):
         """Deserializes a frame from byte buffer
 
+            The objects are deserialized from views into the buffer, so arrays
+            in the frame share the memory of the buffer.
+
         Args:
             data_stream (bytes): byte buffer to be deserialized
         """
+        data_stream = memoryview(data_stream)
         l_cls, n_obj, indexpos = struct.unpack("<3I", data_stream[-12:])
         index = struct.unpack("<{}I{}s".format(n_obj, l_cls), data_stream[indexpos:-12])
         classes = index[n_obj:][0].decode()
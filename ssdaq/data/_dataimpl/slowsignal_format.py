@@ -2,12 +2,24 @@ from datetime import datetime
 import numpy as np
 import struct
 from collections import namedtuple as _nt
-import sys
 
 N_TM = 32  # Number of target modules in camera
 N_TM_PIX = 64  # Number of pixels on a Target Module
 N_BYTES_NUM = 8  # Number of bytes to encode numbers (uint and float) in the SSReadout
 N_CAM_PIX = N_TM * N_TM_PIX  # Number of pixels in the camera
+N_BYTES_READOUT = N_BYTES_NUM * (4 + N_CAM_PIX)  # Number of bytes of a packed SSReadout
+
+readout_header = struct.Struct("<4Q")  # iro, time, cpu_t_s, cpu_t_ns
+MV_PER_COUNT = 0.03815 * 2.0  # Conversion from ADC counts to mV
+
+# Compact readout format: magic, version, encoding, TM bitmask, iro, time, cpu_t_s, cpu_t_ns
+compact_header = struct.Struct("<2sBBI4Q")
+COMPACT_MAGIC = b"SR"
+COMPACT_VERSION = 1
+# Encodings of the compact format (name: (encoding id, dtype))
+compact_encodings = {"float32": (0, np.dtype("<f4")), "uint16": (1, np.dtype("<u2"))}
+_compact_dtypes = {code: dtype for code, dtype in compact_encodings.values()}
+_tm_bits = np.uint32(1) << np.arange(N_TM, dtype=np.uint32)
 
 # fmt: off
 _SSMappings = _nt("SSMappings", "ssl2colrow ssl2asic_ch")
@@ -28,9 +40,29 @@ ss_mappings = _SSMappings(
 # fmt: on
 
 
+def readout_block(buffer, n: int) -> np.ndarray:
+    """ Returns a view of the data arrays of `n` consecutive packed
+        readouts in a buffer
+
+    Args:
+        buffer: an object exposing the buffer protocol of at least n * N_BYTES_READOUT bytes
+        n (int): number of readouts
+
+    Returns:
+        np.ndarray: array of shape (n, N_TM, N_TM_PIX) sharing memory with the buffer
+    """
+    packed = np.frombuffer(buffer, dtype=np.dtype("<f8"), count=n * (4 + N_CAM_PIX))
+    return packed.reshape(n, 4 + N_CAM_PIX)[:, 4:].reshape(n, N_TM, N_TM_PIX)
+
+
 class SSReadout(object):
     """
     A class representing a full camera slow signal readout
+
+    The header and data of the readout live in one contiguous buffer laid out as the
+    packed readout, which means that the readout can be packed and unpacked without
+    copying the data. The buffer of an unpacked readout belongs to the caller and is
+    never written to, the readout is copied into its own buffer when modified.
     """
 
     def __init__(
@@ -46,21 +78,52 @@ class SSReadout(object):
         self.time = timestamp
         self.cpu_t_s = cpu_t_s
         self.cpu_t_ns = cpu_t_ns
-        self.data = (
-            np.full((N_TM, N_TM_PIX), np.nan, dtype=np.dtype("<f8"))
-            if data is None
-            else data
-        )
+        self._set_buffer(bytearray(N_BYTES_READOUT))
+        self.data = np.nan if data is None else data
+
+    def _set_buffer(self, buffer, owned: bool = True):
+        self._buffer = buffer
+        self._owned = owned
         # Keeping the data in little endiann (assumed to be the mostly used endiann format)
-        if sys.byteorder != "little" and self.data.dtype.byteorder != "<":
-            self.data = self.data.byteswap()
+        self._data = np.frombuffer(
+            buffer, dtype=np.dtype("<f8"), count=N_CAM_PIX, offset=N_BYTES_NUM * 4
+        ).reshape(N_TM, N_TM_PIX)
+        if not owned:
+            self._data.flags.writeable = False
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        """ Assigning copies the values into the buffer of the readout (converted to
+            float64), i.e. the data must broadcast to (N_TM, N_TM_PIX) and the readout
+            does not alias the assigned array. Modify `data` in place to change the
+            readout without a copy (not possible for an unpacked readout, whose `data`
+            is a read-only view of the unpacked buffer until it is assigned to).
+        """
+        # An unpacked readout gets its own buffer when modified
+        if not self._owned:
+            self._set_buffer(bytearray(N_BYTES_READOUT))
+        self._data[:] = data
 
     @classmethod
     def from_bytes(cls, data):
-        inst = cls()
+        inst = cls.__new__(cls)
         inst.unpack(data)
         return inst
 
+    @classmethod
+    def wrap_buffer(cls, buffer):
+        """ Creates a readout from a packed readout in a writable buffer that the
+            readout takes over, i.e. modifying and packing the readout writes to
+            the buffer
+        """
+        inst = cls.from_bytes(buffer)
+        inst._set_buffer(buffer)
+        return inst
+
     @classmethod
     def deserialize(cls,byte_stream):
         return cls.from_bytes(byte_stream)
@@ -68,7 +131,7 @@ class SSReadout(object):
     def serialize(self):
         return self.pack()
 
-    def pack(self):
+    def pack(self, encoding: str = "float64", copy: bool = True):
         """
             Convinience method to pack the readout into a bytestream
 
@@ -79,26 +142,121 @@ class SSReadout(object):
                 8       bytes encoding the readout cpu timestamp nanoseconds (uint64)
                 2048x8  bytes encoding the 2D readout data using 'C' order (float64)
 
-            returns bytearray
+            The header is written into the buffer of the readout which is returned as
+            an immutable copy. With `copy=False` no data is copied and a memoryview of
+            the buffer is returned instead, which changes if the readout is modified
+            (only use it if the readout is not modified while the result is in use).
+
+            With `encoding` set to 'float32' or 'uint16' the readout is instead packed
+            in the compact format:
+                2       bytes magic b'SR'
+                1       byte encoding the format version (uint8)
+                1       byte encoding the data encoding (uint8, 0: float32, 1: uint16)
+                4       bytes encoding a bitmask of the TMs present in the readout (uint32)
+                4x8     bytes encoding the readout number, TACK and cpu timestamp as above
+                Nx64xM  bytes encoding the rows of the N present TMs using 'C' order
+                        (float32 or uint16 ADC counts)
+
+            TMs with only NaNs are left out. The uint16 encoding carries the ADC counts
+            (mV / MV_PER_COUNT) and is only lossless for data decoded from ADC counts.
+            NaNs in the rows of present TMs are encoded as 0 counts and values outside
+            the ADC range (including infinities) are clipped to 0 or 0xFFFF counts.
+
+            Args:
+                encoding (str, optional): 'float64' (default), 'float32' or 'uint16'
+                copy (bool, optional): return a copy (float64 only, the compact format
+                                       is always packed into a new buffer)
+
+            returns bytes or memoryview if `copy=False` (float64) or bytearray (compact format)
         """
-        d_stream = bytearray(
-            struct.pack("<4Q", self.iro, self.time, self.cpu_t_s, self.cpu_t_ns)
-        )
+        if encoding != "float64":
+            return self._pack_compact(encoding)
+        header = (self.iro, self.time, self.cpu_t_s, self.cpu_t_ns)
+        if self._owned:
+            readout_header.pack_into(self._buffer, 0, *header)
+        elif readout_header.unpack_from(self._buffer, 0) != header:
+            # unpacked buffer, copied only if the header has been modified
+            buffer = bytearray(self._buffer[:N_BYTES_READOUT])
+            readout_header.pack_into(buffer, 0, *header)
+            self._set_buffer(buffer)
+        packed = memoryview(self._buffer)[:N_BYTES_READOUT]
+        return bytes(packed) if copy else packed
 
-        d_stream.extend(self.data.tobytes())
-        return d_stream
+    def _pack_compact(self, encoding):
+        try:
+            code, dtype = compact_encodings[encoding]
+        except KeyError:
+            raise ValueError("Unknown readout encoding `{}`".format(encoding))
+        present = ~np.isnan(self.data).all(axis=1)
+        rows = self.data[present]
+        if code == compact_encodings["uint16"][0]:
+            rows = np.nan_to_num(np.clip(np.rint(rows / MV_PER_COUNT), 0, 0xFFFF))
+        buffer = bytearray(compact_header.size + rows.size * dtype.itemsize)
+        compact_header.pack_into(
+            buffer,
+            0,
+            COMPACT_MAGIC,
+            COMPACT_VERSION,
+            code,
+            int(_tm_bits[present].sum()),
+            self.iro,
+            self.time,
+            self.cpu_t_s,
+            self.cpu_t_ns,
+        )
+        np.frombuffer(buffer, dtype=dtype, offset=compact_header.size)[:] = rows.ravel()
+        return buffer
 
     def unpack(self, byte_stream):
         """
-        Unpack a bytestream into an readout
+        Unpack a bytestream into an readout. The readout data is
+        a read-only view into the bytestream (no copy is made).
+
+        Bytestreams shorter than a float64 packed readout are unpacked
+        as the compact format (see `pack`), which requires a copy.
         """
-        self.iro, self.time, self.cpu_t_s, self.cpu_t_ns = struct.unpack_from(
-            "<4Q", byte_stream, 0
+        if len(byte_stream) < N_BYTES_READOUT:
+            self._unpack_compact(byte_stream)
+            return
+        self.iro, self.time, self.cpu_t_s, self.cpu_t_ns = readout_header.unpack_from(
+            byte_stream, 0
         )
-        self.data = np.frombuffer(
-            byte_stream[N_BYTES_NUM * 4 : N_BYTES_NUM * (4 + N_CAM_PIX)],
-            dtype=np.dtype("<f8"),
-        ).reshape(N_TM, N_TM_PIX)
+        self._set_buffer(byte_stream, owned=False)
+
+    def _unpack_compact(self, byte_stream):
+        (
+            magic,
+            version,
+            code,
+            tm_mask,
+            self.iro,
+            self.time,
+            self.cpu_t_s,
+            self.cpu_t_ns,
+        ) = compact_header.unpack_from(byte_stream, 0)
+        if (
+            magic != COMPACT_MAGIC
+            or version != COMPACT_VERSION
+            or code not in _compact_dtypes
+        ):
+            raise ValueError(
+                "Not a packed readout: magic {}, version {}, encoding {}".format(
+                    magic, version, code
+                )
+            )
+        present = (_tm_bits & np.uint32(tm_mask)) > 0
+        rows = np.frombuffer(
+            byte_stream,
+            dtype=_compact_dtypes[code],
+            count=int(present.sum()) * N_TM_PIX,
+            offset=compact_header.size,
+        ).reshape(-1, N_TM_PIX)
+        self._set_buffer(bytearray(N_BYTES_READOUT))
+        self._data[:] = np.nan
+        if code == compact_encodings["uint16"][0]:
+            self._data[present] = rows * MV_PER_COUNT
+        else:
+            self._data[present] = rows
 
     def __repr__(self):
         return "ssdaq.SSReadout({},\n{},\n{},\n{},\n{})".format(
@@ -2,43 +2,242 @@ import struct
 from ssdaq import sslogger
 from bitarray import bitarray
 import numpy as np
+from collections import namedtuple as _nt
 from ssdaq.core.utils import get_attritbues
+from .trigger_mapping import get_SP2bptrigg_mapping, get_bptrigg2SP_mapping
 
 log = sslogger.getChild("trigger_data")
 TriggerPacketHeader = struct.Struct("<HB")
 
 
-def get_SP2bptrigg_mapping():
-    """ Returns the mapping of SPs to back plane triggers
+# number of set bits in a byte (fallback for numpy versions without bitwise_count)
+_popcount8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
 
-    Returns:
-        np.array: array containing the mapping
+
+class TriggerPatterns:
+    """ Bit-packed trigger patterns of a readout window.
+
+        The patterns are stored per super pixel (SP) with the readout window
+        packed into uint64 words, i.e. an array of shape (512, n_words) where
+        the first bytes of each row have the bit layout of `np.packbits` along
+        the time axis (as in the trigger packets). Bits past the readout length
+        are zero. Compared to one byte per bit this uses 8 times less memory.
     """
 
-    fMask2SPA = np.array([6, 7, 14, 12, 4, 5, 15, 13, 3, 2, 8, 11, 1, 0, 10, 9])
-    fMask2SPB = np.array([9, 10, 0, 1, 11, 8, 2, 3, 13, 15, 5, 4, 12, 14, 7, 6])
-    masks = [fMask2SPA, fMask2SPB]
-    sel = [0, 1, 0, 1] + [1, 0] * 12 + [0, 1, 0, 1]
-    m = np.zeros(512, dtype=np.uint64)
-    for i, s in enumerate(sel):
-        m[i * 16 : i * 16 + 16] = masks[s] + i * 16
-    return m
+    n_sps = 512
 
+    def __init__(self, words: np.ndarray, length: int):
+        """
+        Args:
+            words (np.ndarray): packed patterns of shape (512, n_words) and type uint64
+            length (int): readout length (number of time steps)
+        """
+        self._words = words
+        self._length = length
 
-def get_bptrigg2SP_mapping():
-    """ Returns the mapping of backplane triggers to SPs
+    @staticmethod
+    def _n_words(length: int) -> int:
+        return (length + 63) // 64
 
-    Returns:
-        TYPE: array containing the mapping
-    """
-    fSP2MaskA = np.array([13, 12, 9, 8, 4, 5, 0, 1, 10, 15, 14, 11, 3, 7, 2, 6])
-    fSP2MaskB = np.array([2, 3, 6, 7, 11, 10, 15, 14, 5, 0, 1, 4, 12, 8, 13, 9])
-    masks = [fSP2MaskA, fSP2MaskB]
-    sel = [0, 1, 0, 1] + [1, 0] * 12 + [0, 1, 0, 1]
-    m = np.zeros(512, dtype=np.uint64)
-    for i, s in enumerate(sel):
-        m[i * 16 : i * 16 + 16] = masks[s] + i * 16
-    return m
+    @classmethod
+    def zeros(cls, length: int):
+        """ Empty trigger patterns
+
+        Args:
+            length (int): readout length
+
+        Returns:
+            TriggerPatterns: patterns with no bits set
+        """
+        return cls(np.zeros((cls.n_sps, cls._n_words(length)), dtype=np.uint64), length)
+
+    @classmethod
+    def from_array(cls, pattrns: np.ndarray):
+        """ Packs unpacked trigger patterns
+
+        Args:
+            pattrns (np.ndarray): array of shape (readout length, 512) with one element per bit
+
+        Returns:
+            TriggerPatterns: packed patterns
+        """
+        pattrns = np.asarray(pattrns)
+        instance = cls.zeros(pattrns.shape[0])
+        packed = np.packbits(pattrns.T.astype(bool), axis=1)
+        instance.bytes[:, : packed.shape[1]] = packed
+        return instance
+
+    @classmethod
+    def from_packed(cls, buffer, length: int, sps: np.ndarray = None):
+        """ Creates trigger patterns from patterns packed per SP as in
+            the trigger packets (`np.packbits(pattrns.T)`)
+
+        Args:
+            buffer (bytes-like): the packed patterns with `length/8` bytes per SP
+            length (int): readout length (must be a multiple of 8)
+            sps (np.ndarray, optional): the SPs the packed patterns belong to
+                                        if zero suppressed (default all SPs)
+
+        Returns:
+            TriggerPatterns: packed patterns
+        """
+        instance = cls.zeros(length)
+        nbytes = length // 8
+        packed = np.frombuffer(buffer, dtype=np.uint8).reshape((-1, nbytes))
+        if sps is None:
+            instance.bytes[:, :nbytes] = packed
+        else:
+            instance.bytes[sps, :nbytes] = packed
+        return instance
+
+    @property
+    def words(self) -> np.ndarray:
+        """ The packed patterns as uint64 words with shape (512, n_words)
+        """
+        return self._words
+
+    @property
+    def bytes(self) -> np.ndarray:
+        """ The packed patterns as bytes with shape (512, 8*n_words)
+        """
+        return self._words.view(np.uint8)
+
+    @property
+    def packed(self) -> np.ndarray:
+        """ The packed patterns with shape (512, ceil(readout length/8))
+            as stored in the trigger packets
+        """
+        return self.bytes[:, : (self._length + 7) // 8]
+
+    @property
+    def length(self) -> int:
+        """ Readout length (number of time steps)
+        """
+        return self._length
+
+    @property
+    def nbytes(self) -> int:
+        return self._words.nbytes
+
+    def __len__(self):
+        return self._length
+
+    def __eq__(self, other):
+        if not isinstance(other, TriggerPatterns):
+            return NotImplemented
+        return self._length == other._length and np.array_equal(
+            self._words, other._words
+        )
+
+    def __repr__(self):
+        return "<TriggerPatterns> length: {}, triggered SPs: {}".format(
+            self._length, np.flatnonzero(self.sp_union()).tolist()
+        )
+
+    def _check_compatible(self, other):
+        if self._length != other._length:
+            raise ValueError(
+                "Trigger patterns of different lengths ({} and {})".format(
+                    self._length, other._length
+                )
+            )
+
+    def union(self, other):
+        """ Element-wise union with other trigger patterns
+
+        Args:
+            other (TriggerPatterns): patterns with the same readout length
+
+        Returns:
+            TriggerPatterns: the union
+        """
+        self._check_compatible(other)
+        return TriggerPatterns(self._words | other._words, self._length)
+
+    def intersection(self, other):
+        """ Element-wise intersection with other trigger patterns
+
+        Args:
+            other (TriggerPatterns): patterns with the same readout length
+
+        Returns:
+            TriggerPatterns: the intersection
+        """
+        self._check_compatible(other)
+        return TriggerPatterns(self._words & other._words, self._length)
+
+    __or__ = union
+    __and__ = intersection
+
+    def sp_union(self) -> np.ndarray:
+        """ The union of the patterns over the readout window,
+            i.e. the SPs that triggered at any time step
+
+        Returns:
+            np.ndarray: boolean array of length 512
+        """
+        return np.any(self._words != 0, axis=1)
+
+    def popcount(self, axis: int = None):
+        """ Counts the triggers (set bits)
+
+        Args:
+            axis (int, optional): None for the total count, 0 for the count per
+                                  time step and 1 for the count per SP
+
+        Returns:
+            int or np.ndarray: the number of triggers
+        """
+        if axis == 0:
+            return np.unpackbits(self.packed, axis=1, count=self._length).sum(axis=0)
+        if hasattr(np, "bitwise_count"):
+            counts = np.bitwise_count(self._words)
+        else:
+            counts = _popcount8[self.bytes]
+        if axis is None:
+            return int(counts.sum(dtype=np.int64))
+        return counts.sum(axis=1, dtype=np.int64)
+
+    def phase(self, index):
+        """ The trigger pattern of one or several time steps (phases)
+
+        Args:
+            index (int, slice or array): time step(s)
+
+        Returns:
+            np.ndarray: uint8 array of shape (512,) for an integer index otherwise (n, 512)
+        """
+        if isinstance(index, (int, np.integer)):
+            if not -self._length <= index < self._length:
+                raise IndexError(
+                    "phase {} out of range for readout length {}".format(
+                        index, self._length
+                    )
+                )
+            index %= self._length
+            return (self.bytes[:, index >> 3] >> (7 - (index & 7))) & 1
+        index = np.arange(self._length)[index]
+        return ((self.bytes[:, index >> 3] >> (7 - (index & 7))) & 1).T
+
+    def map_sps(self, mapping: np.ndarray):
+        """ Reorders the SPs, e.g using `get_SP2bptrigg_mapping` or
+            `get_bptrigg2SP_mapping`
+
+        Args:
+            mapping (np.ndarray): new position to old position of each SP
+
+        Returns:
+            TriggerPatterns: patterns with the SPs reordered
+        """
+        return TriggerPatterns(self._words[mapping], self._length)
+
+    def to_array(self) -> np.ndarray:
+        """ Unpacks the patterns to one byte per bit
+
+        Returns:
+            np.ndarray: uint8 array of shape (readout length, 512)
+        """
+        return np.unpackbits(self.packed, axis=1, count=self._length).T
 
 
 class TriggerPacket:
@@ -91,7 +290,7 @@ class TriggerPacket:
         Returns:
             TriggerPacket:  Instance of a descendant to TriggerPacket
         """
-        magic_mark, mtype = TriggerPacketHeader.unpack(raw_packet[:3])
+        magic_mark, mtype = TriggerPacketHeader.unpack_from(raw_packet, 0)
 
         if magic_mark != 0xCAFE:
             log.error(
@@ -99,7 +298,9 @@ class TriggerPacket:
                 % (magic_mark, 0xCAFE)
             )
             return None
-        instance = TriggerPacket._message_types[mtype].unpack(raw_packet[3:])
+        instance = TriggerPacket._message_types[mtype].unpack(
+            memoryview(raw_packet)[3:]
+        )
         instance._raw_packet = raw_packet
 
         return instance
@@ -237,6 +438,10 @@ class NominalTriggerPacketV1(TriggerPacket):
     def trigg_union(self):
         return self._trigg_union
 
+    @property
+    def trigg_pattrns(self):
+        return self._trigg_pattrns
+
     @classmethod
     def unpack(cls, raw_packet: bytearray):
         readout_length = 16
@@ -346,6 +551,15 @@ class TriggerPacketV2(TriggerPacket):
         for the whole readout window and encodes the busy flag
         in the message type.
 
+        The trigger patterns are held bit-packed as `TriggerPatterns`
+        and only unpacked to one byte per bit when `trigg_pattrns` is
+        first accessed. The unpacked array then holds the patterns of
+        the packet, i.e. modifications of it are packed.
+
+        Unpacked packets are lazy: the header fields are unpacked
+        immediately while the trigger patterns and union are unpacked
+        from a reference to the raw packet when first accessed. The
+        raw packet must therefore not be modified.
     """
 
     _mtype = 0x2
@@ -375,7 +589,7 @@ class TriggerPacketV2(TriggerPacket):
             pps_count (int, optional): pulse per second count
             clock_count (int, optional): clock count
             trigg_pattrns (np.array type uint8, optional): Trigger patterns of `n` readouts. numpy array of shape (n,512)
-
+                                                           or `TriggerPatterns` (None when instantiated by `unpack`)
         """
         self._message_type = message_type
         self._error_flags = error_flags
@@ -385,14 +599,44 @@ class TriggerPacketV2(TriggerPacket):
         self._ro_count = ro_count
         self._pps_count = pps_count
         self._clock_count = clock_count
-        self._trigg_pattrns = trigg_pattrns
-        self._readout_length = self._trigg_pattrns.shape[0]
-        trigg_SPs = np.any(self._trigg_pattrns, axis=0)
-        self._trigg_union = trigg_SPs  # bitarray(trigg_SPs.data, endian="little")
+        if trigg_pattrns is not None and not isinstance(trigg_pattrns, TriggerPatterns):
+            trigg_pattrns = TriggerPatterns.from_array(trigg_pattrns)
+        self._patterns = trigg_pattrns
+        self._readout_length = None
+        if trigg_pattrns is not None:
+            self._readout_length = trigg_pattrns.length
+        self._trigg_union = None
         self._trigg = None
+        # the patterns unpacked to one byte per bit
+        self._trigg_pattrns = None
+        # packed trigger union and patterns of an unpacked packet
+        self._raw_pattrns = None
 
     def _compute_trigg(self):
-        self._trigg = self._trigg_pattrns[self.phase_index, :]
+        self._trigg = self.patterns.phase(self.phase_index)
+
+    @classmethod
+    def _lazy(cls, raw_packet):
+        """ Instantiates a packet from a raw packet (not including the 3 first bytes)
+            only unpacking the header
+        """
+        head_form = cls._head_form
+        header = list(head_form.unpack_from(raw_packet, 0))
+
+        # The phase bits are backwards in the trigger packet
+        header[5] = cls._reverse_bits[header[5]]
+        ro_len = header[3] * 8
+        # The readout length is not needed for the class instantiation
+        del header[3]
+        instance = cls(*header + [None])
+        instance._readout_length = ro_len
+        instance._raw_pattrns = raw_packet[head_form.size :]
+        return instance
+
+    @staticmethod
+    def _unpack_pattrns(raw_pattrns, ro_len: int) -> TriggerPatterns:
+        # The triggered phases (trigger pattern readout) in chunks of 8 bits per SP
+        return TriggerPatterns.from_packed(raw_pattrns[int(512 / 8) :], ro_len)
 
     @property
     def message_type(self):
@@ -455,10 +699,36 @@ class TriggerPacketV2(TriggerPacket):
 
     @property
     def trigg_union(self):
+        if self._trigg_union is None:
+            if self._raw_pattrns is not None:
+                # the union is sent in front of the patterns
+                self._trigg_union = np.unpackbits(
+                    np.frombuffer(self._raw_pattrns[: int(512 / 8)], dtype=np.uint8)
+                ).astype(bool)
+            else:
+                self._trigg_union = self._patterns.sp_union()
         return self._trigg_union
 
+    @property
+    def patterns(self) -> TriggerPatterns:
+        """ The bit-packed trigger patterns
+        """
+        if self._trigg_pattrns is not None:
+            # the unpacked patterns may have been modified
+            return TriggerPatterns.from_array(self._trigg_pattrns)
+        if self._patterns is None:
+            self._patterns = self._unpack_pattrns(
+                self._raw_pattrns, self._readout_length
+            )
+        return self._patterns
+
     @property
     def trigg_pattrns(self):
+        """ The trigger patterns unpacked to an uint8 array of
+            shape (readout length, 512). Unpacked on the first access.
+        """
+        if self._trigg_pattrns is None:
+            self._trigg_pattrns = self.patterns.to_array()
         return self._trigg_pattrns
 
     @property
@@ -479,29 +749,13 @@ class TriggerPacketV2(TriggerPacket):
 
     @classmethod
     def unpack(cls, raw_packet: bytearray):
-        """ Unpacks a V2 trigger packet
+        """ Unpacks a V2 trigger packet. The trigger patterns are
+            unpacked when accessed.
 
         Args:
             raw_packet (bytearray): the raw payload not including the 3 first bytes
         """
-        head_form = cls._head_form
-        header = list(head_form.unpack(raw_packet[: head_form.size]))
-
-        # The phase bits are backwards in the trigger packet
-        header[5] = cls._reverse_bits[header[5]]
-        ro_len = header[3] * 8
-        # The readout length is not needed for the class instantiation
-        del header[3]
-
-        # Extracting the triggered phases (trigger pattern readout) in chunks of 8 bits
-        trigg_pattrns = np.frombuffer(
-            raw_packet[head_form.size + int(512 / 8) :], dtype=np.uint8
-        )
-        trigg_pattrns = (
-            np.unpackbits(trigg_pattrns).reshape((512, ro_len))
-        ).T  # we want the rows to be the time axis
-
-        return cls(*header + [trigg_pattrns])
+        return cls._lazy(raw_packet)
 
     def pack(self):
         raw_packet = super().pack_header(self._mtype)
@@ -518,8 +772,8 @@ class TriggerPacketV2(TriggerPacket):
                 self._clock_count,
             )
         )
-        raw_packet.extend(np.packbits(self._trigg_union).tobytes())
-        raw_packet.extend(np.packbits((self._trigg_pattrns.T)).tobytes())
+        raw_packet.extend(np.packbits(self.trigg_union).tobytes())
+        raw_packet.extend(self.patterns.packed.tobytes())
         return raw_packet
 
 
@@ -536,38 +790,23 @@ class TriggerPacketV3(TriggerPacketV2):
 
     @classmethod
     def unpack(cls, raw_packet: bytearray):
-        """ Unpacks a V3 trigger packet
+        """ Unpacks a V3 trigger packet. The trigger patterns are
+            unpacked when accessed.
 
         Args:
             raw_packet (bytearray): the raw payload not including the 3 first bytes
         """
-        head_form = cls._head_form
-        header = list(head_form.unpack(raw_packet[: head_form.size]))
-
-        # The phase bits are backwards in the trigger packet
-        header[5] = cls._reverse_bits[header[5]]
+        return cls._lazy(raw_packet)
 
+    @staticmethod
+    def _unpack_pattrns(raw_pattrns, ro_len: int) -> TriggerPatterns:
         union = np.unpackbits(
-            np.frombuffer(
-                raw_packet[head_form.size : head_form.size + int(512 / 8)],
-                dtype=np.uint8,
-            )
+            np.frombuffer(raw_pattrns[: int(512 / 8)], dtype=np.uint8)
         )
-        ro_len = header[3] * 8
-        # The readout length is not needed for the class instantiation
-        del header[3]
-
-        # Extracting the triggered phases (trigger pattern readout)
-        triggered_pattrns = np.frombuffer(
-            raw_packet[head_form.size + int(512 / 8) :], dtype=np.uint8
+        # The triggered phases (trigger pattern readout) of the SPs in the union
+        return TriggerPatterns.from_packed(
+            raw_pattrns[int(512 / 8) :], ro_len, np.flatnonzero(union)
         )
-        triggered_pattrns = (
-            np.unpackbits(triggered_pattrns).reshape((512, ro_len))
-        ).T  # we want the rows to be the time axis
-        trigg_pattrns = np.zeros((ro_len, 512),dtype=np.uint8)
-        trigg_pattrns[:, np.where(union)[0]] = triggered_pattrns
-
-        return cls(*header + [trigg_pattrns])
 
     def pack(self):
         raw_packet = super().pack_header(self._mtype)
@@ -584,8 +823,222 @@ class TriggerPacketV3(TriggerPacketV2):
                 self._clock_count,
             )
         )
-        raw_packet.extend(np.packbits(self._trigg_union).tobytes())
-        trigg_SPs = np.where(np.any(self._trigg_pattrns, axis=0))[0]
-        triggered_pattrns = np.packbits(self._trigg_pattrns[:, trigg_SPs].T)
-        raw_packet.extend(triggered_pattrns.tobytes())
+        union = self.trigg_union
+        raw_packet.extend(np.packbits(union).tobytes())
+        raw_packet.extend(self.patterns.packed[np.flatnonzero(union)].tobytes())
         return raw_packet
+
+
+# ====================Columnar (bulk) unpacking of trigger packets====================
+
+TriggerColumns = _nt(
+    "TriggerColumns",
+    "mtype busy tack_time phase ro_count pps_count clock_count source error_flags"
+    " readout_length trigg_union trigg_pattrns",
+)
+TriggerColumns.__doc__ = """ Trigger packets as columns. All fields are arrays with
+    one entry per packet. The trigger union has shape (N, 64) and the trigger
+    patterns (N, ro_len, 64), with the 512 trigger bits of each readout time
+    step packed as by `np.packbits` (bit i is trigger i). Packets with a shorter
+    readout than the longest are padded with zeros.
+"""
+
+# Packet headers including the 3 byte trigger packet header
+_v1_head_dtype = np.dtype(
+    [
+        ("magic", "<u2"),
+        ("mtype", "u1"),
+        ("_", "u1"),
+        ("tack_time", "<u8"),
+        ("phase", "u1"),
+    ]
+)
+_v1_tail_dtype = np.dtype(
+    [
+        ("ro_count", "<u4"),
+        ("pps_count", "<u4"),
+        ("clock_count", "<u4"),
+        ("source", "<u2"),
+    ]
+)
+_v2_head_dtype = np.dtype(
+    [
+        ("magic", "<u2"),
+        ("mtype", "u1"),
+        ("message_type", "u1"),
+        ("error_flags", "u1"),
+        ("source", "<u2"),
+        ("ro_len", "u1"),
+        ("tack_time", "<u8"),
+        ("phase", "u1"),
+        ("ro_count", "<u4"),
+        ("pps_count", "<u4"),
+        ("clock_count", "<u4"),
+    ]
+)
+_V1_RO_LEN = 16
+# lookup table to reverse the bits of the phase byte
+_reverse_byte = np.packbits(
+    np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)[:, ::-1], axis=1
+).ravel()
+
+
+def _gather(buffer: np.ndarray, starts: np.ndarray, size: int) -> np.ndarray:
+    """ Gathers `size` bytes at each start position into an (N, size) array
+    """
+    return buffer[starts[:, None] + np.arange(size)]
+
+
+def _gather_var(buffer: np.ndarray, starts: np.ndarray, lengths: np.ndarray):
+    """ Gathers and concatenates variable length byte ranges
+    """
+    ends = np.cumsum(lengths)
+    inds = np.arange(ends[-1] if len(ends) > 0 else 0)
+    inds += np.repeat(starts - (ends - lengths), lengths)
+    return buffer[inds]
+
+
+def _unpack_patterns(buffer, starts, stored, ro_len):
+    """ Unpacks the trigger patterns of packets with the same readout length.
+        The stored triggers (SP-major bits of all readout time steps) are
+        transposed to (N, ro_len, 64) with the triggers packed on the last axis.
+    """
+    lengths = stored.sum(axis=1) * ro_len // 8
+    bits = np.unpackbits(_gather_var(buffer, starts, lengths)).reshape(-1, ro_len)
+    packet, trigger = np.nonzero(stored)
+    byte = packet * 64 + trigger // 8
+    bit = trigger % 8
+    bits <<= (7 - bit).astype(np.uint8)[:, None]
+    pattrns = np.zeros((len(starts) * 64, ro_len), dtype=np.uint8)
+    # setting one bit position at a time, as a byte only
+    # occurs once per bit position the bits can be or:ed in
+    for i in range(8):
+        sel = bit == i
+        pattrns[byte[sel]] |= bits[sel]
+    return pattrns.reshape(len(starts), 64, ro_len).transpose(0, 2, 1)
+
+
+def unpack_trigger_columns(
+    buffer: np.ndarray, offsets: np.ndarray, sizes: np.ndarray, patterns: bool = True
+) -> TriggerColumns:
+    """ Unpacks a number of trigger packets in a buffer into columns
+        without instantiating trigger packet objects. All packet versions
+        (V1, V2 and V3) are supported and can be mixed.
+
+    Args:
+        buffer (np.ndarray): uint8 array containing the packets
+        offsets (np.ndarray): position of each packet in the buffer
+        sizes (np.ndarray): size of each packet in bytes
+        patterns (bool, optional): unpack the trigger patterns, if False
+                                   `trigg_pattrns` has shape (N, 0, 64)
+
+    Returns:
+        TriggerColumns: the unpacked packets
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    n = len(offsets)
+    mtype = buffer[offsets + 2] if n > 0 else np.empty(0, dtype=np.uint8)
+    columns = {
+        "mtype": mtype,
+        "busy": np.zeros(n, dtype=bool),
+        "tack_time": np.zeros(n, dtype=np.uint64),
+        "phase": np.zeros(n, dtype=np.uint8),
+        "ro_count": np.zeros(n, dtype=np.uint32),
+        "pps_count": np.zeros(n, dtype=np.uint32),
+        "clock_count": np.zeros(n, dtype=np.uint32),
+        "source": np.zeros(n, dtype=np.uint16),
+        "error_flags": np.zeros(n, dtype=np.uint8),
+        "readout_length": np.zeros(n, dtype=np.int64),
+        "trigg_union": np.zeros((n, 64), dtype=np.uint8),
+    }
+    pattrns = []
+
+    v1 = np.where(mtype < 2)[0]
+    if len(v1) > 0:
+        head = _gather(buffer, offsets[v1], _v1_head_dtype.itemsize)
+        head = head.view(_v1_head_dtype).ravel()
+        tail = _gather(buffer, offsets[v1] + sizes[v1] - 14, _v1_tail_dtype.itemsize)
+        tail = tail.view(_v1_tail_dtype).ravel()
+        for name in ["ro_count", "pps_count", "clock_count", "source"]:
+            columns[name][v1] = tail[name]
+        columns["tack_time"][v1] = head["tack_time"]
+        columns["phase"][v1] = _reverse_byte[head["phase"]]
+        columns["busy"][v1] = mtype[v1] == 1
+        columns["readout_length"][v1] = _V1_RO_LEN
+        pattrn_start = offsets[v1] + _v1_head_dtype.itemsize
+        columns["trigg_union"][v1] = _gather(buffer, pattrn_start + 1024, 64)
+        stored = np.ones((len(v1), 512), dtype=bool)
+        if patterns:
+            pattrns.append(
+                (v1, _unpack_patterns(buffer, pattrn_start, stored, _V1_RO_LEN))
+            )
+
+    v2 = np.where(mtype >= 2)[0]
+    if len(v2) > 0:
+        head = _gather(buffer, offsets[v2], _v2_head_dtype.itemsize)
+        head = head.view(_v2_head_dtype).ravel()
+        for name in ["tack_time", "ro_count", "pps_count", "clock_count", "source"]:
+            columns[name][v2] = head[name]
+        columns["error_flags"][v2] = head["error_flags"]
+        columns["phase"][v2] = _reverse_byte[head["phase"]]
+        columns["busy"][v2] = (head["message_type"] & 1) == 1
+        ro_len = head["ro_len"].astype(np.int64) * 8
+        columns["readout_length"][v2] = ro_len
+        union_start = offsets[v2] + _v2_head_dtype.itemsize
+        union = _gather(buffer, union_start, 64)
+        columns["trigg_union"][v2] = union
+        # V3 packets only contain the patterns of the triggers in the union
+        stored = np.unpackbits(union, axis=1).astype(bool)
+        stored[mtype[v2] == 2] = True
+        for length in np.unique(ro_len) if patterns else []:
+            group = np.where(ro_len == length)[0]
+            pattrns.append(
+                (
+                    v2[group],
+                    _unpack_patterns(
+                        buffer, union_start[group] + 64, stored[group], int(length)
+                    ),
+                )
+            )
+
+    if len(pattrns) == 1 and len(pattrns[0][0]) == n:
+        # all packets have the same readout length and the same version
+        columns["trigg_pattrns"] = pattrns[0][1]
+    else:
+        max_ro_len = max([p.shape[1] for _, p in pattrns], default=0)
+        columns["trigg_pattrns"] = np.zeros((n, max_ro_len, 64), dtype=np.uint8)
+        for packets, p in pattrns:
+            columns["trigg_pattrns"][packets, : p.shape[1]] = p
+    return TriggerColumns(**columns)
+
+
+def concatenate_trigger_columns(columns: list) -> TriggerColumns:
+    """ Concatenates trigger columns, padding the trigger patterns
+        to the longest readout
+
+    Args:
+        columns (list): list of TriggerColumns
+
+    Returns:
+        TriggerColumns: the concatenated columns
+    """
+    if len(columns) == 0:
+        return unpack_trigger_columns(np.empty(0, dtype=np.uint8), [], [])
+    max_ro_len = max([c.trigg_pattrns.shape[1] for c in columns])
+    fields = {
+        name: np.concatenate([getattr(c, name) for c in columns])
+        for name in TriggerColumns._fields[:-1]
+    }
+    fields["trigg_pattrns"] = np.concatenate(
+        [
+            np.pad(
+                c.trigg_pattrns,
+                ((0, 0), (0, max_ro_len - c.trigg_pattrns.shape[1]), (0, 0)),
+            )
+            if c.trigg_pattrns.shape[1] < max_ro_len
+            else c.trigg_pattrns
+            for c in columns
+        ]
+    )
+    return TriggerColumns(**fields)
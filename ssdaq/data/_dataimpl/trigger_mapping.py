@@ -0,0 +1,165 @@
+""" Mapping between camera super pixels (SPs) and backplane triggers.
+
+    The mapping arrays and lookup tables are computed on first use and cached
+    at module level. The returned arrays are shared and therefore read-only.
+
+    Both mappings are permutations within blocks of 16 SPs (one TM), so a
+    16 bit word of a packed trigger pattern is remapped to a 16 bit word of
+    the same block. This is used to remap packed patterns with one gather
+    in two byte lookup tables per block.
+"""
+import numpy as np
+
+N_SPS = 512
+# number of SPs per TM (the block size of the mapping)
+_BLOCK = 16
+
+_fMask2SPA = [6, 7, 14, 12, 4, 5, 15, 13, 3, 2, 8, 11, 1, 0, 10, 9]
+_fMask2SPB = [9, 10, 0, 1, 11, 8, 2, 3, 13, 15, 5, 4, 12, 14, 7, 6]
+_fSP2MaskA = [13, 12, 9, 8, 4, 5, 0, 1, 10, 15, 14, 11, 3, 7, 2, 6]
+_fSP2MaskB = [2, 3, 6, 7, 11, 10, 15, 14, 5, 0, 1, 4, 12, 8, 13, 9]
+# which of the two masks is used for each TM
+_sel = [0, 1, 0, 1] + [1, 0] * 12 + [0, 1, 0, 1]
+
+_tables = {}
+
+
+def _cached(name, builder):
+    table = _tables.get(name)
+    if table is None:
+        table = builder()
+        table.flags.writeable = False
+        _tables[name] = table
+    return table
+
+
+def _build_mapping(masks):
+    masks = np.array(masks)
+    return (masks[_sel] + np.arange(len(_sel))[:, np.newaxis] * _BLOCK).ravel()
+
+
+def sp2bptrigg() -> np.ndarray:
+    """ The mapping of SPs to backplane triggers, i.e. `bp[i] = sp[m[i]]`
+
+    Returns:
+        np.ndarray: read-only int array of length 512
+    """
+    return _cached("sp2bptrigg", lambda: _build_mapping([_fMask2SPA, _fMask2SPB]))
+
+
+def bptrigg2sp() -> np.ndarray:
+    """ The mapping of backplane triggers to SPs, i.e. `sp[i] = bp[m[i]]`
+
+    Returns:
+        np.ndarray: read-only int array of length 512
+    """
+    return _cached("bptrigg2sp", lambda: _build_mapping([_fSP2MaskA, _fSP2MaskB]))
+
+
+def get_SP2bptrigg_mapping() -> np.ndarray:
+    """ Returns the mapping of SPs to back plane triggers
+
+    Returns:
+        np.array: array containing the mapping
+    """
+    return _cached("SP2bptrigg_u64", lambda: sp2bptrigg().astype(np.uint64))
+
+
+def get_bptrigg2SP_mapping() -> np.ndarray:
+    """ Returns the mapping of backplane triggers to SPs
+
+    Returns:
+        np.array: array containing the mapping
+    """
+    return _cached("bptrigg2SP_u64", lambda: bptrigg2sp().astype(np.uint64))
+
+
+def _build_word_lut(mapping):
+    """ Builds the lookup table lut[block, byte, value] of the remapped 16 bit
+        word (big endian, SP 0 of the block in the most significant bit)
+        contributed by a byte value of the packed pattern of the block
+    """
+    lut = np.zeros((N_SPS // _BLOCK, 2, 256), dtype=np.uint16)
+    values = np.arange(256, dtype=np.uint16)
+    for dest, src in enumerate(mapping):
+        block, dest = divmod(int(dest), _BLOCK)
+        src = int(src) - block * _BLOCK
+        bits = (values >> (7 - src % 8)) & 1
+        lut[block, src // 8] |= bits << (_BLOCK - 1 - dest)
+    return lut
+
+
+def _word_lut(name):
+    mapping = {"sp2bptrigg": sp2bptrigg, "bptrigg2sp": bptrigg2sp}[name]
+    return _cached(name + "_lut", lambda: _build_word_lut(mapping()))
+
+
+def remap_packed(packed: np.ndarray, mapping: str = "bptrigg2sp") -> np.ndarray:
+    """ Remaps patterns packed as by `np.packbits` along the SP axis
+        (bit i is SP/trigger i), e.g. the trigger union or the columns of
+        `read_trigger_columns`, without unpacking them
+
+    Args:
+        packed (np.ndarray): uint8 array of shape (..., 64)
+        mapping (str, optional): `bptrigg2sp` or `sp2bptrigg`
+
+    Returns:
+        np.ndarray: the remapped packed patterns with the same shape
+    """
+    lut = _word_lut(mapping)
+    packed = np.asarray(packed, dtype=np.uint8)
+    pairs = packed.reshape(packed.shape[:-1] + (N_SPS // _BLOCK, 2))
+    blocks = np.arange(N_SPS // _BLOCK)
+    words = lut[blocks, 0, pairs[..., 0]] | lut[blocks, 1, pairs[..., 1]]
+    return words.astype(">u2").view(np.uint8).reshape(packed.shape)
+
+
+class SPImageMapping:
+    """ Maps trigger patterns to camera images of SPs.
+
+        The backplane to SP mapping and the SP positions in the image are
+        composed into one index table, so that a batch of patterns is mapped
+        with one gather and scatter.
+    """
+
+    def __init__(
+        self,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        shape: tuple = (24, 24),
+        backplane: bool = True,
+    ):
+        """
+        Args:
+            rows (np.ndarray): image row of each SP
+            cols (np.ndarray): image column of each SP
+            shape (tuple, optional): the image shape
+            backplane (bool, optional): the patterns are ordered as backplane triggers
+                                        (as in the trigger packets) and not as SPs
+        """
+        self.shape = tuple(shape)
+        self.pixels = np.ravel_multi_index(
+            (np.asarray(rows), np.asarray(cols)), self.shape
+        )
+        self.pixels.flags.writeable = False
+        self.source = bptrigg2sp() if backplane else np.arange(N_SPS)
+
+    def __call__(self, pattrns: np.ndarray, fill=0, dtype=None) -> np.ndarray:
+        """ Maps patterns to images
+
+        Args:
+            pattrns (np.ndarray): a pattern of shape (512,) or a batch of shape (N, 512)
+            fill (optional): value of image pixels without a SP
+            dtype (optional): image type (default the type of the patterns)
+
+        Returns:
+            np.ndarray: image(s) of shape (*shape) or (N, *shape)
+        """
+        pattrns = np.asarray(pattrns)
+        images = np.full(
+            pattrns.shape[:-1] + (self.shape[0] * self.shape[1],),
+            fill,
+            dtype=dtype or pattrns.dtype,
+        )
+        images[..., self.pixels] = pattrns[..., self.source]
+        return images.reshape(pattrns.shape[:-1] + self.shape)
@@ -1,5 +1,9 @@
 ### Specialization to different protobuf protocols#####
 from . import LogData, TriggerMessage, TriggerPacket, Frame
+from ._dataimpl.trigger_format import (
+    unpack_trigger_columns,
+    concatenate_trigger_columns,
+)
 
 from ssdaq.core.io import RawObjectWriterBase, RawObjectReaderBase
 from ssdaq import version as checvers
@@ -154,11 +158,53 @@ class DataReader(RawObjectReaderBase):
         for i in range(self.n_entries):
             yield self._unpack(super().read())
 
+    def read_trigger_columns(
+        self, ind=None, patterns: bool = True, chunk_size: int = 1000
+    ):
+        """ Reads trigger packets as columns of numpy arrays without
+            unpacking each packet into a trigger packet object.
+
+        Args:
+            ind (slice or list, optional): the packets to read (default all packets)
+            patterns (bool, optional): unpack the trigger patterns (the header
+                                       fields are much faster to read on their own)
+            chunk_size (int, optional): number of packets unpacked at a time
+
+        Returns:
+            TriggerColumns: the trigger packets as columns
+
+        Raises:
+            TypeError: if the file does not contain trigger packets
+        """
+        if self._unpack != TriggerPacket.unpack:
+            raise TypeError("This file does not contain trigger packets")
+        if ind is None:
+            ind = slice(None)
+        if isinstance(ind, slice):
+            ind = np.arange(*ind.indices(self.n_entries))
+        ind = np.asarray(ind, dtype=np.int64)
+        columns = []
+        for start in range(0, len(ind), chunk_size):
+            packets = self._reader.read_indices(ind[start : start + chunk_size])
+            sizes = np.array([len(packet) for packet in packets], dtype=np.int64)
+            columns.append(
+                unpack_trigger_columns(
+                    np.frombuffer(b"".join(packets), dtype=np.uint8),
+                    np.cumsum(sizes) - sizes,
+                    sizes,
+                    patterns,
+                )
+            )
+        return concatenate_trigger_columns(columns)
+
 
 # ====================HDF5 Slow signal data reader and writer definitions===============
 import numpy as np
+import itertools
+import re
 import tables
-from tables import IsDescription, UInt64Col, Float32Col, Float64Col
+import numexpr
+from tables import IsDescription, Int64Col, UInt64Col, Float32Col, Float64Col
 from collections import namedtuple as _nt
 from ssdaq.version import get_version
 from ._dataimpl.slowsignal_format import SSReadout, N_TM_PIX, N_TM, ss_mappings
@@ -173,8 +219,10 @@ class TelData(IsDescription):
 
 
 class SSReadoutTableDs(IsDescription):
-    iro = UInt64Col()  # readout numner/index
-    time = UInt64Col()  # TACK timestamp
+    # signed as PyTables can not index or query unsigned 64-bit columns (files
+    # written by older versions have unsigned columns)
+    iro = Int64Col()  # readout numner/index
+    time = Int64Col()  # TACK timestamp
     cpu_t = Float64Col()  # native python timestamp float64
     cpu_t_s = UInt64Col()  # seconds time stamp uint64
     cpu_t_ns = UInt64Col()  # nano seconds time stamp uint64
@@ -182,7 +230,15 @@ class SSReadoutTableDs(IsDescription):
 
 
 class SSDataWriter(object):
-    """A writer for Slow Signal data"""
+    """A writer for Slow Signal data
+
+    Readouts are collected in a preallocated buffer of table rows which is
+    appended to the readout table in one call when full. When the file is
+    closed indexes are created on the `indexed_columns` of the readout table
+    for fast queries (see `SSDataReader.where`).
+    """
+
+    indexed_columns = ("iro", "time", "cpu_t")
 
     def __init__(
         self,
@@ -191,17 +247,34 @@ class SSDataWriter(object):
         filters: tables.Filters = None,
         buffer: int = 1000,
         tel_table=True,
+        complib: str = "bzip2",
+        complevel: int = 9,
+        chunkshape: tuple = None,
+        expectedrows: int = 10000,
+        index: bool = True,
     ):
-
+        """
+        Args:
+            filename (str): path to file
+            attrs (dict, optional): attributes stored with the readout table
+            filters (tables.Filters, optional): filters of the file (overrides `complib` and `complevel`)
+            buffer (int, optional): number of readouts buffered before they are appended to the table
+            tel_table (bool, optional): create the table for telescope data
+            complib (str, optional): compression library, e.g. 'bzip2' (default), 'zlib'
+                                     or the much faster 'blosc:lz4'
+            complevel (int, optional): compression level
+            chunkshape (tuple, optional): chunk shape of the readout table (by default
+                                          computed from `expectedrows`)
+            expectedrows (int, optional): expected number of readouts in the file
+            index (bool, optional): create the column indexes when the file is closed
+                                    (creating them once is much cheaper than updating
+                                    them on every append)
+        """
         self.filename = filename
         filters = (
             filters
             if filters != None
-            else tables.Filters(
-                complevel=9,
-                complib="bzip2",  # gives us 5 times the speed for the same compression as zlib
-                fletcher32=True,
-            )
+            else tables.Filters(complevel=complevel, complib=complib, fletcher32=True)
         )
         self.file = tables.open_file(
             self.filename,
@@ -213,7 +286,12 @@ class SSDataWriter(object):
             self.file.root, "SlowSignal", "Slow signal data"
         )
         self.table = self.file.create_table(
-            self.group, "readout", SSReadoutTableDs, "Slow signal readout"
+            self.group,
+            "readout",
+            SSReadoutTableDs,
+            "Slow signal readout",
+            chunkshape=chunkshape,
+            expectedrows=expectedrows,
         )
         self.tel_table = None
         self.tables = [self.table]
@@ -225,14 +303,16 @@ class SSDataWriter(object):
             self.tel_row = self.tel_table.row
             self.tables.append(self.tel_table)
 
-        self.ro_row = self.table.row
         self.data_counter = 0
         self.buffer = buffer
+        self.index = index
         self._cur_buf = 0
+        self._ro_buffer = np.zeros(buffer, dtype=self.table.dtype)
         if attrs is not None:
             for k, v in attrs.items():
                 self.table.attrs[k] = v
-        self.table.attrs["ss_data_version"] = 0
+        # version 1: signed iro and time columns
+        self.table.attrs["ss_data_version"] = 1
         self.table.attrs["ssdaq_version"] = get_version(pep440=True)
         self.table.attrs["ssl2asic_ch"] = ss_mappings.ssl2asic_ch
 
@@ -248,22 +328,34 @@ class SSDataWriter(object):
         self.write_readout(ro)
 
     def write_readout(self, ro):
+        i = self._cur_buf
+        buf = self._ro_buffer
+        buf["iro"][i] = ro.iro
+        buf["time"][i] = ro.time
+        buf["cpu_t"][i] = ro.cpu_t
+        buf["cpu_t_s"][i] = ro.cpu_t_s
+        buf["cpu_t_ns"][i] = ro.cpu_t_ns
+        # converted to float32 on assignment
+        buf["data"][i] = ro.data
 
-        self.ro_row["iro"] = ro.iro
-        self.ro_row["time"] = ro.time
-        self.ro_row["cpu_t"] = ro.cpu_t
-        self.ro_row["cpu_t_s"] = ro.cpu_t_s
-        self.ro_row["cpu_t_ns"] = ro.cpu_t_ns
-        self.ro_row["data"] = np.asarray(ro.data, dtype=np.float32)
-
-        self.ro_row.append()
         self._cur_buf += 1
         if self._cur_buf >= self.buffer:
+            self._append_buffered()
             self._flush()
-            self._cur_buf = 0
 
         self.data_counter += 1
 
+    def write_readouts(self, readouts):
+        """Writes a sequence of readouts
+        """
+        for ro in readouts:
+            self.write_readout(ro)
+
+    def _append_buffered(self):
+        if self._cur_buf > 0:
+            self.table.append(self._ro_buffer[: self._cur_buf])
+            self._cur_buf = 0
+
     def _flush(self):
         for table in self.tables:
             table.flush()
@@ -274,7 +366,11 @@ class SSDataWriter(object):
     def close_file(self):
         """Closes file handle
         """
+        self._append_buffered()
         self._flush()
+        if self.index:
+            for col in self.indexed_columns:
+                self.table.colinstances[col].create_index()
         self.file.close()
 
 
@@ -304,7 +400,7 @@ class SSDataReader(object):
         self.time = None
         self.cpu_t = None
 
-        self._readversions = {0: self._read0}
+        self._readversions = {0: self._read0, 1: self._read0}
         self.attrs = self.file.root.SlowSignal.readout.attrs
 
         try:
@@ -324,18 +420,14 @@ class SSDataReader(object):
 
     def __getitem__(self, iro):
 
-        if isinstance(iro, slice):
-            ro_list = [self[ii] for ii in range(*iro.indices(self.n_readouts))]
-            return np.array(ro_list)
-        elif isinstance(iro, list):
-            ro_list = [self[ii] for ii in iro]
-            return np.array(ro_list)
-        elif isinstance(iro, int):
+        if isinstance(iro, (slice, list, np.ndarray)):
+            return self.load_data(iro)
+        elif isinstance(iro, (int, np.integer)):
             if iro < 0:
-                iro += self.n_events
+                iro += self.n_readouts
             if iro < 0 or iro >= len(self):
                 raise IndexError("The requested event ({}) is out of range".format(iro))
-            return np.copy(self.read(iro).__next__())
+            return np.copy(self.read(int(iro)).__next__())
         else:
             raise TypeError("Invalid argument type")
 
@@ -374,6 +466,84 @@ class SSDataReader(object):
     def ssreadout(self):
         return SSReadout(self.time, self.iro, data=self.raw_data, cpu_t=self.cpu_t)
 
+    def _get_mapping(self, mapping):
+        """ Resolves a mapping argument (None for the mapping of the reader)
+
+            Returns:
+                np.ndarray or None: the mapping or None for the raw pixel order
+        """
+        if mapping is None:
+            return self.map
+        if isinstance(mapping, str):
+            if mapping == "raw":
+                return None
+            try:
+                return ss_mappings.__getattribute__(mapping)
+            except:
+                raise ValueError("No mapping found with name %s" % mapping)
+        return np.asarray(mapping)
+
+    def _read_rows(self, ind, chunk_size=4096):
+        """ Reads rows of the readout table in bulk (reading whole rows is
+            faster than reading single fields as the fields are interleaved)
+
+            Args:
+                ind (slice or arraylike): the rows to read
+                chunk_size (int, optional): number of rows read at a time
+
+            Yields:
+                np.ndarray: structured arrays of consecutive chunks of the rows
+        """
+        table = self.file.root.SlowSignal.readout
+        if isinstance(ind, slice):
+            start, stop, step = ind.indices(self.n_readouts)
+            if step > 0:
+                for i in range(start, stop, step * chunk_size):
+                    yield table.read(i, min(i + step * chunk_size, stop), step)
+                return
+            ind = np.arange(start, stop, step)
+        ind = np.asarray(ind, dtype=np.int64)
+        ind = np.where(ind < 0, ind + self.n_readouts, ind)
+        if np.any((ind < 0) | (ind >= self.n_readouts)):
+            raise IndexError("The requested readouts are out of range")
+        for i in range(0, len(ind), chunk_size):
+            yield table.read_coordinates(ind[i : i + chunk_size])
+
+    def load_data(self, ind=None, tm=None, calib=None, mapping=None):
+        """ Loads the data of many readouts with a few bulk reads
+
+            Args:
+                ind (int, slice or arraylike, optional): the readouts (rows) to load (default all)
+
+            Kwargs:
+                tm (int or arraylike): the slot number(s) of the target module(s) to load (default all)
+                calib (arraylike): calibration coefficients multiplied with the data
+                                   (broadcast against the loaded data before the mapping)
+                mapping (str or arraylike): a string to select a mapping or an array with the mapping
+                                            ['ssl2colrow','ssl2asic_ch','raw']
+
+            Returns:
+                np.ndarray: the data with shape (N, 32, 64), (N, 64) for one TM or without
+                            the first axis if `ind` is an integer
+        """
+        mapping = self._get_mapping(mapping)
+        if ind is None:
+            ind = slice(None)
+        single = isinstance(ind, (int, np.integer))
+        if single:
+            ind = [ind]
+        tm = slice(None) if tm is None else tm if np.ndim(tm) == 0 else np.asarray(tm)
+        data = [rows["data"][:, tm] for rows in self._read_rows(ind)]
+        if len(data) > 0:
+            data = np.concatenate(data)
+        else:
+            data = np.empty((0,) + self.raw_data[tm].shape, dtype=np.float32)
+        if calib is not None:
+            data = data * calib
+        if mapping is not None:
+            data = data[..., mapping]
+        return data[0] if single else data
+
     def load_all_data(self, tm, calib=None, mapping=None):
         """ Loads all rows of data for a particular target moduel into memory (in the future a selection of modules)
 
@@ -385,54 +555,221 @@ class SSDataReader(object):
                 mapping (str or arraylike): a string to select a mapping  or an array with the mapping
                                             ['ssl2colrow','ssl2asic_ch','raw']
         """
-        if calib is None:
-            calib = 1.0
-        if mapping is None:
-            mapping = self.map
-        elif isinstance(mapping, str):
-            if mapping == "raw":
-                mapping = np.arange(N_TM_PIX)
-            else:
-                try:
-                    mapping = ss_mappings.__getattribute__(mapping)
-                except:
-                    raise ValueError("No mapping found with name %s" % mapping)
-
-        amps = np.zeros((self.n_readouts, N_TM_PIX))
-        time = np.zeros(self.n_readouts, dtype=np.uint64)
-        cpu_t = np.zeros(self.n_readouts)
-        iro = np.zeros(self.n_readouts, dtype=np.uint64)
-
-        for i, r in enumerate(self.read()):
-            amps[i, :] = self.raw_data[tm, :] * calib
-            time[i] = self.time
-            cpu_t[i] = self.cpu_t
-            iro[i] = self.iro
-
-        amps = amps[:, mapping]
-
         ssdata = _nt("ssdata", "iro amps time cpu_t tm")
-        return ssdata(iro, amps, time, cpu_t, tm)
+        return ssdata(*self._load_columns(slice(None), tm, calib, mapping), tm)
+
+    def _load_columns(self, ind, tm, calib, mapping):
+        """ Loads the readout numbers, amplitudes (as float64), TACKs and
+            cpu times of the rows `ind` in one pass over the table
+        """
+        mapping = self._get_mapping(mapping)
+        tm = slice(None) if tm is None else tm
+        iro, amps, time, cpu_t = [], [], [], []
+        table = self.file.root.SlowSignal.readout
+        # the empty read gives the shapes and types if no rows are selected
+        for rows in itertools.chain(self._read_rows(ind), [table.read(0, 0)]):
+            iro.append(rows["iro"])
+            amps.append(rows["data"][:, tm])
+            time.append(rows["time"])
+            cpu_t.append(rows["cpu_t"])
+        amps = np.concatenate(amps).astype(np.float64)
+        if calib is not None:
+            amps *= calib
+        if mapping is not None:
+            amps = amps[..., mapping]
+        return np.concatenate(iro), amps, np.concatenate(time), np.concatenate(cpu_t)
+
+    def where(self, condition, condvars=None):
+        """ Finds the readouts fulfilling a condition on the columns of the readout table,
+            e.g. `reader.where("(cpu_t >= t0) & (cpu_t < t1)", {"t0": t0, "t1": t1})`.
+            The column indexes created by the writer are used when present.
+
+            Args:
+                condition (str): the condition (see `tables.Table.where`)
+                condvars (dict, optional): values of the variables in the condition
+
+            Returns:
+                np.ndarray: the sorted row numbers of the readouts
+        """
+        table = self.file.root.SlowSignal.readout
+        condvars = {} if condvars is None else condvars
+        if self.attrs.ss_data_version > 0:
+            return table.get_where_list(condition, condvars, sort=True)
+        # Version 0 files have unsigned 64-bit columns which PyTables
+        # does not support in conditions, so evaluate it in memory
+        columns = {
+            c: table.col(c).astype(np.int64)
+            if table.coldtypes[c] == np.uint64
+            else table.col(c)
+            for c in table.colnames
+            if c != "data" and re.search(r"\b%s\b" % c, condition)
+        }
+        columns.update(condvars)
+        return np.flatnonzero(numexpr.evaluate(condition, columns))
+
+    def _cast(self, field, value):
+        # avoids unsigned values (e.g. timestamps from old files) in conditions
+        if self.file.root.SlowSignal.readout.coldtypes[field].kind == "f":
+            return float(value)
+        return int(value)
+
+    def time_range(self, start=None, stop=None, field="time"):
+        """ Finds the readouts with `start <= field < stop`
+
+            Args:
+                start (optional): start of the range (open if None)
+                stop (optional): end of the range (open if None)
+                field (str, optional): the column: 'time' (TACK in ns), 'cpu_t' (unix time
+                                       in s) or 'iro'
 
-    def load_as_pd_table(self):
+            Returns:
+                np.ndarray: the sorted row numbers of the readouts
+        """
+        conditions, condvars = [], {}
+        if start is not None:
+            conditions.append("({} >= start)".format(field))
+            condvars["start"] = self._cast(field, start)
+        if stop is not None:
+            conditions.append("({} < stop)".format(field))
+            condvars["stop"] = self._cast(field, stop)
+        if len(conditions) == 0:
+            return np.arange(self.n_readouts)
+        return self.where(" & ".join(conditions), condvars)
+
+    def nearest(self, t, field="time"):
+        """ Finds the readout closest in time to `t`
+
+            Args:
+                t: the time
+                field (str, optional): the column: 'time' (TACK in ns), 'cpu_t' (unix time
+                                       in s) or 'iro'
+
+            Returns:
+                int: the row number of the readout
+        """
+        n = self.n_readouts
+        if n == 0:
+            raise IndexError("The file contains no readouts")
+        table = self.file.root.SlowSignal.readout
+        t = self._cast(field, t)
+        ind = None
+        if table.colinstances[field].is_indexed:
+            # search windows around `t` growing from the mean spacing of the readouts
+            first, last = table.read_coordinates([0, n - 1], field=field)
+            width = self._cast(field, abs(float(last) - float(first)) / n) or 1
+            for _ in range(16):
+                ind = self.time_range(t - width, t + width, field)
+                if len(ind) > 0:
+                    break
+                width *= 16
+        if ind is None or len(ind) == 0:
+            ind = np.arange(n)
+        values = table.read_coordinates(ind, field=field)
+        if values.dtype == np.uint64:
+            # unsigned columns of version 0 files
+            values = values.astype(np.int64)
+        return int(ind[np.argmin(np.abs(values - t))])
+
+    def pointing(self, cpu_t):
+        """ Looks up the telescope pointing at the given times from the telescope
+            data table, i.e. the last entry at or before each time
+
+            Args:
+                cpu_t (float or arraylike): unix times, e.g. the `cpu_t` of readouts
+
+            Returns:
+                namedtuple: arrays of ra, dec and the time of the telescope data (db_t)
+                            which are NaN where there is no preceding telescope data
+        """
+        cpu_t = np.asarray(cpu_t, dtype=np.float64)
+        ra, dec, db_t = [np.full(cpu_t.shape, np.nan) for _ in range(3)]
+        if "tel_table" in self.file.root.SlowSignal:
+            tel = self.file.root.SlowSignal.tel_table.read()
+            tel = tel[np.argsort(tel["db_t"], kind="stable")]
+            i = np.searchsorted(tel["db_t"], cpu_t, side="right") - 1
+            valid = i >= 0
+            ra[valid] = tel["ra"][i[valid]]
+            dec[valid] = tel["dec"][i[valid]]
+            db_t[valid] = tel["db_t"][i[valid]]
+        pointing = _nt("pointing", "ra dec db_t")
+        return pointing(ra, dec, db_t)
+
+    def load_time_range(
+        self, start=None, stop=None, field="time", tm=None, calib=None, mapping=None
+    ):
+        """ Loads the readouts in a time range (see `time_range`) together with the
+            telescope pointing at the readouts (see `pointing`)
+
+            Args:
+                start (optional): start of the range (open if None)
+                stop (optional): end of the range (open if None)
+                field (str, optional): the column: 'time' (TACK in ns), 'cpu_t' (unix time
+                                       in s) or 'iro'
+
+            Kwargs:
+                tm (int or arraylike): the slot number(s) of the target module(s) to load (default all)
+                calib (arraylike): calibration coefficients multiplied with the data
+                mapping (str or arraylike): a string to select a mapping  or an array with the mapping
+                                            ['ssl2colrow','ssl2asic_ch','raw'] (default the mapping
+                                            of the reader)
+
+            Returns:
+                namedtuple: iro, amps, time, cpu_t, tm, ra and dec of the readouts
+        """
+        iro, amps, time, cpu_t = self._load_columns(
+            self.time_range(start, stop, field), tm, calib, mapping
+        )
+        pointing = self.pointing(cpu_t)
+        ssdata = _nt("ssdata", "iro amps time cpu_t tm ra dec")
+        return ssdata(iro, amps, time, cpu_t, tm, pointing.ra, pointing.dec)
+
+    def load_as_pd_table(self, chunk_size=None):
+        """ Loads the data as a long format pandas DataFrame with one row per pixel
+            and readout indexed by (iro, pix) and columns time, cpu_t and amp. The
+            pixels are ordered by the mapping of the reader.
+
+            Kwargs:
+                chunk_size (int): if given an iterator over DataFrames of at most
+                                  `chunk_size` readouts each is returned instead so
+                                  that the whole file does not have to fit in memory
+
+            Returns:
+                pandas.DataFrame or iterator of pandas.DataFrame
+        """
         import pandas as pd
 
-        data = []
-        for r in self.read():
-            amps = r.flatten()  # self.data.flatten()
-            for i in range(2048):
-                data.append(
-                    {
-                        "iro": self.iro,
-                        "time": self.time,
-                        "cpu_t": self.cpu_t,
-                        "pix": i,
-                        "amp": amps[i],
-                    }
-                )
-        df = pd.DataFrame(data)
-        df.set_index(["iro", "pix"], inplace=True)  #
-        return df
+        if chunk_size is not None:
+            return self._iter_pd_table(chunk_size)
+        frames = list(self._iter_pd_table(4096))
+        if len(frames) == 0:
+            return self._pd_table(self.file.root.SlowSignal.readout.read(0, 0))
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+    def _iter_pd_table(self, chunk_size):
+        for rows in self._read_rows(slice(None), chunk_size):
+            yield self._pd_table(rows)
+
+    def _pd_table(self, rows):
+        import pandas as pd
+
+        n_pix = N_TM * N_TM_PIX
+        n = len(rows)
+        # int64 as in the DataFrames built from the python ints before
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.repeat(rows["iro"].astype(np.int64), n_pix),
+                np.tile(np.arange(n_pix, dtype=np.int64), n),
+            ],
+            names=["iro", "pix"],
+        )
+        return pd.DataFrame(
+            {
+                "time": np.repeat(rows["time"].astype(np.int64), n_pix),
+                "cpu_t": np.repeat(rows["cpu_t"], n_pix),
+                "amp": rows["data"][:, :, self.map].reshape(n * n_pix),
+            },
+            index=index,
+        )
 
     def __repr__(self):
         return repr(self.file)
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from ssdaq.data._dataimpl import slowsignal_format as dc
 from ssdaq.data import SSReadout
 from ssdaq.core.receiver_server import ReceiverServer
+from ssdaq.core.udp_batch import BatchedUDPReader, UDPPacketRing
 from .mon_sender import ReceiverMonSender
 from collections import defaultdict
 
@@ -13,6 +14,41 @@ READOUT_LENGTH = (
 )  # 64 2-byte channel amplitudes and 2 8-byte timestamps
 packet_format = struct.Struct(">Q32HQ32H")
 first_tack = struct.Struct(">Q")
+# A readout as it is laid out in the TM packet. Used to view all
+# readouts of a packet as one big-endian structured array
+readout_dtype = np.dtype(
+    [("tack0", ">u8"), ("adc0", ">u2", 32), ("tack1", ">u8"), ("adc1", ">u2", 32)]
+)
+
+
+def get_module_nr(ip, relaxed_ip_range, log):
+    """ Gets the module number from the last two digits of the ip
+
+    Args:
+        ip (str): source ip of the TM packet
+        relaxed_ip_range (bool): If true module numbers out of range are wrapped
+        log (logging.Logger): logger instance
+
+    Returns:
+        int: module number
+
+    Raises:
+        RuntimeError: if the module number is out of range and relaxed_ip_range is False
+    """
+    module_nr = int(ip[-ip[::-1].find(".") :]) % 100
+    # self.log.info("Got packet from module {}".format(module_nr))
+
+    if module_nr > dc.N_TM - 1 and relaxed_ip_range:
+        # ensure that the module number is in the allowed range
+        # (mostly important for local or standalone setups simulations)
+        module_nr = module_nr % dc.N_TM
+        # self.log.debug('Got data from ip %s which is outsie the allowed range'%ip)
+    elif module_nr > dc.N_TM - 1:
+        log.error("Error: got packets from ip out of range:")
+        log.error("   %s" % ip)
+        log.error("This can be supressed if relaxed_ip_range=True")
+        raise RuntimeError
+    return module_nr
 
 
 class SlowSignalDataProtocol(asyncio.Protocol):
@@ -32,25 +68,114 @@ class SlowSignalDataProtocol(asyncio.Protocol):
         self.mon.register_data_packet()
         if len(data) % (READOUT_LENGTH) != 0:
             self.log.warn("Got unsuported packet size, skipping packet")
-            self.log.info("Bad package came from %s:%d" % tuple(data[0]))
+            self.log.info("Bad package came from %s:%d" % tuple(addr))
             return
 
-        # getting the module number from the last two digits of the ip
-        ip = addr[0]
-        module_nr = int(ip[-ip[::-1].find(".") :]) % 100
-        # self.log.info("Got packet from module {}".format(module_nr))
+        module_nr = get_module_nr(addr[0], self.relaxed_ip_range, self.log)
+        self._buffer.put_nowait((module_nr, data, cpu_time))
+
+    def discard_buffered(self):
+        """ Discards all packets in the buffer
+
+        Returns:
+            int: number of discarded packets
+        """
+        n_packets = 0
+        while not self._buffer.empty():
+            self._buffer.get_nowait()
+            n_packets += 1
+        return n_packets
+
+    async def packets(self):
+        """ Iterates over received packets
+
+        Yields:
+            tuple: (module_nr, data, cpu_time)
+        """
+        while True:
+            yield await self._buffer.get()
+
+
+class SlowSignalBatchProtocol:
+    """ High-throughput alternative to the `SlowSignalDataProtocol`.
+
+        Datagrams are drained in batches from a non-blocking socket into a
+        preallocated ring buffer and the batches are handed to the assembler
+        with one queue operation per event loop wakeup. Packets with an
+        unsupported size or from a source ip out of range are logged and
+        counted in `rejected_packets`.
+    """
+
+    def __init__(
+        self,
+        sock,
+        loop,
+        log,
+        relaxed_ip_range,
+        mon,
+        ring_slots: int = 4096,
+        ring_slot_size: int = 2048,
+        batch_size: int = 256,
+    ):
+        self._buffer = asyncio.Queue()
+        self.loop = loop
+        self.log = log.getChild("SlowSignalBatchProtocol")
+        self.relaxed_ip_range = relaxed_ip_range
+        self.mon = mon
+        self.rejected_packets = 0
+        self.reader = BatchedUDPReader(
+            sock,
+            loop,
+            lambda *batch: self._buffer.put_nowait(batch),
+            ring=UDPPacketRing(ring_slots, ring_slot_size),
+            batch_size=batch_size,
+        )
+        self.reader.start()
+
+    @property
+    def dropped_packets(self):
+        return self.reader.dropped_packets
 
-        if module_nr > dc.N_TM - 1 and self.relaxed_ip_range:
-            # ensure that the module number is in the allowed range
-            # (mostly important for local or standalone setups simulations)
-            module_nr = module_nr % dc.N_TM
-            # self.log.debug('Got data from ip %s which is outsie the allowed range'%ip)
-        elif module_nr > dc.N_TM - 1:
-            self.log.error("Error: got packets from ip out of range:")
-            self.log.error("   %s" % ip)
-            self.log.error("This can be supressed if relaxed_ip_range=True")
-            raise RuntimeError
-        self.loop.create_task(self._buffer.put((module_nr, data, cpu_time)))
+    def discard_buffered(self):
+        """ Discards all packets in the buffer
+
+        Returns:
+            int: number of discarded packets
+        """
+        n_packets = 0
+        while not self._buffer.empty():
+            _, n, _ = self._buffer.get_nowait()
+            self.reader.release(n)
+            n_packets += n
+        return n_packets
+
+    async def packets(self):
+        """ Iterates over received packets
+
+        Yields:
+            tuple: (module_nr, data, cpu_time)
+        """
+        ring = self.reader.ring
+        while True:
+            start, n, cpu_time = await self._buffer.get()
+            for i in range(start, start + n):
+                self.mon.register_data_packet()
+                data, addr = ring.get(i)
+                if len(data) % (READOUT_LENGTH) != 0:
+                    self.log.warn("Got unsuported packet size, skipping packet")
+                    self.log.info("Bad package came from %s:%d" % tuple(addr))
+                    self.rejected_packets += 1
+                    continue
+                try:
+                    module_nr = get_module_nr(addr[0], self.relaxed_ip_range, self.log)
+                except RuntimeError:
+                    # logged by get_module_nr
+                    self.rejected_packets += 1
+                    continue
+                # The packet is copied out of the ring since it is kept
+                # in the readout buffer until the readout is assembled
+                yield module_nr, data.tobytes(), cpu_time
+            self.reader.release(n)
 
 
 class MatchedPacket:
@@ -88,6 +213,13 @@ class ReadoutAssembler(ReceiverServer):
         buffer_time: float = 10 * 1e9,
         publishers: list = None,
         packet_debug_stream_file: str = None,
+        batch_receive: bool = False,
+        ring_slots: int = 4096,
+        recv_batch_size: int = 256,
+        rcvbuf_size: int = None,
+        decode_workers: int = 0,
+        worker_core_ids: list = None,
+        wire_format: str = "float64",
     ):
         """Summary
 
@@ -99,25 +231,55 @@ class ReadoutAssembler(ReceiverServer):
             buffer_length (int, optional): Description
             buffer_time (float, optional): Description
             publishers (list, optional): Description
-            packet_debug_stream_file (str, optional): Description
+            packet_debug_stream_file (str, optional): Description (not supported with batch_receive)
+            batch_receive (bool, optional): Use the high-throughput receive mode which drains
+                                            the socket in batches into a preallocated ring buffer
+            ring_slots (int, optional): Number of packet slots in the ring buffer (batch_receive only)
+            recv_batch_size (int, optional): Max number of packets read per wakeup (batch_receive only)
+            rcvbuf_size (int, optional): Size of the kernel socket receive buffer in bytes (batch_receive only)
+            decode_workers (int, optional): If larger than zero readouts are decoded and packed by this
+                                            number of worker processes
+            worker_core_ids (list, optional): CPU cores to pin the decode workers to
+            wire_format (str, optional): Encoding of the published readouts, 'float64' (default)
+                                         or the compact 'float32' or 'uint16' (ADC counts) formats
         """
         super().__init__(listen_ip, listen_port, publishers, "ReadoutAssembler")
         self.relaxed_ip_range = relaxed_ip_range
-        self.transport, self.ss_data_protocol = self.setup_udp(
-            lambda: SlowSignalDataProtocol(
+        mon = ReceiverMonSender("ReadoutAssembler", self.loop, self._context)
+        if batch_receive:
+            if packet_debug_stream_file is not None:
+                raise ValueError(
+                    "packet_debug_stream_file is not supported with batch_receive"
+                )
+            self.transport = self.setup_udp_socket(rcvbuf_size)
+            self.ss_data_protocol = SlowSignalBatchProtocol(
+                self.transport,
                 self.loop,
                 self.log,
                 self.relaxed_ip_range,
-                ReceiverMonSender("ReadoutAssembler", self.loop, self._context),
-                packet_debug_stream_file=packet_debug_stream_file,
+                mon,
+                ring_slots=ring_slots,
+                batch_size=recv_batch_size,
+            )
+        else:
+            self.transport, self.ss_data_protocol = self.setup_udp(
+                lambda: SlowSignalDataProtocol(
+                    self.loop,
+                    self.log,
+                    self.relaxed_ip_range,
+                    mon,
+                    packet_debug_stream_file=packet_debug_stream_file,
+                )
             )
-        )
 
         # settings
         self.readout_tw = int(readout_tw)
         self.listen_addr = (listen_ip, listen_port)
         self.buffer_len = buffer_length
         self.buffer_time = buffer_time
+        if wire_format != "float64" and wire_format not in dc.compact_encodings:
+            raise ValueError("Unknown readout wire format `{}`".format(wire_format))
+        self.wire_format = wire_format
 
         # counters
         self.nprocessed_packets = 0
@@ -129,9 +291,25 @@ class ReadoutAssembler(ReceiverServer):
         # controlers
         self.publish_readouts = True
 
+        # decoding in worker processes
+        self.decoder_pool = None
+        if decode_workers > 0:
+            from .readout_workers import ReadoutDecoderPool
+
+            self.decoder_pool = ReadoutDecoderPool(
+                self.loop,
+                decode_workers,
+                core_ids=worker_core_ids,
+                wire_format=wire_format,
+                log=self.log.getChild("DecoderPool"),
+            )
+
         # buffers
         self.inter_buff = []
-        self.partial_ro_buff = asyncio.queues.collections.deque(maxlen=self.buffer_len)
+        # partial readouts ordered by TACK and an index of the same
+        # readouts keyed by their TACK bucket (tack // readout_tw)
+        self.partial_ro_buff = asyncio.queues.collections.deque()
+        self.partial_ro_index = {}
         self.ro_part_buff = asyncio.queues.collections.deque(maxlen=self.buffer_len)
 
     def cmd_reset_ro_count(self, arg):
@@ -139,6 +317,17 @@ class ReadoutAssembler(ReceiverServer):
         self.readout_count = 1
         return b"Readout count reset"
 
+    def cmd_get_dropped_packets(self, arg):
+        if not hasattr(self.ss_data_protocol, "dropped_packets"):
+            return b"Dropped packet counting requires batch_receive"
+        return (
+            "Kernel dropped packets: %s, rejected packets: %d"
+            % (
+                self.ss_data_protocol.dropped_packets,
+                self.ss_data_protocol.rejected_packets,
+            )
+        ).encode("ascii")
+
     def cmd_set_publish_readouts(self, arg):
         if arg[0] == "false" or arg[0] == "False":
             self.publish_readouts = False
@@ -158,81 +347,129 @@ class ReadoutAssembler(ReceiverServer):
             ).encode("ascii")
 
     async def ct_assembler(self):
-        n_packets = 0
         self.log.info("Empty socket buffer before starting readout building")
-        # _ = await self.ss_data_protocol._buffer.get()
-        got_packet = True
-        while got_packet:
-            got_packet = False
-            self.log.info("Thrown away %d packets in buffer before start" % n_packets)
-            try:
-                while True:
-                    await asyncio.wait_for(
-                        self.ss_data_protocol._buffer.get(), timeout=0
-                    )
-                    n_packets += 1
-                    got_packet = True
-            except:
-                pass
+        n_packets = self.ss_data_protocol.discard_buffered()
         self.log.info("Thrown away %d packets in buffer before start" % n_packets)
         self.log.info("Fetching first packet")
 
-        module, data, cpu_time = await self.ss_data_protocol._buffer.get()
+        packets = self.ss_data_protocol.packets()
+        module, data, cpu_time = await packets.__anext__()
         tack = first_tack.unpack_from(data, 0)[0]
         nreadouts = int(len(data) / (READOUT_LENGTH))
 
-        self.partial_ro_buff.append(
-            MatchedPacket(module, data, tack, cpu_time, nreadouts)
-        )
+        self.add_partial_readout(MatchedPacket(module, data, tack, cpu_time, nreadouts))
         self.log.info("Starting readout build loop")
-        while True:
-            module, data, cpu_time = await self.ss_data_protocol._buffer.get()
+        async for module, data, cpu_time in packets:
             tack = first_tack.unpack_from(data, 0)[0]
             nreadouts = int(len(data) / (READOUT_LENGTH))
             # self.log.debug('Got packet from front buffer with timestamp %f and tm id %d'%(packet[1]*1e-9,packet[0]))
-            pro = self.partial_ro_buff[-1]
-            dt = pro.tack - tack
-            if abs(dt) < self.readout_tw:
-                self.partial_ro_buff[-1].add_part(module, data, cpu_time)
-            elif dt < 0:
-                self.partial_ro_buff.append(
+            pro = self.find_partial_readout(tack)
+            if pro is not None:
+                pro.add_part(module, data, cpu_time)
+            elif tack > self.partial_ro_buff[-1].tack:
+                self.add_partial_readout(
                     MatchedPacket(module, data, tack, cpu_time, nreadouts)
                 )
             else:
-                found = False
-                for i in range(len(self.partial_ro_buff) - 1, 0, -1):
-                    pro = self.partial_ro_buff[i]
-                    dt = pro.timestamp - tack
-                    if abs(dt) < self.readout_tw:
-                        self.partial_ro_buff[-1].add_part(module, data, cpu_time)
-                        found = True
-                        break
-                if not found:
-                    self.log.warning(
-                        "No matching packets found for packet with timestamp %d and tm id %d"
-                        % (tack, module)
-                    )
-            assembling = True
-            while assembling:
-                if abs(
-                    float(self.partial_ro_buff[-1].tack)
-                    - float(self.partial_ro_buff[0].tack)
-                ) > (self.buffer_time):
-                    readouts = self.assemble_readouts(self.partial_ro_buff.popleft())
-                    for readout in readouts:
-                        await self.publish(readout.pack())
-                else:
-                    assembling = False
+                self.log.warning(
+                    "No matching packets found for packet with timestamp %d and tm id %d"
+                    % (tack, module)
+                )
+
+            for matched in self.expire_partial_readouts():
+                if self.decoder_pool is not None:
+                    await self.dispatch_readouts(matched)
+                    continue
+                readouts = self.assemble_readouts(matched)
+                for readout in readouts:
+                    # not copied as the readout is dropped after publishing
+                    await self.publish(readout.pack(self.wire_format, copy=False))
             # self.log.info("Buffer length {}".format(len(self.partial_ro_buff)))
 
+    async def ct_sequencer(self):
+        """ Publishes the readouts decoded by the worker processes
+            in readout number order
+        """
+        if self.decoder_pool is None:
+            return
+        async for packed in self.decoder_pool.readouts():
+            await self.publish(packed)
+
+    async def dispatch_readouts(self, matched):
+        """ Reserves readout numbers for a matched packet and hands it
+            to the decoder pool
+
+        Args:
+            matched (MatchedPacket): The matched TM packets
+        """
+        try:
+            await self.decoder_pool.dispatch(matched, self.readout_count)
+        except ValueError as e:
+            self.log.error("Dropping readouts with TACK {}: {}".format(matched.tack, e))
+            return
+        for tm in matched.tms:
+            self.readout_counter[tm] += matched.nreadouts
+        self.nconstructed_readouts += matched.nreadouts
+        self.readout_count += matched.nreadouts
+
+    def add_partial_readout(self, matched):
+        """ Appends a new partial readout to the buffer and the TACK index.
+            New readouts are only created for packets that are later than
+            the last readout in the buffer and that do not match any readout.
+            Readouts in the buffer are therefore at least `readout_tw` apart
+            and at most one readout falls into each bucket.
+
+        Args:
+            matched (MatchedPacket): the new partial readout
+        """
+        self.partial_ro_buff.append(matched)
+        self.partial_ro_index[matched.tack // self.readout_tw] = matched
+
+    def find_partial_readout(self, tack):
+        """ Looks up the partial readout matching a TACK. A readout matching
+            within `readout_tw` must lie in the bucket of the TACK or in one
+            of its neighbours.
+
+        Args:
+            tack (int): the TACK of the packet to be matched
+
+        Returns:
+            MatchedPacket or None: the closest matching readout or None if no match
+        """
+        bucket = tack // self.readout_tw
+        match = None
+        for b in (bucket, bucket - 1, bucket + 1):
+            pro = self.partial_ro_index.get(b)
+            if pro is not None and abs(pro.tack - tack) < self.readout_tw:
+                if match is None or abs(pro.tack - tack) < abs(match.tack - tack):
+                    match = pro
+        return match
+
+    def expire_partial_readouts(self):
+        """ Removes readouts from the buffer that are older than `buffer_time`
+            relative to the newest readout, or that exceed the buffer length.
+
+        Yields:
+            MatchedPacket: expired readouts in TACK order
+        """
+        buff = self.partial_ro_buff
+        while len(buff) > self.buffer_len or (
+            buff[-1].tack - buff[0].tack > self.buffer_time
+        ):
+            matched = buff.popleft()
+            del self.partial_ro_index[matched.tack // self.readout_tw]
+            yield matched
+
     def assemble_readouts(self, matched):
-        """Summary
+        """ Assembles the readouts of a matched packet. All readouts
+            of all TMs are decoded in one go by viewing the packets
+            as structured arrays.
 
         Args:
-            matched (TYPE): Description
+            matched (MatchedPacket): The matched TM packets
 
         Returns:
-            TYPE: Description
+            list: A list of SSReadouts
 
         """
         # construct readout
@@ -240,37 +477,29 @@ class ReadoutAssembler(ReceiverServer):
         readouts = []
         tms = sorted(matched.tms)
         tack0 = matched.tack
-        dts = []
-
-        for i in range(matched.nreadouts):
-
-            tack = first_tack.unpack_from(matched.data[tms[0]], i * (READOUT_LENGTH))[0]
+        for tm in tms:
+            self.readout_counter[tm] += matched.nreadouts
+
+        # The readouts are decoded directly into one buffer in the packed
+        # readout layout which the SSReadouts then wrap without copying
+        buffer = memoryview(bytearray(matched.nreadouts * dc.N_BYTES_READOUT))
+        _, tacks = decode_readouts(
+            [(tm, matched.data[tm]) for tm in tms],
+            matched.nreadouts,
+            out=dc.readout_block(buffer, matched.nreadouts),
+        )
+        for i, tack in enumerate(tacks):
             dt = tack - tack0
-            dts.append(dt)
             if i > 0 and dt == 0:
                 self.log.warn(
                     "Subsequent readouts with the same tack {}, {}".format(tack, i)
                 )
-            r_cpu_time = r_cpu_time_0 + timedelta(microseconds=dt * 1e-3)
-            cpu_time_s = int(r_cpu_time.timestamp())
-            cpu_time_ns = int((r_cpu_time.timestamp() - cpu_time_s) * 1e9)
-            readout = SSReadout(tack, self.readout_count, cpu_time_s, cpu_time_ns)
-
-            for tm in tms:
-                tmp_data = packet_format.unpack_from(
-                    matched.data[tm], i * (READOUT_LENGTH)
-                )
-                self.readout_counter[tm] += 1
-                # put data into a temporary array of uint type
-                tmp_array = np.empty(dc.N_TM_PIX, dtype=np.uint64)
-                tmp_array[: dc.N_TM] = tmp_data[1 : dc.N_TM + 1]
-                tmp_array[dc.N_TM :] = tmp_data[dc.N_TM + 2 :]
-
-                # converting counts to mV
-                m = tmp_array < 0x8000
-                tmp_array[m] += 0x8000
-                tmp_array[~m] = tmp_array[~m] & 0x7FFF
-                readout.data[tm] = tmp_array * 0.03815 * 2.0
+            readout = SSReadout.wrap_buffer(
+                buffer[i * dc.N_BYTES_READOUT : (i + 1) * dc.N_BYTES_READOUT]
+            )
+            readout.time = tack
+            readout.iro = self.readout_count
+            readout.cpu_t_s, readout.cpu_t_ns = readout_cpu_time(r_cpu_time_0, dt)
 
             self.nconstructed_readouts += 1
             self.readout_count += 1
@@ -278,6 +507,55 @@ class ReadoutAssembler(ReceiverServer):
         return readouts
 
 
+def decode_readouts(tm_data, nreadouts, out=None):
+    """ Decodes the readouts in the packets of several TMs. All readouts
+        of all TMs are viewed as structured arrays and converted to mV in
+        one step.
+
+    Args:
+        tm_data (list): list of (module number, packet buffer) tuples
+        nreadouts (int): number of readouts in each packet
+        out (np.ndarray, optional): array of shape (nreadouts, N_TM, N_TM_PIX) to write to
+
+    Returns:
+        tuple: (np.ndarray of shape (nreadouts, N_TM, N_TM_PIX), list of readout TACKs)
+    """
+    tms = [tm for tm, _ in tm_data]
+    raw = np.empty((len(tms), nreadouts), dtype=readout_dtype)
+    for i, (_, data) in enumerate(tm_data):
+        raw[i] = np.frombuffer(data, dtype=readout_dtype, count=nreadouts)
+
+    # converting counts to mV (flipping the top bit maps
+    # c < 0x8000 to c + 0x8000 and c >= 0x8000 to c & 0x7FFF)
+    counts = np.concatenate((raw["adc0"], raw["adc1"]), axis=2) ^ 0x8000
+    amps = counts.swapaxes(0, 1) * 0.03815
+    amps *= 2.0
+    if out is None:
+        block = np.empty((nreadouts, dc.N_TM, dc.N_TM_PIX), dtype=np.float64)
+    else:
+        block = out
+    block[:] = np.nan
+    block[:, tms] = amps
+    return block, raw["tack0"][0].astype(np.uint64).tolist()
+
+
+def readout_cpu_time(r_cpu_time_0, dt):
+    """ Computes the cpu timestamp of a readout from the cpu time of the
+        packet and the TACK difference to the first readout in the packet
+
+    Args:
+        r_cpu_time_0 (datetime): cpu time of the first readout
+        dt (int): TACK difference in ns
+
+    Returns:
+        tuple: (seconds, nano seconds)
+    """
+    r_cpu_time = r_cpu_time_0 + timedelta(microseconds=dt * 1e-3)
+    cpu_time_s = int(r_cpu_time.timestamp())
+    cpu_time_ns = int((r_cpu_time.timestamp() - cpu_time_s) * 1e9)
+    return cpu_time_s, cpu_time_ns
+
+
 if __name__ == "__main__":
     from ssdaq import sslogger
     import logging
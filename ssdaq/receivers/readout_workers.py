@@ -0,0 +1,346 @@
+""" Multi-process decoding of slow signal readouts.
+
+    The ``ReadoutDecoderPool`` offloads the decoding and packing of matched
+    TM packets from the receiver process to a number of worker processes.
+    The raw packets and the packed readouts are exchanged through a shared
+    memory segment divided into slots, so that only small task descriptors
+    pass through the multiprocessing queues. Results are put back in
+    dispatch order by a sequencer before they are published.
+
+    A task that fails in a worker, or that is lost because its worker died
+    or got stuck, is reported back as an error so that the sequencer skips
+    it and its slot is reused instead of stalling the pool.
+"""
+import asyncio
+import atexit
+import os
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from threading import Thread
+from ssdaq import sslogger
+from ssdaq.data._dataimpl import slowsignal_format as dc
+from .readout_assembler import READOUT_LENGTH, decode_readouts, readout_cpu_time
+
+
+class _SlotLayout:
+    """ Layout of a shared memory slot. Each slot holds one packet per TM
+        followed by the packed readouts produced from them.
+    """
+
+    def __init__(self, packet_size: int):
+        self.packet_size = packet_size
+        self.max_readouts = packet_size // READOUT_LENGTH
+        self.input_size = dc.N_TM * packet_size
+        self.stride = self.input_size + self.max_readouts * dc.N_BYTES_READOUT
+
+    def packet_offset(self, slot: int, tm: int) -> int:
+        return slot * self.stride + tm * self.packet_size
+
+    def readout_offset(self, slot: int, i: int) -> int:
+        return slot * self.stride + self.input_size + i * dc.N_BYTES_READOUT
+
+
+def _decode_task(buf, layout, wire_format, task):
+    """ Decodes and packs the readouts of a task in its slot
+
+    Returns:
+        list: the sizes of the packed readouts
+    """
+    _, slot, tm_sizes, nreadouts, tack0, r_cpu_time_0, first_iro = task
+    tm_data = []
+    for tm, size in tm_sizes:
+        offset = layout.packet_offset(slot, tm)
+        tm_data.append((tm, buf[offset : offset + size]))
+
+    # decoding straight into the output region of the slot
+    # in the packed readout layout
+    out = dc.readout_block(buf[layout.readout_offset(slot, 0) :], nreadouts)
+    tacks = decode_readouts(tm_data, nreadouts, out=out)[1]
+    for i, tack in enumerate(tacks):
+        cpu_time_s, cpu_time_ns = readout_cpu_time(r_cpu_time_0, tack - tack0)
+        dc.readout_header.pack_into(
+            buf,
+            layout.readout_offset(slot, i),
+            first_iro + i,
+            tack,
+            cpu_time_s,
+            cpu_time_ns,
+        )
+    if wire_format == "float64":
+        return [dc.N_BYTES_READOUT] * len(tacks)
+
+    # the compact formats are smaller than the packed readout and
+    # are written over it once packed
+    sizes = []
+    for i in range(len(tacks)):
+        offset = layout.readout_offset(slot, i)
+        readout = dc.SSReadout.from_bytes(buf[offset : offset + dc.N_BYTES_READOUT])
+        packed = readout.pack(wire_format)
+        del readout
+        buf[offset : offset + len(packed)] = packed
+        sizes.append(len(packed))
+    return sizes
+
+
+def _decode_worker(shm_name, layout, wire_format, task_queue, result_queue, core_id):
+    """ Main function of the decode worker processes
+    """
+    if core_id is not None:
+        # forces the process to one particular CPU core
+        os.sched_setaffinity(0, {core_id})
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buf = shm.buf
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        try:
+            result = (task[0], _decode_task(buf, layout, wire_format, task), None)
+        except Exception as e:
+            result = (task[0], [], "{}: {}".format(type(e).__name__, e))
+        result_queue.put(result)
+    del buf
+    shm.close()
+
+
+class ReadoutDecoderPool:
+    """ A pool of worker processes that decode and pack slow signal readouts.
+
+        Matched packets are copied into a free shared memory slot by ``dispatch``
+        and decoded by the least busy worker. The packed readouts are yielded
+        by ``readouts`` in the order the matched packets were dispatched.
+
+        Each worker has its own task queue, so that the tasks of a worker that
+        died can be told apart. Such tasks, and tasks without a result after
+        ``result_timeout`` (the worker is then terminated), are skipped and the
+        worker is restarted.
+    """
+
+    def __init__(
+        self,
+        loop,
+        nworkers: int,
+        nslots: int = 64,
+        packet_size: int = 2048,
+        core_ids: list = None,
+        wire_format: str = "float64",
+        result_timeout: float = 10.0,
+        check_interval: float = 1.0,
+        log=None,
+    ):
+        """
+        Args:
+            loop (asyncio.loop): the event loop of the receiver
+            nworkers (int): number of decode worker processes
+            nslots (int, optional): number of shared memory slots (max in-flight matched packets)
+            packet_size (int, optional): max size in bytes of a TM packet
+            core_ids (list, optional): CPU cores to pin the workers to (cycled through)
+            wire_format (str, optional): encoding the readouts are packed in (see `SSReadout.pack`)
+            result_timeout (float, optional): seconds after which a task without a result is dropped
+            check_interval (float, optional): seconds between checks that the workers are alive
+            log (logging.Logger, optional): logger of the pool
+        """
+        self.loop = loop
+        self.layout = _SlotLayout(packet_size)
+        self.wire_format = wire_format
+        self.result_timeout = result_timeout
+        self.check_interval = check_interval
+        self.log = log or sslogger.getChild("ReadoutDecoderPool")
+        self.nfailed = 0
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=nslots * self.layout.stride
+        )
+        # The workers are spawned as the receiver process holds
+        # zmq sockets and an event loop that should not be forked
+        self._ctx = mp.get_context("spawn")
+        self._core_ids = core_ids
+        self._result_queue = self._ctx.Queue()
+        self._free_slots = asyncio.Queue()
+        for slot in range(nslots):
+            self._free_slots.put_nowait(slot)
+        self._results = asyncio.Queue()
+        # in-flight tasks (seq: (slot, worker, dispatch time)) and
+        # finished tasks waiting for their turn (seq: (slot, sizes, error))
+        self._inflight = {}
+        self._completed = {}
+        self._seq = 0
+        self._next_seq = 0
+        self._last_check = time.monotonic()
+
+        self._workers = [None] * nworkers
+        self._task_queues = [None] * nworkers
+        self._worker_load = [0] * nworkers
+        for i in range(nworkers):
+            self._start_worker(i)
+
+        self._result_thread = Thread(target=self._collect_results, daemon=True)
+        self._result_thread.start()
+        atexit.register(self.close)
+
+    def _start_worker(self, i: int):
+        core_id = self._core_ids[i % len(self._core_ids)] if self._core_ids else None
+        task_queue = self._ctx.Queue()
+        worker = self._ctx.Process(
+            target=_decode_worker,
+            args=(
+                self._shm.name,
+                self.layout,
+                self.wire_format,
+                task_queue,
+                self._result_queue,
+                core_id,
+            ),
+            daemon=True,
+        )
+        worker.start()
+        self._workers[i] = worker
+        self._task_queues[i] = task_queue
+        self._worker_load[i] = 0
+
+    def _collect_results(self):
+        while True:
+            result = self._result_queue.get()
+            if result is None:
+                break
+            self.loop.call_soon_threadsafe(self._results.put_nowait, result)
+
+    def _check_workers(self):
+        """ Terminates workers with timed out tasks and restarts dead workers.
+            The tasks of the dead workers are marked as failed.
+        """
+        now = time.monotonic()
+        for seq, (slot, worker, t) in list(self._inflight.items()):
+            if now - t > self.result_timeout and self._workers[worker].is_alive():
+                self.log.error(
+                    "Decode worker {} timed out on readouts {}, terminating it".format(
+                        worker, seq
+                    )
+                )
+                self._workers[worker].terminate()
+                self._workers[worker].join(timeout=1)
+        for i, worker in enumerate(self._workers):
+            if worker.is_alive():
+                continue
+            self.log.error(
+                "Decode worker {} died (exit code {}), restarting it".format(
+                    i, worker.exitcode
+                )
+            )
+            for seq, (slot, w, _) in list(self._inflight.items()):
+                if w == i:
+                    del self._inflight[seq]
+                    self._completed[seq] = (slot, [], "decode worker died")
+            self._task_queues[i].close()
+            self._start_worker(i)
+
+    @property
+    def max_readouts(self) -> int:
+        """ Max number of readouts per TM packet that fit in a slot
+        """
+        return self.layout.max_readouts
+
+    async def dispatch(self, matched, first_iro: int):
+        """**(Coroutine)** Copies a matched packet to a free slot and queues it for decoding.
+            Waits for a free slot if all slots are in flight.
+
+        Args:
+            matched (MatchedPacket): The matched TM packets
+            first_iro (int): readout number of the first readout in the packet
+
+        Raises:
+            ValueError: if the packets do not fit in a slot
+        """
+        if matched.nreadouts > self.max_readouts:
+            raise ValueError(
+                "Packets with {} readouts do not fit in a slot of {} readouts".format(
+                    matched.nreadouts, self.max_readouts
+                )
+            )
+        for tm in matched.tms:
+            if len(matched.data[tm]) > self.layout.packet_size:
+                raise ValueError(
+                    "Packet of {} bytes from TM {} does not fit in a slot of {} bytes".format(
+                        len(matched.data[tm]), tm, self.layout.packet_size
+                    )
+                )
+        slot = await self._free_slots.get()
+        buf = self._shm.buf
+        tm_sizes = []
+        for tm in sorted(matched.tms):
+            data = matched.data[tm]
+            offset = self.layout.packet_offset(slot, tm)
+            buf[offset : offset + len(data)] = data
+            tm_sizes.append((tm, len(data)))
+        worker = self._worker_load.index(min(self._worker_load))
+        self._worker_load[worker] += 1
+        self._inflight[self._seq] = (slot, worker, time.monotonic())
+        self._task_queues[worker].put(
+            (
+                self._seq,
+                slot,
+                tm_sizes,
+                matched.nreadouts,
+                matched.tack,
+                min(matched.cpu_t),
+                first_iro,
+            )
+        )
+        self._seq += 1
+
+    async def readouts(self):
+        """ Iterates over packed readouts in dispatch order.
+
+            The readouts are copied out of shared memory so that the slot
+            can be reused while the readout is published. Failed tasks are
+            logged and skipped.
+
+        Yields:
+            bytes: a packed readout
+        """
+        while True:
+            try:
+                seq, sizes, error = await asyncio.wait_for(
+                    self._results.get(), self.check_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            else:
+                # results of tasks that have been given up on are ignored
+                if seq in self._inflight:
+                    slot, worker, _ = self._inflight.pop(seq)
+                    self._worker_load[worker] -= 1
+                    self._completed[seq] = (slot, sizes, error)
+            if time.monotonic() - self._last_check > self.check_interval:
+                self._check_workers()
+                self._last_check = time.monotonic()
+
+            while self._next_seq in self._completed:
+                slot, sizes, error = self._completed.pop(self._next_seq)
+                if error is not None:
+                    self.nfailed += 1
+                    self.log.error(
+                        "Dropping readouts of task {}: {}".format(self._next_seq, error)
+                    )
+                for i, size in enumerate(sizes):
+                    offset = self.layout.readout_offset(slot, i)
+                    yield self._shm.buf[offset : offset + size].tobytes()
+                self._free_slots.put_nowait(slot)
+                self._next_seq += 1
+
+    def close(self):
+        """ Stops the workers and frees the shared memory
+        """
+        if self._shm is None:
+            return
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        self._result_queue.put(None)
+        self._result_thread.join(timeout=1)
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
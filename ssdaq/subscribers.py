@@ -33,7 +33,9 @@ class SSReadoutSubscriber(BasicSubscriber):
             port (int): The port on which the data is published
             logger (logging.Logger, optional): A logger instance
         """
-        super().__init__(ip=ip, port=port, logger=logger, unpack=SSReadout.from_bytes)
+        super().__init__(
+            ip=ip, port=port, logger=logger, unpack=SSReadout.from_bytes, copy=False
+        )
 
 
 class AsyncSSReadoutSubscriber(AsyncSubscriber):
@@ -47,6 +49,7 @@ class AsyncSSReadoutSubscriber(AsyncSubscriber):
             unpack=SSReadout.from_bytes,
             loop=loop,
             name=name,
+            copy=False,
         )
 
 
@@ -205,6 +208,9 @@ class ATimestampWriter(AsyncWriterSubscriber):
         file_enumerator: str = None,
         filesize_lim: int = None,
         loop=None,
+        write_thread: bool = True,
+        queue_size: int = 10000,
+        overflow: str = "block",
         name="ATimestampWriter",
     ):
         super().__init__(
@@ -243,6 +249,7 @@ class SSFileWriter(WriterSubscriber):
         folder: str = "",
         file_enumerator: str = None,
         filesize_lim: int = None,
+        writer_kwargs: dict = None,
     ):
         super().__init__(
             subscriber=SSReadoutSubscriber,
@@ -266,6 +273,9 @@ class ATriggerWriter(AsyncWriterSubscriber):
         file_enumerator: str = None,
         filesize_lim: int = None,
         loop=None,
+        write_thread: bool = True,
+        queue_size: int = 10000,
+        overflow: str = "block",
         name="ATriggerWriter",
     ):
         super().__init__(
@@ -291,7 +301,11 @@ class ASlowSignalWriter(AsyncWriterSubscriber):
         folder: str = "",
         file_enumerator: str = None,
         filesize_lim: int = None,
+        writer_kwargs: dict = None,
         loop=None,
+        write_thread: bool = True,
+        queue_size: int = 10000,
+        overflow: str = "block",
         name="ASlowSignalWriter",
     ):
         super().__init__(
@@ -306,14 +320,18 @@ class ASlowSignalWriter(AsyncWriterSubscriber):
             port=9006,
             unpack=teldataunpack,
             logger=self.log,
-            zmqcontext=self._subscriber.context,
-            loop=self.loop,
+            zmqcontext=self._subscriber._context,
+            loop=self._loop,
             passoff_callback=self.write_tel_data,
             name="telsub",
         )
         self.log = sslogger.getChild(name)
 
     def write_tel_data(self, data):
+        # written by the I/O thread as the writer must not be used concurrently
+        self.submit_soon(self._write_tel_data, data)
+
+    def _write_tel_data(self, data):
         self._writer.write_tel_data(
             ra=data.ra,
             dec=data.dec,
@@ -331,6 +349,6 @@ class ASlowSignalWriter(AsyncWriterSubscriber):
                              will be immediately closed. Any data still
                              in the subscriber buffer will be lost.
         """
-        await super().close(hard)
         self.log.info("Stopping TelData subscriber")
         await self._teldatasub.close(hard=False)
+        await super().close(hard)
@@ -74,5 +74,236 @@ import time
 
 #         sslogger.setLevel(logging.ERROR)
 
+import pytest
+import struct
+import datetime
+import numpy as np
+from unittest.mock import Mock
+from collections import defaultdict, deque
+from ssdaq.receivers.readout_assembler import (
+    ReadoutAssembler,
+    MatchedPacket,
+    READOUT_LENGTH,
+    packet_format,
+)
+from ssdaq.data import SSReadout
+
+
+def make_tm_packet(tack, nreadouts=10):
+    data_packet = bytearray()
+    for i in range(nreadouts):
+        data_packet.extend(
+            struct.pack(
+                ">Q32HQ32H",
+                tack + int(i * 1e8),
+                *np.random.randint(0, 0x10000, 32),
+                tack + int(i * 1e8),
+                *np.random.randint(0, 0x10000, 32)
+            )
+        )
+    return bytes(data_packet)
+
+
+@pytest.fixture
+def mock_assembler():
+    mock_ra = Mock(ReadoutAssembler)
+    mock_ra.readout_count = 1
+    mock_ra.nconstructed_readouts = 0
+    mock_ra.readout_counter = defaultdict(lambda: 1)
+    mock_ra.assemble_readouts = ReadoutAssembler.assemble_readouts.__get__(mock_ra)
+    mock_ra.readout_tw = int(5.1e7)
+    mock_ra.buffer_len = 1000
+    mock_ra.buffer_time = 1e9
+    mock_ra.partial_ro_buff = deque()
+    mock_ra.partial_ro_index = {}
+    for method in [
+        "add_partial_readout",
+        "find_partial_readout",
+        "expire_partial_readouts",
+    ]:
+        setattr(mock_ra, method, getattr(ReadoutAssembler, method).__get__(mock_ra))
+    return mock_ra
+
+
+def reference_readout_data(matched, i):
+    """ The per readout and per TM decoding that the vectorized
+        path must reproduce exactly
+    """
+    data = np.full((32, 64), np.nan)
+    for tm in matched.tms:
+        tmp_data = packet_format.unpack_from(matched.data[tm], i * READOUT_LENGTH)
+        tmp_array = np.empty(64, dtype=np.uint64)
+        tmp_array[:32] = tmp_data[1:33]
+        tmp_array[32:] = tmp_data[34:]
+        m = tmp_array < 0x8000
+        tmp_array[m] += 0x8000
+        tmp_array[~m] = tmp_array[~m] & 0x7FFF
+        data[tm] = tmp_array * 0.03815 * 2.0
+    return data
+
+
+def test_assemble_readouts(mock_assembler):
+    cpu_t = datetime.datetime.utcnow()
+    tack = 1000000
+    matched = MatchedPacket(5, make_tm_packet(tack), tack, cpu_t, 10)
+    for tm in [0, 31, 12]:
+        matched.add_part(tm, make_tm_packet(tack), cpu_t)
+
+    readouts = mock_assembler.assemble_readouts(matched)
+    assert len(readouts) == 10, "Correct number of readouts"
+    for i, ro in enumerate(readouts):
+        ref = reference_readout_data(matched, i)
+        assert ro.iro == i + 1, "Correct readout number"
+        assert ro.time == tack + int(i * 1e8), "Correct TACK"
+        assert np.array_equal(ro.data, ref, equal_nan=True), "Identical readout data"
+        compact = SSReadout.from_bytes(ro.pack("uint16"))
+        assert np.array_equal(compact.data, ref, equal_nan=True), "Lossless ADC counts"
+    assert mock_assembler.readout_counter[31] == 11, "Correct TM readout counter"
+    assert mock_assembler.readout_counter[1] == 1, "Correct TM readout counter"
+
+
+def test_late_packet_matching(mock_assembler):
+    cpu_t = datetime.datetime.utcnow()
+    tacks = [int(i * 1e8) + 1000 for i in range(20)]
+    for tack in tacks:
+        mock_assembler.add_partial_readout(
+            MatchedPacket(0, make_tm_packet(tack, 1), tack, cpu_t, 1)
+        )
+    # a packet that is a bit late or early should match its readout
+    # regardless of how deep into the buffer the readout is
+    for tack in tacks:
+        for jitter in [-5000, 0, 5000]:
+            pro = mock_assembler.find_partial_readout(tack + jitter)
+            assert pro is not None and pro.tack == tack, "Correct matched readout"
+    assert mock_assembler.find_partial_readout(tacks[-1] + int(6e7)) is None, "No match"
+
+
+def test_expire_partial_readouts(mock_assembler):
+    cpu_t = datetime.datetime.utcnow()
+    tacks = [int(i * 1e8) for i in range(20)]
+    for tack in tacks:
+        mock_assembler.add_partial_readout(
+            MatchedPacket(0, make_tm_packet(tack, 1), tack, cpu_t, 1)
+        )
+    expired = list(mock_assembler.expire_partial_readouts())
+    assert [m.tack for m in expired] == tacks[:9], "Expired readouts in TACK order"
+    assert len(mock_assembler.partial_ro_index) == 11, "Expired readouts unindexed"
+    assert mock_assembler.find_partial_readout(tacks[0]) is None, "No expired match"
+
+    mock_assembler.buffer_len = 5
+    expired = list(mock_assembler.expire_partial_readouts())
+    assert [m.tack for m in expired] == tacks[9:15], "Buffer length respected"
+
+
+def test_decoder_pool_ordering(mock_assembler):
+    import asyncio
+    from ssdaq.receivers.readout_workers import ReadoutDecoderPool
+
+    loop = asyncio.new_event_loop()
+    pool = ReadoutDecoderPool(loop, 2, nslots=2)
+    cpu_t = datetime.datetime.utcnow()
+    matched_packets = []
+    for k in range(5):
+        tack = int(k * 1e9)
+        matched = MatchedPacket(3, make_tm_packet(tack), tack, cpu_t, 10)
+        matched.add_part(7, make_tm_packet(tack), cpu_t)
+        matched_packets.append(matched)
+
+    async def run():
+        packed = []
+
+        async def collect():
+            async for ro in pool.readouts():
+                packed.append(bytes(ro))
+                if len(packed) == 50:
+                    return
+
+        task = loop.create_task(collect())
+        for i, matched in enumerate(matched_packets):
+            await pool.dispatch(matched, 1 + i * 10)
+        await asyncio.wait_for(task, 30)
+        return packed
+
+    try:
+        packed = loop.run_until_complete(run())
+    finally:
+        pool.close()
+        loop.close()
+
+    expected = []
+    for matched in matched_packets:
+        expected += [bytes(ro.pack()) for ro in mock_assembler.assemble_readouts(matched)]
+    assert packed == expected, "Identical readouts published in readout number order"
+
+
+def test_decoder_pool_failures(mock_assembler):
+    import asyncio
+    from ssdaq.receivers.readout_workers import ReadoutDecoderPool
+
+    loop = asyncio.new_event_loop()
+    log = Mock()
+    pool = ReadoutDecoderPool(
+        loop,
+        1,
+        nslots=1,
+        packet_size=10 * READOUT_LENGTH,
+        wire_format="uint16",
+        check_interval=0.1,
+        log=log,
+    )
+    cpu_t = datetime.datetime.utcnow()
+
+    def make_matched(tack, nreadouts=10):
+        matched = MatchedPacket(3, make_tm_packet(tack), tack, cpu_t, 10)
+        matched.add_part(7, make_tm_packet(tack, nreadouts), cpu_t)
+        return matched
+
+    good = [make_matched(int(1e9)), make_matched(int(2e9)), make_matched(int(3e9))]
+
+    async def run():
+        packed = []
+
+        async def collect():
+            async for ro in pool.readouts():
+                packed.append(bytes(ro))
+
+        task = loop.create_task(collect())
+        with pytest.raises(ValueError):
+            # would overwrite the region of the next TM in the slot
+            await pool.dispatch(make_matched(0, 20), 1)
+        # packets of different lengths fail to decode in the worker
+        await pool.dispatch(make_matched(0, 5), 1)
+        await pool.dispatch(good[0], 1)
+        while len(packed) < 10:
+            await asyncio.sleep(0.01)
+        pool._workers[0].terminate()
+        pool._workers[0].join()
+        await pool.dispatch(good[1], 11)
+        await pool.dispatch(good[2], 21)
+        while len(packed) < 20:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return packed
+
+    try:
+        packed = loop.run_until_complete(asyncio.wait_for(run(), 60))
+    finally:
+        pool.close()
+        loop.close()
+
+    expected = []
+    for matched, first_iro in [(good[0], 1), (good[2], 21)]:
+        mock_assembler.readout_count = first_iro
+        expected += [
+            bytes(ro.pack("uint16")) for ro in mock_assembler.assemble_readouts(matched)
+        ]
+    assert packed == expected, "Failed readouts skipped and packed in the workers"
+    assert pool.nfailed == 2, "Failed and lost tasks counted"
+    messages = " ".join(str(c) for c in log.error.call_args_list)
+    assert "ValueError" in messages, "Decode error logged"
+    assert "died" in messages, "Dead worker logged"
+
+
 if __name__ == "__main__":
     unittest.main()
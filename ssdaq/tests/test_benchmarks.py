@@ -0,0 +1,62 @@
+from ssdaq.benchmarks import compare_to_baseline, latency_summary, make_results
+from ssdaq.benchmarks import daq, serialization
+
+
+def test_compare_to_baseline():
+    metrics = {"packets_per_s": True, "latency_p99_ms": False}
+    baseline = make_results(
+        "daq", {}, {"zmq": {"packets_per_s": 1000.0, "latency_p99_ms": 1.0}}
+    )
+    ok = make_results("daq", {}, {"zmq": {"packets_per_s": 950.0, "latency_p99_ms": 1.05}})
+    assert compare_to_baseline(ok, baseline, metrics) == [], "within tolerance"
+
+    slow = make_results(
+        "daq",
+        {},
+        {
+            "zmq": {"packets_per_s": 800.0, "latency_p99_ms": 2.0},
+            "trigger": {"packets_per_s": 1.0},
+        },
+    )
+    regressions = compare_to_baseline(slow, baseline, metrics)
+    assert regressions == [
+        ("zmq", "packets_per_s", 1000.0, 800.0),
+        ("zmq", "latency_p99_ms", 1.0, 2.0),
+    ], "regressions found and cases missing in the baseline ignored"
+
+
+def test_latency_summary():
+    summary = latency_summary([1e6] * 99 + [1e8])
+    assert summary["latency_p50_ms"] == 1.0, "median latency in ms"
+    assert summary["latency_max_ms"] == 100.0, "max latency in ms"
+    assert latency_summary([])["latency_p99_ms"] is None, "no latencies"
+
+
+def test_daq_benchmark_zmq():
+    results = daq.run(["zmq"], rates={"zmq": 200}, duration=0.5, port_base=17590)
+    result = results["results"]["zmq"]
+    assert result["sent"] == 100, "all messages sent"
+    assert 0 < result["received"] <= result["sent"], "messages received"
+    assert result["latency_p50_ms"] > 0, "latency measured"
+
+
+def test_serialization_benchmark():
+    results = serialization.run(["ssreadout_*", "trigger_v2_8"], min_time=0.001, repeat=1)
+    cases = results["results"]
+    assert set(cases) == {
+        "ssreadout_float64",
+        "ssreadout_float32",
+        "ssreadout_uint16",
+        "trigger_v2_8",
+    }, "cases selected by pattern"
+    readout = cases["ssreadout_float64"]
+    assert readout["error"] is None, "case ran"
+    assert readout["encoded_bytes"] == 16416, "encoded size of a readout"
+    assert readout["encode_us"] > 0 and readout["decode_mb_per_s"] > 0, "timed"
+    assert readout["decode_blocks"] > 0, "allocations traced"
+    assert (
+        cases["ssreadout_uint16"]["encoded_bytes"] < readout["encoded_bytes"]
+    ), "compact encoding is smaller"
+
+    failing = serialization.Case("failing", lambda: None, lambda obj: obj.pack(), None)
+    assert "AttributeError" in serialization.run_case(failing)["error"], "error reported"
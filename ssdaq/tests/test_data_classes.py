@@ -6,8 +6,12 @@ from ssdaq.data import (
     TriggerPacketV2,
     TriggerPacketV3,
     TriggerPacket,
+    TriggerPatterns,
 )
+from ssdaq.data.io import TriggerWriter, DataReader
+from ssdaq.data._dataimpl.trigger_format import get_bptrigg2SP_mapping
 import numpy as np
+import os
 
 
 def test_pack_unpack():
@@ -31,6 +35,72 @@ def test_pack_unpack():
     assert np.isnan(readout1.data[4, 0]), "nans for empty readouts"
 
 
+def test_readout_zero_copy():
+    readout1 = SSReadout(timestamp=12345, readout_number=1234)
+    readout1.data[2, :] = np.arange(64)
+    packed_readout = readout1.pack(copy=False)
+    readout2 = SSReadout.from_bytes(packed_readout)
+    assert np.shares_memory(readout1.data, readout2.data), "unpacked without copy"
+    snapshot = readout1.pack()
+    assert isinstance(snapshot, bytes), "immutable copy by default"
+    readout1.data[2, 0] = -1
+    assert SSReadout.from_bytes(snapshot).data[2, 0] == 0, "copy unaffected by changes"
+    readout1.data[2, 0] = 0
+
+    readout3 = SSReadout.from_bytes(bytes(packed_readout))
+    assert not readout3.data.flags.writeable, "read only view of bytes"
+    assert bytes(readout3.pack()) == bytes(packed_readout), "pack of unmodified readout"
+    readout3.iro = 1
+    readout3.data = readout1.data * 2
+    assert readout3.data.flags.writeable, "copied when modified"
+    readout4 = SSReadout.from_bytes(readout3.pack())
+    assert readout4.iro == 1, "correct readout number"
+    assert (readout4.data[2] == 2 * np.arange(64)).all(), "correct readout"
+    assert readout4.time == readout1.time, "correct timestamp TACK"
+
+    source = bytearray(readout1.pack())
+    readout5 = SSReadout.from_bytes(source)
+    assert np.shares_memory(readout5.data, np.frombuffer(source)), "unpacked without copy"
+    readout5.iro = 2
+    readout5.data = -1.0
+    assert bytes(source) == readout1.pack(), "source buffer unchanged"
+    assert SSReadout.from_bytes(readout5.pack()).data[0, 0] == -1.0, "modified readout"
+    with pytest.raises(ValueError):
+        SSReadout.from_bytes(source).data[0, 0] = 1.0
+
+
+def test_readout_compact_format():
+    readout1 = SSReadout(timestamp=12345, readout_number=1234, cpu_t_s=12, cpu_t_ns=34)
+    readout1.data[2, :] = np.arange(64) * 0.5
+    readout1.data[3, :] = np.arange(64)
+    packed = readout1.pack("float32")
+    assert len(packed) == 40 + 2 * 64 * 4, "only present TMs are packed"
+    readout2 = SSReadout.from_bytes(packed)
+    assert readout2.iro == readout1.iro, "correct readout number"
+    assert readout2.time == readout1.time, "correct timestamp TACK"
+    assert readout2.cpu_t == readout1.cpu_t, "correct timestamp cpu"
+    assert np.array_equal(readout2.data, readout1.data, equal_nan=True), "correct data"
+
+    assert len(SSReadout().pack("uint16")) == 40, "empty readout"
+    with pytest.raises(ValueError):
+        SSReadout.from_bytes(b"XX" + bytes(packed[2:]))
+    with pytest.raises(ValueError):
+        readout1.pack("float16")
+
+
+def test_readout_compact_format_clipping():
+    from ssdaq.data._dataimpl.slowsignal_format import MV_PER_COUNT
+
+    readout = SSReadout()
+    readout.data[0, :4] = [-5.0, -np.inf, np.inf, 1e9]
+    readout.data[0, 4:] = 100.0
+    unpacked = SSReadout.from_bytes(readout.pack("uint16"))
+    max_mv = 0xFFFF * MV_PER_COUNT
+    clipped = list(unpacked.data[0, :4])
+    assert clipped == [0.0, 0.0, max_mv, max_mv], "clipped to the ADC range"
+    assert np.allclose(unpacked.data[0, 4:], 100.0, atol=MV_PER_COUNT), "values kept"
+
+
 def test_trigger_packet_pack_unpack():
     trigg = BusyTriggerPacketV1(
         trigg_phases= np.array(np.random.uniform(0, 2, (16, 512)), dtype=np.uint8),
@@ -83,4 +153,155 @@ def test_trigger_packet_unpack_from_pack_unpack():
     assert triggununV3.busy, "is busy"
     assert np.all(
         triggununV3.trigg_pattrns == triggV3.trigg_pattrns
-    ), "correct trigger pattern V3"
\ No newline at end of file
+    ), "correct trigger pattern V3"
+
+def make_trigger_packets(n=30):
+    rng = np.random.RandomState(1)
+    packets = []
+    for i in range(n):
+        phase = 2 ** int(rng.randint(0, 7))
+        if i % 3 == 0:
+            packets.append(
+                BusyTriggerPacketV1(
+                    TACK=i * 1000,
+                    trigg_phases=rng.randint(0, 2, (16, 512)).astype(np.uint8),
+                    trigg_phase=phase,
+                    uc_ev=i,
+                )
+            )
+        elif i % 3 == 1:
+            packets.append(
+                TriggerPacketV2(
+                    tack_time=i * 1000,
+                    trigg_pattrns=rng.randint(0, 2, (128, 512)).astype(np.uint8),
+                    phase=phase,
+                    ro_count=i,
+                    message_type=i % 2,
+                )
+            )
+        else:
+            trigg_pattrns = np.zeros((64, 512), dtype=np.uint8)
+            trigg_pattrns[:, rng.randint(0, 512, 10)] = rng.randint(0, 2, (64, 10))
+            packets.append(
+                TriggerPacketV3(
+                    tack_time=i * 1000,
+                    trigg_pattrns=trigg_pattrns,
+                    phase=phase,
+                    ro_count=i,
+                    message_type=i % 2,
+                )
+            )
+    return packets
+
+
+def test_trigger_columns(tmp_path):
+    filename = os.path.join(tmp_path, "triggers.sof")
+    writer = TriggerWriter(filename, compressor=None)
+    for packet in make_trigger_packets():
+        writer.write(packet)
+    writer.close()
+
+    reader = DataReader(filename)
+    packets = list(reader.readobjects())
+    columns = reader.read_trigger_columns(chunk_size=7)
+    assert len(columns.tack_time) == len(packets), "correct number of packets"
+    assert columns.trigg_pattrns.shape == (len(packets), 128, 64), "padded patterns"
+    for i, packet in enumerate(packets):
+        ro_len = columns.readout_length[i]
+        pattrns = np.unpackbits(columns.trigg_pattrns[i], axis=-1)
+        assert columns.tack_time[i] == packet.tack_time, "correct TACK"
+        assert columns.ro_count[i] == packet.ro_count, "correct readout count"
+        assert columns.phase[i] == packet.phase, "correct phase"
+        assert columns.busy[i] == packet.busy, "correct busy flag"
+        assert np.all(pattrns[:ro_len] == packet.trigg_pattrns), "correct patterns"
+        assert not pattrns[ro_len:].any(), "zero padding"
+        assert np.all(
+            np.unpackbits(columns.trigg_union[i]) == packet.trigg_union
+        ), "correct union"
+
+    columns = reader.read_trigger_columns([5, 2], patterns=False)
+    assert list(columns.tack_time) == [5000, 2000], "correct selected packets"
+    assert columns.trigg_pattrns.shape == (2, 0, 64), "no patterns"
+
+
+def test_lazy_trigger_packets():
+    for packet in make_trigger_packets(10):
+        if not isinstance(packet, (TriggerPacketV2, TriggerPacketV3)):
+            continue
+        unpacked = TriggerPacket.unpack(packet.pack())
+        assert unpacked.tack_time == packet.tack_time, "correct TACK"
+        assert unpacked.readout_length == packet.readout_length, "correct readout length"
+        assert unpacked.busy == packet.busy, "correct busy flag"
+        assert unpacked._patterns is None, "patterns not unpacked"
+        assert np.all(unpacked.trigg_union == packet.trigg_union), "correct union"
+        assert unpacked._patterns is None, "union unpacked without patterns"
+        assert np.all(unpacked.trigg == packet.trigg), "correct trigger"
+        assert np.all(
+            unpacked.trigg_pattrns == packet.trigg_pattrns
+        ), "correct patterns"
+        assert unpacked.pack() == packet.pack(), "repacks identically"
+        pattrns = unpacked.trigg_pattrns
+        assert unpacked.trigg_pattrns is pattrns, "unpacked once"
+        sps = np.flatnonzero(unpacked.trigg_union)
+        if len(sps) > 0:
+            pattrns[0, sps[0]] ^= 1
+            repacked = TriggerPacket.unpack(unpacked.pack())
+            assert np.all(repacked.trigg_pattrns == pattrns), "modification packed"
+
+
+def test_trigger_patterns():
+    rng = np.random.RandomState(2)
+    a = rng.randint(0, 2, (72, 512)).astype(np.uint8)
+    b = rng.randint(0, 2, (72, 512)).astype(np.uint8)
+    a[:, 10] = 0
+    pa = TriggerPatterns.from_array(a)
+    pb = TriggerPatterns.from_array(b)
+    assert pa.nbytes * 8 <= a.nbytes * 2, "packed in words"
+    assert np.all(pa.to_array() == a), "round trip"
+    assert np.all((pa | pb).to_array() == (a | b)), "correct union"
+    assert np.all((pa & pb).to_array() == (a & b)), "correct intersection"
+    assert pa.popcount() == a.sum(), "correct total count"
+    assert np.all(pa.popcount(axis=0) == a.sum(axis=1)), "correct count per time step"
+    assert np.all(pa.popcount(axis=1) == a.sum(axis=0)), "correct count per SP"
+    assert np.all(pa.sp_union() == np.any(a, axis=0)), "correct SP union"
+    assert np.all(pa.phase(3) == a[3]), "correct phase"
+    assert np.all(pa.phase(-1) == a[-1]), "correct negative phase"
+    assert np.all(pa.phase(slice(5, 9)) == a[5:9]), "correct phase slice"
+    mapping = get_bptrigg2SP_mapping()
+    assert np.all(pa.map_sps(mapping).to_array() == a[:, mapping]), "correct mapping"
+    assert TriggerPatterns.from_packed(pa.packed.tobytes(), 72) == pa, "from packed"
+    sps = np.flatnonzero(pa.sp_union())
+    assert (
+        TriggerPatterns.from_packed(pa.packed[sps].tobytes(), 72, sps) == pa
+    ), "from zero suppressed"
+    with pytest.raises(ValueError):
+        pa | TriggerPatterns.zeros(64)
+    with pytest.raises(IndexError):
+        pa.phase(72)
+
+
+def test_trigger_mapping():
+    from ssdaq.data._dataimpl import trigger_mapping
+
+    bp2sp = trigger_mapping.bptrigg2sp()
+    sp2bp = trigger_mapping.sp2bptrigg()
+    assert bp2sp is trigger_mapping.bptrigg2sp(), "cached"
+    assert not bp2sp.flags.writeable, "read-only"
+    assert np.all(bp2sp[sp2bp] == np.arange(512)), "inverse mappings"
+    assert np.all(get_bptrigg2SP_mapping() == bp2sp), "same mapping"
+
+    rng = np.random.RandomState(3)
+    pattrns = rng.randint(0, 2, (4, 10, 512)).astype(np.uint8)
+    remapped = trigger_mapping.remap_packed(np.packbits(pattrns, axis=-1))
+    assert np.all(
+        np.unpackbits(remapped, axis=-1) == pattrns[..., bp2sp]
+    ), "correct packed remapping"
+
+    rows, cols = np.divmod(rng.permutation(24 * 24)[:512], 24)
+    mapping = trigger_mapping.SPImageMapping(rows, cols)
+    images = mapping(pattrns[0], fill=2)
+    assert images.shape == (10, 24, 24), "batch of images"
+    for pattrn, image in zip(pattrns[0], images):
+        expected = np.full((24, 24), 2, dtype=np.uint8)
+        expected[rows, cols] = pattrn[bp2sp]
+        assert np.all(image == expected), "correct image"
@@ -125,4 +125,42 @@ def test_serialization_after_deserialization():
 
     assert (
         frame1["trigg_pack"].tack_time == frame3["trigg_pack"].tack_time
-    ),"Correct trigg TACK"
\ No newline at end of file
+    ),"Correct trigg TACK"
+
+def test_ndarray_serialization_and_deserialization():
+    images = np.random.normal(size=(10, 32, 64))
+    frame1 = data.Frame()
+    frame1["images"] = images
+    frame1["fortran"] = np.asfortranarray(np.arange(12.0).reshape(3, 4))
+    frame1["records"] = np.zeros(3, dtype=[("a", "<u8"), ("b", ">f4", (2,))])
+    frame1["tuple"] = (
+        np.arange(5, dtype=">u2"), 3, 2.5, "abc", b"a\x00", None, (np.zeros((2, 0)),)
+    )
+    datastream = bytes(frame1.serialize())
+    frame2 = data.Frame.deserialize(datastream)
+
+    assert np.array_equal(frame2["images"], images), "correct array"
+    assert not frame2["images"].flags.owndata, "array is a view into the frame buffer"
+    base = np.frombuffer(datastream, dtype=np.uint8).ctypes.data
+    assert (frame2["images"].ctypes.data - base) % 64 == 0, "array data aligned in frame"
+    assert np.array_equal(frame2["fortran"], frame1["fortran"]), "correct fortran array"
+    assert frame2["records"].dtype == frame1["records"].dtype, "correct structured dtype"
+    tup = frame2["tuple"]
+    assert tup[0].dtype == np.dtype(">u2"), "correct array type in tuple"
+    assert list(tup[0]) == list(range(5)), "correct array in tuple"
+    assert tup[1:6] == (3, 2.5, "abc", b"a\x00", None), "correct scalars in tuple"
+    assert tup[6][0].shape == (2, 0), "correct nested tuple"
+
+
+def test_nested_frame_ndarray_alignment():
+    frame1 = data.Frame()
+    frame1["trigg_pack"] = data.TriggerPacketV3(tack_time=100)
+    frame1["images"] = np.arange(7.0)
+    frame2 = data.Frame()
+    frame2["frame1"] = frame1
+    datastream = bytes(frame2.serialize())
+    frame3 = data.Frame.deserialize(datastream)
+    base = np.frombuffer(datastream, dtype=np.uint8).ctypes.data
+    images = frame3["frame1"]["images"]
+    assert np.array_equal(images, np.arange(7.0)), "correct array in nested frame"
+    assert (images.ctypes.data - base) % 64 == 0, "array data aligned in enclosing frame"
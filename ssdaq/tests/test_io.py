@@ -0,0 +1,190 @@
+import pytest
+import os
+from ssdaq.core.io import (
+    RawObjectWriterBase,
+    RawObjectWriterV0,
+    RawObjectWriterV1,
+    RawObjectReaderBase,
+    compressors,
+    index_filename,
+)
+
+
+def make_objects(n=500):
+    return [(str(i) * (i % 20 + 1)).encode() for i in range(n)]
+
+
+@pytest.mark.parametrize("compressor", [None] + list(compressors.keys()))
+def test_write_read_compressors(tmp_path, compressor):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects()
+    with RawObjectWriterBase(filename, compressor=compressor, bunchsize=1000) as f:
+        for obj in objects:
+            f.write(obj)
+
+    with RawObjectReaderBase(filename) as f:
+        assert f.n_entries == len(objects), "correct number of objects"
+        assert f[:] == objects, "correct objects"
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_parallel_compression(tmp_path, pool):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects(2000)
+    with RawObjectWriterBase(
+        filename,
+        compressor="zlib",
+        bunchsize=1000,
+        compress_workers=3,
+        compress_pool=pool,
+    ) as f:
+        for obj in objects:
+            f.write(obj)
+
+    with RawObjectReaderBase(filename) as f:
+        assert f.n_entries == len(objects), "correct number of objects"
+        assert f[:] == objects, "bunches written in order"
+
+
+def test_unknown_compressor(tmp_path):
+    filename = os.path.join(tmp_path, "test.sof")
+    with RawObjectWriterBase(filename) as f:
+        f.write(b"data")
+    size = os.path.getsize(filename)
+    with pytest.raises(ValueError):
+        RawObjectWriterBase(filename, compressor="rar")
+    with pytest.raises(ValueError):
+        RawObjectWriterBase(filename, compress_workers=1, compress_pool="fiber")
+    assert os.path.getsize(filename) == size, "existing file not truncated"
+    assert os.path.exists(index_filename(filename)), "existing index file kept"
+
+
+@pytest.mark.parametrize("protocol,compressor", [(0, None), (1, None), (1, "zlib")])
+def test_mmap_reader(tmp_path, protocol, compressor):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects()
+    if protocol == 0:
+        f = RawObjectWriterV0(filename)
+    else:
+        f = RawObjectWriterV1(filename, compressor=compressor, bunchsize=1000)
+    with f:
+        for obj in objects:
+            f.write(obj)
+
+    with RawObjectReaderBase(filename, mmap=True) as f:
+        assert f.n_entries == len(objects), "correct number of objects"
+        assert [bytes(obj) for obj in f] == objects, "correct objects when iterating"
+        assert bytes(f[10]) == objects[10], "correct object"
+        f.resetfp()
+        assert bytes(f.read()) == objects[0], "correct object"
+        assert bytes(f.read()) == objects[1], "correct object"
+        assert [bytes(obj) for obj in f[5:50]] == objects[5:50], "correct slice"
+    with RawObjectReaderBase(filename) as f:
+        assert list(f) == objects, "correct objects when iterating"
+
+
+@pytest.mark.parametrize("read_ahead", [False, True])
+def test_bunch_cache(tmp_path, read_ahead):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects(2000)
+    with RawObjectWriterV1(filename, compressor="bz2", bunchsize=1000) as f:
+        for obj in objects:
+            f.write(obj)
+
+    with RawObjectReaderBase(filename, cache_size=3000, read_ahead=read_ahead) as f:
+        assert f[:] == objects, "correct objects"
+        stats = f.cache_stats
+        assert stats["nbytes"] <= 3000, "cache bounded in bytes"
+        assert stats["evictions"] > 0, "bunches evicted"
+        assert stats["hits"] > stats["misses"], "sequential reads hit the cache"
+        if read_ahead:
+            assert stats["prefetched"] == stats["misses"] - 1, "bunches read ahead"
+        assert list(f) == objects, "correct objects when iterating"
+
+        # strided access (every third bunch) is not read ahead
+        inds = f._reader._bunch_first[3::3]
+        f._reader._prefetch = None
+        assert f[list(inds)] == [objects[i] for i in inds], "correct objects"
+        assert f._reader._prefetch is None, "no read ahead"
+
+
+def test_index_lookup(tmp_path):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects(2000)
+    with RawObjectWriterV1(filename, bunchsize=1000) as f:
+        for obj in objects:
+            f.write(obj)
+
+    with RawObjectReaderBase(filename) as f:
+        assert f.n_entries == len(objects), "correct number of objects"
+        assert f[-1] == objects[-1], "correct object at negative index"
+        inds = [1999, 0, 1024, 1023, 5]
+        assert f[inds] == [objects[i] for i in inds], "correct objects at indices"
+        assert f[1000:10:-7] == objects[1000:10:-7], "correct reversed slice"
+        with pytest.raises(IndexError):
+            f.read_at(2000)
+
+    filename = os.path.join(tmp_path, "empty.sof")
+    RawObjectWriterV1(filename).close()
+    with RawObjectReaderBase(filename) as f:
+        assert f.n_entries == 0, "empty file"
+        assert f[:] == [], "no objects in empty file"
+
+
+def test_index_file(tmp_path):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects(2000)
+    with RawObjectWriterV1(filename, compressor="zlib", bunchsize=1000) as f:
+        for obj in objects:
+            f.write(obj)
+    assert os.path.exists(index_filename(filename)), "index file written"
+
+    with RawObjectReaderBase(filename) as f:
+        assert f.n_entries == len(objects), "correct number of objects"
+        assert f[:] == objects, "correct objects"
+
+    # a broken index file is ignored
+    with open(index_filename(filename), "r+b") as f:
+        f.truncate(100)
+    with RawObjectReaderBase(filename) as f:
+        assert f[:] == objects, "correct objects"
+
+    with RawObjectWriterV1(filename, index_file=False) as f:
+        f.write(b"new")
+    assert not os.path.exists(index_filename(filename)), "stale index file removed"
+
+
+def test_reload(tmp_path):
+    filename = os.path.join(tmp_path, "test.sof")
+    objects = make_objects(2000)
+
+    # following a file that is being written
+    writer = RawObjectWriterV1(filename, bunchsize=1000)
+    for obj in objects[:700]:
+        writer.write(obj)
+    with RawObjectReaderBase(filename, mmap=True) as reader:
+        n_entries = [reader.n_entries]
+        for part in [objects[700:1400], objects[1400:]]:
+            for obj in part:
+                writer.write(obj)
+            if len(part) < 700:
+                writer.close()
+            reader.reload()
+            n_entries.append(reader.n_entries)
+            assert [bytes(obj) for obj in reader] == objects[: reader.n_entries]
+    assert 0 < n_entries[0] < n_entries[1] < n_entries[2], "new bunches found"
+    assert n_entries[-1] == len(objects), "all objects found"
+
+    # a file that ends with a partially written bunch
+    with open(filename, "rb") as f:
+        data = f.read()
+    with open(filename, "wb") as f:
+        f.write(data[:-10])
+    os.remove(index_filename(filename))
+    with RawObjectReaderBase(filename) as reader:
+        assert 0 < reader.n_entries < len(objects), "partial bunch not indexed"
+        assert reader[:] == objects[: reader.n_entries], "complete bunches indexed"
+        with open(filename, "ab") as f:
+            f.write(data[-10:])
+        reader.reload()
+        assert reader[:] == objects, "complete bunch indexed"
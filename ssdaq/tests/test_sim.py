@@ -0,0 +1,122 @@
+import asyncio
+import importlib.util
+import os
+import pickle
+import socket
+import numpy as np
+import pytest
+
+# the simulators are scripts in the repository, not part of the package
+SIM_DIR = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "sim")
+
+
+def load_sim(path):
+    filename = os.path.join(SIM_DIR, path)
+    if not os.path.exists(filename):
+        pytest.skip("simulators not available")
+    name = os.path.splitext(os.path.basename(filename))[0]
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def free_udp_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_trigger_sim_change_rate():
+    trigger_sim = load_sim("triggers/trigger_sim.py")
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    sim = trigger_sim.TriggerPacketGenerator(
+        free_udp_port(), 17660, rate=1000.0, ro_len=16, pool_size=8
+    )
+    for coro in sim.corrs:
+        coro.close()
+
+    def command(*args):
+        return pickle.loads(sim.cmds["change_rate"](list(args)))
+
+    for rate in ["-1", "nan", "fast"]:
+        assert command(rate)["status"] == "Error", "invalid rate rejected"
+    assert sim.sender.rate == 1000.0, "rate unchanged"
+    assert command("0")["status"] == "OK", "zero rate pauses sending"
+    npackets = sim.sender.npackets
+    with pytest.raises(asyncio.TimeoutError):
+        sim.loop.run_until_complete(asyncio.wait_for(sim.send_triggers_data(), 0.1))
+    assert sim.sender.npackets == npackets, "no packets sent while paused"
+
+    assert command("1000")["status"] == "OK", "rate changed"
+    with pytest.raises(asyncio.TimeoutError):
+        sim.loop.run_until_complete(asyncio.wait_for(sim.send_triggers_data(), 0.1))
+    assert sim.sender.npackets > npackets, "sending resumed"
+    sim.com_sock.close()
+    sim.context.term()
+    sim.udp_sock.close()
+    sim.loop.close()
+
+
+@pytest.fixture
+def camera_sim():
+    camera_sim = load_sim("slowsignal/camera_sim.py")
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    sim = camera_sim.CameraSimulator(
+        free_udp_port(), 17661, n_tms=2, readout_rate=1000.0, reorder=0.3, seed=1
+    )
+    for coro in sim.corrs:
+        coro.close()
+    yield camera_sim, sim
+    for sock in sim.socks:
+        sock.close()
+    sim.com_sock.close()
+    sim.context.term()
+    sim.loop.close()
+
+
+def test_camera_sim_change_rate(camera_sim):
+    camera_sim, sim = camera_sim
+
+    def command(*args):
+        return pickle.loads(sim.cmds["change_rate"](list(args)))
+
+    for rate in ["-5", "nan", "inf", "fast"]:
+        assert command(rate)["status"] == "Error", "invalid rate rejected"
+    assert sim.readout_rate == 1000.0, "rate unchanged"
+    assert sim.send_ss_datae.is_set(), "sending"
+    assert command("0")["status"] == "OK", "zero rate pauses sending"
+    assert not sim.send_ss_datae.is_set(), "paused"
+    assert pickle.loads(sim.cmds["send_ss_data"](["true"]))["status"] == "OK"
+    assert not sim.send_ss_datae.is_set(), "still paused at zero rate"
+    assert command("500")["status"] == "OK", "rate changed"
+    assert sim.send_ss_datae.is_set(), "sending resumed"
+    assert sim.packet_period == 10 / 500.0, "packet period of the new rate"
+    with pytest.raises(ValueError):
+        camera_sim.CameraSimulator(free_udp_port(), 17662, n_tms=1, readout_rate=-1.0)
+
+
+def test_camera_sim_reorder(camera_sim):
+    camera_sim, sim = camera_sim
+    sim._schedule(sim._t0 + 200 * sim.packet_period)
+    packets = sim._pending_packets.view(camera_sim.readout_dtype)
+    inversions = 0
+    for tm in range(sim.n_tms):
+        tacks = packets["tack0"][sim._pending_tms == tm, 0].astype(np.int64)
+        assert len(tacks) == 201, "all packets of the TM pending"
+        inversions += np.sum(np.diff(tacks) < 0)
+    assert 0.1 * 400 < inversions < 0.5 * 400, "packets sent out of order"
+
+
+def test_camera_sim_adc_range(camera_sim):
+    camera_sim, sim = camera_sim
+    sim.amplitudes[:] = 1e6
+    packets = sim.simulate_packets(5, 0)
+    counts = np.concatenate((packets["adc0"], packets["adc1"]), axis=-1) ^ 0x8000
+    assert counts.max() <= camera_sim.MAX_COUNTS, "counts in the ADC range"
+    assert counts.max() > camera_sim.MAX_COUNTS - 100, "amplitudes clipped"
+    assert np.all(
+        sim.amplitudes <= camera_sim.MAX_COUNTS * camera_sim.dc.MV_PER_COUNT
+    ), "random walk clipped"
@@ -61,4 +61,39 @@ def test_correct_cpu_timestamps(mock_data_protocol, make_datapacket):
     while not mock_data_protocol._buffer.empty():
         ros.append(mock_data_protocol._buffer.get())
     assert len(ros) == 1, "Correct number of readouts"
-    assert ros[0][0] ==20, "Correct module number"
\ No newline at end of file
+    assert ros[0][0] ==20, "Correct module number"
+
+def test_batch_protocol_rejected_packets(make_datapacket):
+    import asyncio
+    import logging
+    import socket
+    from ssdaq.receivers.readout_assembler import SlowSignalBatchProtocol
+
+    loop = asyncio.new_event_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setblocking(False)
+    protocol = SlowSignalBatchProtocol(
+        sock, loop, logging.getLogger("test"), False, Mock(), ring_slots=8
+    )
+    packet = bytes(make_datapacket())
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.sendto(packet[:-1], sock.getsockname())
+    sender_out_of_range = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender_out_of_range.bind(("127.0.0.50", 0))
+    sender_out_of_range.sendto(packet, sock.getsockname())
+    sender.sendto(packet, sock.getsockname())
+
+    async def first_packet():
+        async for packet in protocol.packets():
+            return packet
+
+    module_nr, data, _ = loop.run_until_complete(
+        asyncio.wait_for(first_packet(), 1)
+    )
+    assert module_nr == 1 and data == packet, "Valid packet passed on"
+    assert protocol.rejected_packets == 2, "Bad size and out of range packets counted"
+    protocol.reader.pause()
+    for s in [sock, sender, sender_out_of_range]:
+        s.close()
+    loop.close()
@@ -0,0 +1,169 @@
+import os
+import numpy as np
+import pytest
+import tables
+from ssdaq.data import SSReadout
+from ssdaq.data.io import SSDataWriter, SSDataReader
+from ssdaq.data._dataimpl.slowsignal_format import ss_mappings
+
+
+def make_readouts(n=25):
+    rng = np.random.default_rng(0)
+    return [
+        SSReadout(
+            timestamp=1000 * i,
+            readout_number=i,
+            cpu_t_s=1600000000 + i,
+            cpu_t_ns=i,
+            data=rng.normal(200, 10, (32, 64)),
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("complib", ["bzip2", "blosc:lz4"])
+def test_ssdata_writer_buffered(tmp_path, complib):
+    filename = os.path.join(tmp_path, "test.hdf5")
+    readouts = make_readouts()
+    writer = SSDataWriter(filename, buffer=10, complib=complib, chunkshape=(4,))
+    writer.write_readouts(readouts[:5])
+    for ro in readouts[5:]:
+        writer.write(ro)
+    assert writer.table.nrows == 20, "full buffers appended"
+    writer.close()
+    assert writer.data_counter == len(readouts), "readouts counted"
+
+    reader = SSDataReader(filename)
+    table = reader.file.root.SlowSignal.readout
+    assert table.filters.complib == complib, "compression library"
+    assert table.chunkshape == (4,), "chunk shape"
+    assert reader.n_readouts == len(readouts), "all readouts written"
+    assert list(table.col("iro")) == [ro.iro for ro in readouts], "readout numbers"
+    assert list(table.col("time")) == [ro.time for ro in readouts], "TACKs"
+    assert np.allclose(table.col("cpu_t"), [ro.cpu_t for ro in readouts]), "cpu times"
+    assert np.array_equal(
+        table.col("data"), np.array([ro.data for ro in readouts], dtype=np.float32)
+    ), "readout data"
+    reader.close_file()
+
+
+@pytest.fixture
+def ssdata_file(tmp_path):
+    filename = os.path.join(tmp_path, "test.hdf5")
+    readouts = make_readouts(30)
+    with_nan = readouts[3].data.copy()
+    with_nan[5] = np.nan
+    readouts[3].data = with_nan
+    writer = SSDataWriter(filename, buffer=7)
+    writer.write_readouts(readouts)
+    writer.close()
+    return filename
+
+
+def test_ssdata_reader_bulk_reads(ssdata_file):
+    reader = SSDataReader(ssdata_file)
+    rows = np.array([r.copy() for r in reader.read()])
+    assert np.array_equal(reader.load_data(), rows, equal_nan=True), "all readouts"
+    assert np.array_equal(reader[2:20:3], rows[2:20:3], equal_nan=True), "slice"
+    assert np.array_equal(reader[::-2], rows[::-2], equal_nan=True), "reversed slice"
+    assert np.array_equal(reader[[7, 1, -1]], rows[[7, 1, -1]], equal_nan=True), "list"
+    assert np.array_equal(reader[-2], rows[-2]), "negative index"
+    assert reader[5:5].shape == (0, 32, 64), "empty slice"
+    with pytest.raises(IndexError):
+        reader[[0, 30]]
+
+    raw = reader.load_data(mapping="raw")
+    tm = reader.load_data(tm=4, mapping="raw")
+    assert tm.shape == (30, 64) and np.array_equal(tm, raw[:, 4]), "one TM"
+    tms = reader.load_data(slice(10), tm=[1, 2])
+    assert tms.shape == (10, 2, 64), "selected TMs"
+    calib = np.linspace(0.5, 1.5, 64)
+    assert np.allclose(
+        reader.load_data(3, tm=4, calib=calib), (raw[3, 4] * calib)[reader.map]
+    ), "calibrated and mapped single readout"
+
+    ssdata = reader.load_all_data(4, calib=calib, mapping="ssl2colrow")
+    expected = raw[:, 4].astype(np.float64) * calib
+    assert np.array_equal(
+        ssdata.amps, expected[:, ss_mappings.ssl2colrow]
+    ), "load_all_data amplitudes"
+    assert list(ssdata.iro) == list(range(30)), "load_all_data readout numbers"
+    assert list(ssdata.time) == [1000 * i for i in range(30)], "load_all_data TACKs"
+    reader.close_file()
+
+
+def test_ssdata_reader_pd_table(ssdata_file):
+    pd = pytest.importorskip("pandas")
+    reader = SSDataReader(ssdata_file)
+    rows = np.array([r.copy() for r in reader.read()])
+    df = reader.load_as_pd_table()
+    assert df.shape == (30 * 2048, 3), "one row per pixel and readout"
+    assert list(df.columns) == ["time", "cpu_t", "amp"], "columns"
+    assert df.index.names == ["iro", "pix"], "index"
+    assert np.array_equal(
+        df["amp"].values, rows.reshape(-1), equal_nan=True
+    ), "amplitudes in mapped pixel order"
+    assert df.loc[(7, 100), "time"] == 7000, "TACK of readout"
+    assert df.loc[(7, 100), "amp"] == rows[7].flat[100], "amplitude of pixel"
+
+    chunks = list(reader.load_as_pd_table(chunk_size=8))
+    assert [len(c) for c in chunks] == [8 * 2048] * 3 + [6 * 2048], "chunk sizes"
+    pd.testing.assert_frame_equal(pd.concat(chunks), df)
+    reader.close_file()
+
+
+def test_ssdata_reader_queries(tmp_path):
+    filename = os.path.join(tmp_path, "test.hdf5")
+    writer = SSDataWriter(filename, buffer=7)
+    writer.write_readouts(make_readouts(30))
+    for i in [2, 10, 20]:
+        writer.write_tel_data(
+            ra=i * 1.0, dec=-i * 1.0, time=1600000000.0 + i, seconds=1600000000 + i, ns=0
+        )
+    writer.close()
+
+    reader = SSDataReader(filename)
+    table = reader.file.root.SlowSignal.readout
+    assert reader.attrs.ss_data_version == 1, "signed columns version"
+    for col in ["iro", "time", "cpu_t"]:
+        assert table.colinstances[col].is_indexed, "indexed column " + col
+    assert list(reader.time_range(5000, 9000)) == [5, 6, 7, 8], "TACK range"
+    assert list(reader.time_range(stop=3000)) == [0, 1, 2], "open start"
+    assert list(reader.time_range(1600000027.5, field="cpu_t")) == [28, 29], "cpu time"
+    assert list(reader.where("(iro % 10) == 3")) == [3, 13, 23], "condition"
+    assert reader.nearest(12400) == 12, "nearest TACK"
+    assert reader.nearest(-5000) == 0, "before the first readout"
+    assert reader.nearest(1600000016.7, field="cpu_t") == 17, "nearest cpu time"
+
+    pointing = reader.pointing([1600000001.0, 1600000002.0, 1600000015.0])
+    assert np.isnan(pointing.ra[0]), "no preceding telescope data"
+    assert list(pointing.ra[1:]) == [2.0, 10.0], "last preceding pointing"
+
+    ssdata = reader.load_time_range(1600000009, 1600000012, field="cpu_t", tm=4)
+    rows = np.array([r.copy() for r in reader.read(9, 12)])
+    assert list(ssdata.iro) == [9, 10, 11], "readouts in range"
+    assert np.array_equal(ssdata.amps, rows[:, 4]), "amplitudes in range"
+    assert list(ssdata.ra) == [2.0, 10.0, 10.0], "pointing of the readouts"
+    assert list(ssdata.dec) == [-2.0, -10.0, -10.0], "pointing of the readouts"
+    reader.close_file()
+
+
+def test_ssdata_reader_queries_unsigned(ssdata_file, tmp_path):
+    # files written by older versions have unsigned columns which can not be indexed
+    with tables.open_file(ssdata_file) as f:
+        rows = f.root.SlowSignal.readout.read()
+    dtype = [
+        (n, np.uint64 if n in ["iro", "time"] else rows.dtype[n]) for n in rows.dtype.names
+    ]
+    filename = os.path.join(tmp_path, "old.hdf5")
+    with tables.open_file(filename, "w") as f:
+        table = f.create_table("/SlowSignal", "readout", np.dtype(dtype), createparents=True)
+        table.append(rows.astype(dtype))
+        table.attrs["ss_data_version"] = 0
+
+    reader = SSDataReader(filename)
+    assert list(reader.time_range(5000, 9000)) == [5, 6, 7, 8], "TACK range"
+    assert list(reader.where("(iro >= 27)")) == [27, 28, 29], "condition"
+    assert reader.nearest(np.uint64(12400)) == 12, "nearest TACK"
+    assert np.all(np.isnan(reader.pointing([1600000001.0]).ra)), "no telescope data"
+    reader.close_file()
@@ -0,0 +1,47 @@
+import asyncio
+import socket
+from ssdaq.core.udp_batch import BatchedUDPReader, UDPPacketRing, proc_net_udp_drops
+
+
+def make_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setblocking(False)
+    return sock
+
+
+def test_batched_reading():
+    loop = asyncio.new_event_loop()
+    sock = make_socket()
+    batches = []
+    reader = BatchedUDPReader(
+        sock,
+        loop,
+        lambda *batch: batches.append(batch),
+        ring=UDPPacketRing(8, 64),
+        batch_size=4,
+    )
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(10):
+        sender.sendto(bytes([i]) * (i + 1), sock.getsockname())
+    reader.start()
+    loop.run_until_complete(asyncio.sleep(0.05))
+
+    assert [n for _, n, _ in batches] == [4, 4], "Batches limited by batch size and ring"
+    assert reader.ring.free == 0, "Ring is full"
+    for i in range(8):
+        data, addr = reader.ring.get(i)
+        assert bytes(data) == bytes([i]) * (i + 1), "Correct datagram in slot"
+        assert addr[0] == "127.0.0.1", "Correct source address"
+
+    reader.release(8)
+    loop.run_until_complete(asyncio.sleep(0.05))
+    assert batches[-1][:2] == (8, 2), "Reading resumed after release"
+    data, _ = reader.ring.get(9)
+    assert bytes(data) == bytes([9]) * 10, "Correct datagram after wrapping"
+    assert reader.dropped_packets == 0, "No dropped packets"
+    assert proc_net_udp_drops(sock) in (0, None), "No dropped packets"
+    reader.pause()
+    sock.close()
+    sender.close()
+    loop.close()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+import pytest
+from ssdaq.core.basesubscribers import AsyncSubscriber, AsyncWriterSubscriber
+from ssdaq.core.publishers import ZMQTCPPublisher
+
+
+class SlowWriter:
+    """ A writer that takes 5 ms to write an object
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.objects = []
+        self.data_counter = 0
+        open(filename, "w").close()
+
+    def write(self, data):
+        time.sleep(0.005)
+        self.objects.append(bytes(data))
+        self.data_counter += 1
+
+    def close(self):
+        pass
+
+
+def run_writer(tmp_path, port, n, **kwargs):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    pub = ZMQTCPPublisher("127.0.0.1", port)
+    writer = AsyncWriterSubscriber(
+        "test",
+        "127.0.0.1",
+        port,
+        subscriber=AsyncSubscriber,
+        writer=SlowWriter,
+        file_ext=".dat",
+        name="TestWriter",
+        folder=str(tmp_path),
+        loop=loop,
+        **kwargs
+    )
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.001)
+
+    async def main():
+        tick_task = loop.create_task(ticker())
+        await asyncio.sleep(0.3)
+        for i in range(n):
+            pub.publish(b"%d" % i)
+        await asyncio.sleep(0.3)
+        metrics = writer.write_metrics
+        await writer.close()
+        tick_task.cancel()
+        return metrics
+
+    metrics = loop.run_until_complete(main())
+    pub.sock.close(linger=0)
+    loop.close()
+    asyncio.set_event_loop(None)
+    gaps = [t1 - t0 for t0, t1 in zip(ticks, ticks[1:])]
+    return writer, metrics, max(gaps)
+
+
+def test_writer_thread(tmp_path):
+    writer, metrics, max_gap = run_writer(tmp_path, 17650, 100)
+    assert writer._writer.objects == [b"%d" % i for i in range(100)], "all written in order"
+    assert max_gap < 0.1, "event loop not blocked by the writes"
+    assert metrics["max_queue_depth"] > 10, "data queued"
+    assert metrics["write_latency_p99_ms"] >= 5, "write latency measured"
+    assert writer.write_metrics["written"] == 100, "written counted"
+
+
+def test_writer_thread_overflow(tmp_path):
+    writer, metrics, _ = run_writer(
+        tmp_path, 17651, 100, queue_size=10, overflow="drop", batch_size=1
+    )
+    written = len(writer._writer.objects)
+    assert writer.ndropped > 0, "data dropped when the queue is full"
+    assert written + writer.ndropped == 100, "all data written or dropped"
+
+    writer, metrics, _ = run_writer(tmp_path, 17652, 100, queue_size=10)
+    assert writer.nblocked > 0, "blocked when the queue is full"
+    assert len(writer._writer.objects) == 100, "no data dropped when blocking"
+
+    with pytest.raises(ValueError):
+        run_writer(tmp_path, 17653, 1, overflow="wait")
+
+
+def test_writer_without_thread(tmp_path):
+    writer, metrics, _ = run_writer(tmp_path, 17654, 20, write_thread=False)
+    assert len(writer._writer.objects) == 20, "all written"
+    assert metrics["queue_depth"] == 0, "no queue"
+
+
+def test_aslowsignalwriter(tmp_path):
+    from ssdaq.data import SSReadout, TelData
+    from ssdaq.data.io import SSDataReader
+    from ssdaq.subscribers import ASlowSignalWriter
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    pub = ZMQTCPPublisher("127.0.0.1", 17655)
+    writer = ASlowSignalWriter(
+        "test", "127.0.0.1", 17655, folder=str(tmp_path), loop=loop, queue_size=2
+    )
+
+    async def main():
+        await asyncio.sleep(0.3)
+        for i in range(10):
+            pub.publish(SSReadout(timestamp=i, readout_number=i).pack())
+        await asyncio.sleep(0.3)
+        for i in range(20):
+            teldata = TelData()
+            teldata.ra = i
+            teldata.time.sec = 1600000000 + i
+            writer.write_tel_data(teldata)
+        await writer.close()
+
+    loop.run_until_complete(main())
+    pub.sock.close(linger=0)
+    loop.close()
+    asyncio.set_event_loop(None)
+    reader = SSDataReader(os.path.join(str(tmp_path), "test.hdf5"))
+    assert reader.n_readouts == 10, "readouts written"
+    tel_data = reader.file.root.SlowSignal.tel_table.read()
+    assert list(tel_data["ra"]) == list(range(20)), "telescope data written in order"
+    assert all(
+        type(v) in (int, float) for v in writer.write_metrics.values()
+    ), "plain python metrics"
+    reader.close_file()